@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+AsyncVCOClient.py
+asyncio version of the barebones VCO API client in VCOClient.py
+
+Dependencies:
+    pip install aiohttp
+
+The call_api contract matches VcoRequestManager.call_api:
+    returns the method result as a Python dictionary
+    raises ApiException when the VCO answers with an error
+    accepts a timeout keyword argument in seconds
+
+Sessions must be created and closed inside a running event loop, so use the client as an async context manager.
+Rate limiting shares the same per host TokenBucket as VcoRequestManager, so sync and async callers draw from one budget.
+
+Examples:
+(1) Reuse the auth of an already connected VcoRequestManager:
+    async with AsyncVcoRequestManager.from_sync_client(vco_client, max_concurrency=8) as client:
+        edges = await client.call_api("enterprise/getEnterpriseEdges", {"enterpriseId": 1})
+
+(2) Bound concurrent work against one VCO, across every client, event loop and thread of the process:
+    async with client.semaphore:
+        await client.call_api(...)
+"""
+
+import asyncio
+import json
+import re
+import threading
+
+import aiohttp
+import requests
+
+from VCOClient import ApiException, VcoRequestManager, get_host_limiter, DEFAULT_POOL_MAXSIZE
+
+LIVE_METHODS = ("liveMode/readLiveData", "liveMode/requestLiveActions", "liveMode/clientExitLiveMode")
+
+# Seconds between two tries of a waiter for a free host slot
+SLOT_POLL_INTERVAL = 0.05
+
+# Per host slots shared by every AsyncVcoRequestManager of the process, keyed by root url
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+class HostSlots(object):
+    """
+    Concurrency cap of one VCO host shared by every event loop of the process
+    Every customer call runs its own loop (asyncio.run in a customer worker or scheduler thread), so an
+    asyncio.Semaphore would only cap one customer. The slots are a threading semaphore that waiters poll with
+    asyncio.sleep, so waiting never blocks a loop
+    """
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    async def __aenter__(self):
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+
+
+def get_host_slots(root_url, max_concurrency):
+    """
+    Return the shared HostSlots for a VCO root url, creating it on first use with max_concurrency slots
+    """
+    with _host_slots_lock:
+        slots = _host_slots.get(root_url)
+        if slots is None:
+            slots = HostSlots(max_concurrency)
+            _host_slots[root_url] = slots
+        return slots
+
+
+class AsyncVcoRequestManager(object):
+
+    def __init__(self, hostname, verify_ssl=True, timeout=30, limit_per_host=DEFAULT_POOL_MAXSIZE,
+                 max_concurrency=8, requests_per_second=None, burst=1):
+        self._verify_ssl = verify_ssl
+        self.timeout = timeout
+        self._root_url = self._get_root_url(hostname)
+        self._portal_url = self._root_url + "/portal/"
+        self._livepull_url = self._root_url + "/livepull/liveData/"
+        self._seqno = 0
+        self._limit_per_host = limit_per_host
+        self._max_concurrency = max_concurrency
+        self._limiter = get_host_limiter(self._root_url, requests_per_second=requests_per_second, burst=burst)
+        self._headers = {"Content-Type": "application/json"}
+        self._cookies = {}
+        self._session = None
+
+    @classmethod
+    def from_sync_client(cls, vco_client: VcoRequestManager, max_concurrency=8, limit_per_host=DEFAULT_POOL_MAXSIZE):
+        """
+        Build an async client that reuses the auth cookie/token, timeout and rate limiter of a connected
+        VcoRequestManager
+        """
+        client = cls(vco_client._root_url, verify_ssl=vco_client._verify_ssl, timeout=vco_client.timeout,
+                     limit_per_host=limit_per_host, max_concurrency=max_concurrency)
+        client._limiter = vco_client._limiter
+        client._cookies = requests.utils.dict_from_cookiejar(vco_client._session.cookies)
+        authorization = vco_client._session.headers.get("Authorization")
+        if authorization:
+            client._headers["Authorization"] = authorization
+        return client
+
+    @staticmethod
+    def _clean_method_name(raw_name):
+        """
+        Ensure method name is properly formatted prior to initiating request
+        """
+        return raw_name.strip("/")
+
+    @staticmethod
+    def _get_root_url(hostname):
+        """
+        Translate VCO hostname to a root url for API calls
+        """
+        if hostname.startswith("http"):
+            hostname = re.sub('http(s)?://', '', hostname)
+        return "https://" + hostname
+
+    @property
+    def semaphore(self):
+        """
+        HostSlots bounding how many units of work (edges) run against this VCO at once, shared with every other
+        client of the same host in the process
+        """
+        return get_host_slots(self._root_url, self._max_concurrency)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit_per_host=self._limit_per_host,
+                                             ssl=None if self._verify_ssl else False)
+            self._session = aiohttp.ClientSession(connector=connector, headers=self._headers, cookies=self._cookies)
+        return
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        return
+
+    async def _wait_for_token(self):
+        """
+        Wait until the host rate limit allows another request without blocking the event loop
+        """
+        if self._limiter is not None:
+            wait = self._limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    async def authenticate(self, username, password, is_operator=True):
+        """
+        Authenticate to API - on success, a cookie is stored in the session
+        """
+        await self.open()
+        path = "/login/operatorLogin" if is_operator else "/login/enterpriseLogin"
+        url = self._root_url + path
+        data = {"username": username, "password": password}
+        await self._wait_for_token()
+        async with self._session.post(url, data=json.dumps(data), allow_redirects=False,
+                                      timeout=aiohttp.ClientTimeout(total=self.timeout)) as r:
+            await r.read()
+            return r
+
+    async def call_api(self, method, params, **kwargs):
+        """
+        Build and submit a request
+        Returns method result as a Python dictionary
+        """
+        await self.open()
+        self._seqno += 1
+        method = self._clean_method_name(method)
+        payload = {"jsonrpc": "2.0", "id": self._seqno, "method": method, "params": params}
+
+        if method in LIVE_METHODS:
+            url = self._livepull_url
+        else:
+            url = self._portal_url
+        timeout = aiohttp.ClientTimeout(total=kwargs.pop("timeout", self.timeout))
+        await self._wait_for_token()
+        async with self._session.post(url, data=json.dumps(payload), timeout=timeout, **kwargs) as r:
+            response_dict = await r.json(content_type=None)
+        if "error" in response_dict:
+            raise ApiException(response_dict["error"]["message"])
+        return response_dict["result"]
+
+    def update_token(self, token):
+        self._headers.update({"Authorization": f"Token {token}"})
+        if self._session is not None:
+            self._session.headers.update({"Authorization": f"Token {token}"})
+        return
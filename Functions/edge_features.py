@@ -0,0 +1,80 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+Feature rules of the edge configuration (edge["configuration"]["enterprise"]["modules"]) and the edge VNFs
+The rules are compiled once and every edge is walked a single time, the update_* functions of powerbi_main_fun read
+the resulting flat feature record instead of walking the modules themselves
+A new BI attribute only needs a new rule here
+
+"""
+
+from typing import Dict
+
+from Objects.FeatureExtractor import ANY, FeatureExtractor, FeatureRule
+
+
+def is_true(value) -> bool:
+    # the VCO flags are compared with == True, so 1 counts and 'true' doesn't
+    return value == True
+
+
+EDGE_FEATURE_RULES = [
+    # isEdgeSpecific of the modules, the last module with the name wins
+    FeatureRule(name='device_settings_edge_specific', module='deviceSettings', paths=[('isEdgeSpecific',)],
+                default=False),
+    FeatureRule(name='firewall_edge_specific', module='firewall', paths=[('isEdgeSpecific',)], default=False),
+    FeatureRule(name='qos_edge_specific', module='QOS', paths=[('isEdgeSpecific',)], default=False),
+    FeatureRule(name='wan_edge_specific', module='WAN', paths=[('isEdgeSpecific',)], default=False),
+
+    # Routing, only edge specific device settings are looked at
+    FeatureRule(name='static_routes_num', module='deviceSettings', edge_specific=True, aggregation='count',
+                paths=[('edgeSpecificData', 'routes', 'static', ANY),
+                       ('edgeSpecificData', 'segments', ANY, 'routes', 'static', ANY)]),
+    FeatureRule(name='bgp', module='deviceSettings', edge_specific=True, aggregation='any', predicate=is_true,
+                paths=[('edgeSpecificData', 'bgp', 'enabled'),
+                       ('edgeSpecificData', 'segments', ANY, 'bgp', 'enabled')]),
+    FeatureRule(name='netflow', module='deviceSettings', edge_specific=True, aggregation='any', predicate=is_true,
+                paths=[('edgeSpecificData', 'netflow', 'enabled'),
+                       ('edgeSpecificData', 'segments', ANY, 'netflow', 'enabled')]),
+    FeatureRule(name='ospf', module='deviceSettings', edge_specific=True, aggregation='any', predicate=is_true,
+                paths=[('edgeSpecificData', 'routedInterfaces', ANY, 'ospf', 'enabled')]),
+    FeatureRule(name='multicast', module='deviceSettings', edge_specific=True, aggregation='any', predicate=is_true,
+                paths=[('edgeSpecificData', 'routedInterfaces', ANY, 'multicast', 'igmp', 'enabled'),
+                       ('edgeSpecificData', 'routedInterfaces', ANY, 'multicast', 'pim', 'enabled')]),
+
+    # HA, read whether the device settings are edge specific or not
+    FeatureRule(name='ha_enabled', module='deviceSettings', paths=[('edgeSpecificData', 'ha', 'enabled')],
+                default=False),
+    FeatureRule(name='vrrp', module='deviceSettings', aggregation='any', predicate=bool,
+                paths=[('edgeSpecificData', 'segments', ANY, 'vrrp', 'enabled')]),
+
+    # Non segment firewall rules, only rules with a name count
+    FeatureRule(name='firewall_rules_in_num', module='firewall', edge_specific=True, aggregation='count',
+                paths=[('edgeSpecificData', 'inbound', ANY, 'name')]),
+    FeatureRule(name='firewall_rules_out_num', module='firewall', edge_specific=True, aggregation='count',
+                paths=[('edgeSpecificData', 'outbound', ANY, 'name')]),
+
+    # Business policies, 2.X rules and 3.X rules per segment
+    FeatureRule(name='business_policy_num', module='QOS', edge_specific=True, aggregation='count',
+                paths=[('edgeSpecificData', 'rules', ANY),
+                       ('edgeSpecificData', 'segments', ANY, 'rules', ANY)]),
+
+    # Security VNF of the edge, read from the edge record and not from the modules
+    FeatureRule(name='vnf_insertion_enabled', paths=[('vnfs', 'securityVnf', 'vms', 0, 'data', 'insertionEnabled')],
+                default=False),
+    FeatureRule(name='vnf_type', paths=[('vnfs', 'securityVnf', 'vms', 0, 'data', 'type')], default=False),
+    FeatureRule(name='vnf_vendor', paths=[('vnfs', 'securityVnf', 'vms', 0, 'data', 'vendor')], default=''),
+    FeatureRule(name='vnf_power_off', paths=[('vnfs', 'securityVnf', 'vms', 0, 'data', 'vmPowerOff')],
+                default=True),
+]
+
+EDGE_FEATURES = FeatureExtractor(rules=EDGE_FEATURE_RULES)
+
+
+def extract_edge_features(edge: dict) -> Dict[str, any]:
+    """
+    Flat feature record of an edge from getEnterpriseEdges with configuration and vnfs
+    """
+    return EDGE_FEATURES.extract(edge)
@@ -0,0 +1,119 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+Reverse geocoding shared by powerbi_main_fun.update_location_information and gateway_script
+
+"""
+
+import logging
+import threading
+from time import sleep
+from typing import Dict, Optional
+
+from Objects.Config import Config
+from Objects.CountryIndex import CountryIndex
+from Objects.GeoIPProvider import GeoIPProvider
+from Objects.GeocodeCache import GeocodeCache
+from Objects.OfflineGeocoder import OfflineGeocoder
+
+# Nominatim usage policy, wait after every lookup that goes over the network
+NOMINATIM_SLEEP = 10
+
+_geocode_caches: Dict[str, GeocodeCache] = {}
+_geocode_caches_lock = threading.Lock()
+_offline_geocoders: Dict[str, OfflineGeocoder] = {}
+_offline_geocoders_lock = threading.Lock()
+_geoip_provider: Optional[GeoIPProvider] = None
+_geoip_provider_lock = threading.Lock()
+_country_indexes: Dict[str, CountryIndex] = {}
+_country_indexes_lock = threading.Lock()
+
+
+def get_geocode_cache(cfg: Config) -> Optional[GeocodeCache]:
+    """
+    Process wide geocode cache for the configured cache file, None when no cache file is configured
+    """
+    if not cfg.geocode.cache_file:
+        return None
+    with _geocode_caches_lock:
+        cache = _geocode_caches.get(cfg.geocode.cache_file)
+        if cache is None:
+            cache = GeocodeCache(path=cfg.geocode.cache_file, ttl_days=cfg.geocode.ttl_days,
+                                 max_entries=cfg.geocode.max_entries, precision=cfg.geocode.precision)
+            _geocode_caches[cfg.geocode.cache_file] = cache
+    return cache
+
+
+def get_country_index(cfg: Config) -> CountryIndex:
+    """
+    Process wide CountryIndex built from cfg.files.countries on first use
+    """
+    with _country_indexes_lock:
+        countries = _country_indexes.get(cfg.files.countries)
+        if countries is None:
+            countries = CountryIndex.from_file(cfg.files.countries)
+            _country_indexes[cfg.files.countries] = countries
+    return countries
+
+
+def get_offline_geocoder(cfg: Config) -> Optional[OfflineGeocoder]:
+    """
+    Process wide offline reverse geocoder for the configured dataset, None when no dataset is configured
+    The dataset is loaded and indexed once, lookups are read only and safe to share between threads
+    """
+    if not cfg.geocode.offline_file:
+        return None
+    with _offline_geocoders_lock:
+        geocoder = _offline_geocoders.get(cfg.geocode.offline_file)
+        if geocoder is None:
+            geocoder = OfflineGeocoder(path=cfg.geocode.offline_file, max_km=cfg.geocode.offline_max_km,
+                                       countries=get_country_index(cfg).names_by_iso())
+            _offline_geocoders[cfg.geocode.offline_file] = geocoder
+    return geocoder
+
+
+def get_geoip_provider(cfg: Config) -> GeoIPProvider:
+    """
+    Process wide GeoIP provider, local MaxMind database when configured with the web service as fallback
+    """
+    global _geoip_provider
+    with _geoip_provider_lock:
+        if _geoip_provider is None:
+            _geoip_provider = GeoIPProvider(database_file=cfg.maxmind.database_file,
+                                            account_id=cfg.maxmind.account_id, license_key=cfg.maxmind.license_key,
+                                            cache_size=cfg.maxmind.cache_size)
+    return _geoip_provider
+
+
+def reverse_geocode(geolocator, lat: float, lon: float, log_name: str, cache: Optional[GeocodeCache] = None,
+                    offline: Optional[OfflineGeocoder] = None) -> Dict[str, any]:
+    """
+    Address of a location as returned by Nominatim (location.raw['address'])
+    Cache hits and offline geocoder hits skip both the network call and the Nominatim sleep
+    :param geolocator: geopy Nominatim geolocator
+    :param cache: GeocodeCache to read from and fill, every call goes to Nominatim when None
+    :param offline: OfflineGeocoder tried before Nominatim
+    """
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': log_name})
+
+    if offline is not None:
+        address = offline.reverse(lat, lon)
+        if address is not None:
+            logger.info(f'Offline geocoder hit for {lat},{lon}')
+            return address
+
+    if cache is not None:
+        address = cache.get(lat, lon)
+        if address is not None:
+            logger.info(f'Geocode cache hit for {lat},{lon}')
+            return address
+
+    geoval = '%s,%s' % (lat, lon)
+    location = geolocator.reverse(geoval, language="en-US,en")
+    sleep(NOMINATIM_SLEEP)  # sleeping since there is a limit of quota usage
+    address = location.raw['address']
+    if cache is not None:
+        cache.put(lat, lon, address)
+    return address
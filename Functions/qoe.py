@@ -0,0 +1,88 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+Link QoE statistics computed with run-length encoding over NumPy arrays
+Many link quality series (links x days) are scored in one pass, the results match the original per link loops:
+    - blackouts: runs of 0 that directly follow a 2, 3 or 4 sample, duration is the length of the run
+    - brownouts: runs of 2 that directly follow a 4 sample, duration is the length of the run
+    - lowest score: the series is split into hours of HOUR_SAMPLES samples (the last hour may be shorter) and the
+      worst hour scores (number of 4s * 10 + number of 3s * 5) / HOUR_SAMPLES, an empty series scores 0
+
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Voice quality states in the getLinkQualityEvents timeseries
+QOE_GOOD = 4
+QOE_FAIR = 3
+QOE_POOR = 2
+QOE_DOWN = 0
+
+# 200 samples a day split into hours of 8 samples
+HOUR_SAMPLES = 8
+
+
+def quality_matrix(series: List[List[Optional[float]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pad the series into one float matrix, missing and padding samples are NaN
+    The width is a multiple of HOUR_SAMPLES with at least one hour
+    :return: (matrix, lengths of the series)
+    """
+    lengths = np.array([len(samples) for samples in series], dtype=np.int64)
+    hours = max(1, -(-int(lengths.max(initial=0)) // HOUR_SAMPLES))
+    matrix = np.full((len(series), hours * HOUR_SAMPLES), np.nan)
+    for row, samples in enumerate(series):
+        if samples:
+            matrix[row, :len(samples)] = np.array(samples, dtype=float)
+    return matrix, lengths
+
+
+def state_runs(matrix: np.ndarray, state: int, after_states: Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Runs of state that start right after one of after_states, per row of the matrix
+    :return: (number of runs, total samples in those runs) per row
+    """
+    rows, width = matrix.shape
+    # a NaN column between rows keeps runs from crossing into the next row
+    flat = np.hstack([matrix, np.full((rows, 1), np.nan)]).ravel()
+    in_state = flat == state
+    starts = np.flatnonzero(in_state & ~np.concatenate(([False], in_state[:-1])))
+    ends = np.flatnonzero(in_state & ~np.concatenate((in_state[1:], [False])))
+    previous = np.where(starts > 0, flat[np.maximum(starts - 1, 0)], np.nan)
+    counted = np.isin(previous, after_states)
+    run_rows = starts[counted] // (width + 1)
+    runs = np.bincount(run_rows, minlength=rows)
+    samples = np.bincount(run_rows, weights=(ends - starts + 1)[counted], minlength=rows)
+    return runs, samples.astype(np.int64)
+
+
+def lowest_hour_scores(matrix: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Score of the worst hour per row of the matrix
+    """
+    rows, width = matrix.shape
+    hours = matrix.reshape(rows, width // HOUR_SAMPLES, HOUR_SAMPLES)
+    scores = ((hours == QOE_GOOD).sum(axis=2) * 10 + (hours == QOE_FAIR).sum(axis=2) * 5) / float(HOUR_SAMPLES)
+    hour_count = np.maximum(1, -(-lengths // HOUR_SAMPLES))
+    scores[np.arange(scores.shape[1]) >= hour_count[:, None]] = np.inf
+    return scores.min(axis=1)
+
+
+def link_qoe_stats(series: List[List[Optional[float]]]) -> List[Tuple[float, int, int, int, int]]:
+    """
+    QoE statistics of many link quality series in one pass
+    :param series: voice quality samples of each link/day
+    :return: (lowest score, blackouts, blackout samples, brownouts, brownout samples) for each series
+    """
+    if not series:
+        return []
+    matrix, lengths = quality_matrix(series)
+    lowest = lowest_hour_scores(matrix, lengths)
+    blackouts, blackout_samples = state_runs(matrix, QOE_DOWN, (QOE_POOR, QOE_FAIR, QOE_GOOD))
+    brownouts, brownout_samples = state_runs(matrix, QOE_POOR, (QOE_GOOD,))
+    return [(float(lowest[row]), int(blackouts[row]), int(blackout_samples[row]), int(brownouts[row]),
+             int(brownout_samples[row])) for row in range(len(series))]
@@ -12,18 +12,149 @@ Commit Behavior:
     If a mysql handle is provided a commit will occur at the end of the function
     Else you will need to commit after your call of this function
         This is so multiple calls can be committed at once for performance gains when code is being run remotely
+    Edge/Customer attribute upserts made while an AttributeWriter is active for the cursor are buffered instead and
+    written with one multi row upsert and one commit when the writer exits, pass immediate=True to write right away
 
 """
 
 import logging
-from typing import Dict
+import threading
+from typing import Dict, List, Optional, Tuple
 
 from mysql.connector import cursor, MySQLConnection
 
 import fun_mysql_inserts as sql_inserts
+from Objects.ChangeCache import ChangeCache
 
 # region attribute_upsert_functions
 
+_active_writers: Dict[int, 'AttributeWriter'] = {}
+_active_writers_lock = threading.Lock()
+
+
+class AttributeWriter(object):
+    def __init__(self, *, curs: cursor, sql_cnx: MySQLConnection, log_name: str,
+                 change_cache: Optional[ChangeCache] = None):
+        """
+        Write behind buffer for EdgeAttributes/CustomerAttributes upserts
+        While active (used as a context manager) upsert_edge_attribute/upsert_customer_attribute calls on the same
+        cursor are collected per table and written with executemany and a single commit on exit
+        With a change_cache, rows identical to the stored ones are skipped
+        Usage:
+            with AttributeWriter(curs=mysql_cursor, sql_cnx=mysql_handle, log_name=VCO_CUSTOMER_EDGE):
+                update_routing(...)
+                update_qos(...)
+        """
+        self.curs = curs
+        self.sql_cnx = sql_cnx
+        self.log_name = log_name
+        self.change_cache = change_cache
+        # (table_name, unique_key_name) -> (unique_key, name) -> values, a later upsert replaces an earlier one
+        self._rows: Dict[Tuple[str, str], Dict[Tuple[str, str], Dict[str, any]]] = {}
+        self._previous: Optional[AttributeWriter] = None
+
+    def __enter__(self):
+        with _active_writers_lock:
+            self._previous = _active_writers.get(id(self.curs))
+            _active_writers[id(self.curs)] = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.flush()
+        finally:
+            with _active_writers_lock:
+                if self._previous is None:
+                    _active_writers.pop(id(self.curs), None)
+                else:
+                    _active_writers[id(self.curs)] = self._previous
+        return False
+
+    @staticmethod
+    def active(curs: cursor) -> Optional['AttributeWriter']:
+        """
+        Writer buffering upserts for this cursor, None when upserts should be written right away
+        """
+        return _active_writers.get(id(curs))
+
+    def add(self, *, table_name: str, unique_key_name: str, unique_key: str, name: str, used: bool = None,
+            num: int = None, text: str = None, filter_val: str = None) -> None:
+        values = sql_inserts.attribute_values(unique_key=unique_key, unique_key_name=unique_key_name, name=name,
+                                              used=used, num=num, text=text, filter_val=filter_val)
+        rows = self._rows.setdefault((table_name, unique_key_name), {})
+        if self.change_cache is not None:
+            # A row buffered earlier in this pass is newer than the cache, compare against it first
+            buffered = rows.get((unique_key, name))
+            if buffered == values:
+                return
+            key = (unique_key, table_name, name)
+            if not self.change_cache.has_changed(key, (values['used'], values['num'], values['text'],
+                                                       values['filter_val'])) and buffered is None:
+                return
+        rows[(unique_key, name)] = values
+        return
+
+    def discard(self, *, table_name: str, unique_key: str, name: str) -> None:
+        """
+        Drop a buffered row that is about to be written immediately so the flush can't overwrite it
+        """
+        for (buffered_table, _), rows in self._rows.items():
+            if buffered_table == table_name:
+                rows.pop((unique_key, name), None)
+        if self.change_cache is not None:
+            self.change_cache.forget((unique_key, table_name, name))
+        return
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._rows.values())
+
+    def flush(self) -> None:
+        """
+        Write all buffered rows, one executemany per table and one commit
+        If a batch fails the rows of that batch are retried one by one so one bad row doesn't drop the others
+        """
+        logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': self.log_name})
+        rows_written = 0
+        for (table_name, unique_key_name), rows in self._rows.items():
+            batch: List[Dict[str, any]] = list(rows.values())
+            try:
+                sql_inserts.upsert_attributes_many(curs=self.curs, table_name=table_name,
+                                                   unique_key_name=unique_key_name, rows=batch)
+                rows_written += len(batch)
+            except Exception as e:
+                logger.error(f'Batch upsert of {len(batch)} {table_name} rows failed, writing one by one: {e}')
+                for values in batch:
+                    try:
+                        sql_inserts.upsert_attributes_many(curs=self.curs, table_name=table_name,
+                                                           unique_key_name=unique_key_name, rows=[values])
+                        rows_written += 1
+                    except Exception as row_e:
+                        logger.error(f'UPDATE Attribute failed: {values} - {row_e}')
+                        if self.change_cache is not None:
+                            self.change_cache.forget((values[unique_key_name], table_name, values['name']))
+        self._rows = {}
+        if rows_written and self.sql_cnx:
+            self.sql_cnx.commit()
+        logger.info(f'Flushed {rows_written} attributes')
+        return
+
+
+def _upsert_buffered_attribute(*, curs: cursor, sql_cnx: Optional[MySQLConnection], immediate: bool, table_name: str,
+                               unique_key_name: str, unique_key: str, name: str, used: bool, num: int, text: str,
+                               filter_val: str):
+    writer = AttributeWriter.active(curs)
+    if writer is not None:
+        if not immediate:
+            writer.add(table_name=table_name, unique_key_name=unique_key_name, unique_key=unique_key, name=name,
+                       used=used, num=num, text=text, filter_val=filter_val)
+            return
+        writer.discard(table_name=table_name, unique_key=unique_key, name=name)
+    sql_inserts.upsert_attribute(curs=curs, sql_cnx=sql_cnx, table_name=table_name, unique_key_name=unique_key_name,
+                                 unique_key=unique_key, name=name, used=used, num=num, text=text,
+                                 filter_val=filter_val)
+    return
+
+
 
 """
 Attribute Upserts
@@ -46,25 +177,28 @@ Stored Data Types:
                                    There is a 100 character limit on filter_val
                                    Should attempt to limit the values generated by these
                                    Default value can be overwritten by providing a value to the call
+        immediate: Edge/Customer only - write and commit now even if an AttributeWriter is active
 """
 
 def upsert_edge_attribute(*, curs: cursor, log_name: str, edge_id: str, name: str, sql_cnx: MySQLConnection = None,
-                          used: bool = None, num: int = None, text: str = None, filter_val: str = None):
+                          used: bool = None, num: int = None, text: str = None, filter_val: str = None,
+                          immediate: bool = False):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': log_name})
     logger.info(f'UPDATE Attribute: {name} - used: {used} - num: {num}: text: {text}')
-    sql_inserts.upsert_attribute(curs=curs, sql_cnx=sql_cnx, table_name='EdgeAttributes', unique_key_name='edge_uuid',
-                                 unique_key=edge_id, name=name, used=used, num=num, text=text, filter_val=filter_val)
+    _upsert_buffered_attribute(curs=curs, sql_cnx=sql_cnx, immediate=immediate, table_name='EdgeAttributes',
+                               unique_key_name='edge_uuid', unique_key=edge_id, name=name, used=used, num=num,
+                               text=text, filter_val=filter_val)
     return
 
 
 def upsert_customer_attribute(*, curs: cursor, log_name: str, customer_lid: str, name: str,
                               sql_cnx: MySQLConnection = None, used: bool = None, num: int = None, text: str = None,
-                              filter_val: str = None):
+                              filter_val: str = None, immediate: bool = False):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': log_name})
     logger.info(f'UPDATE Attribute: {name} - used: {used} - num: {num}: text: {text}')
-    sql_inserts.upsert_attribute(curs=curs, sql_cnx=sql_cnx, table_name='CustomerAttributes',
-                                 unique_key_name='customer_uuid', unique_key=customer_lid, name=name, used=used,
-                                 num=num, text=text, filter_val=filter_val)
+    _upsert_buffered_attribute(curs=curs, sql_cnx=sql_cnx, immediate=immediate, table_name='CustomerAttributes',
+                               unique_key_name='customer_uuid', unique_key=customer_lid, name=name, used=used,
+                               num=num, text=text, filter_val=filter_val)
     return
 
 
@@ -0,0 +1,57 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+Edge throughput statistics from getEdgeLinkSeries bytesRx/bytesTx series, used for license sizing
+
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+# Throughput percentiles reported next to the top samples
+PERCENTILES = (95, 99)
+
+
+def link_series_totals(link_series: List[Dict]) -> np.ndarray:
+    """
+    Bytes received plus sent per sample summed over all links of the edge
+    Missing samples count as 0, series are cut to the shortest one
+    :param link_series: getEdgeLinkSeries result, series[0] is bytesRx and series[1] bytesTx of each link
+    """
+    series = [link['series'][i]['data'] for link in link_series for i in (0, 1)]
+    if not series:
+        return np.zeros(0)
+    samples = min(len(data) for data in series)
+    matrix = np.array([data[:samples] for data in series], dtype=float).reshape(len(series), samples)
+    return np.nan_to_num(matrix, nan=0.0).sum(axis=0)
+
+
+def nth_highest(totals: np.ndarray, n: int) -> float:
+    """
+    n-th highest value (1 is the highest), 0 when there are fewer than n values
+    """
+    if len(totals) < n:
+        return 0
+    return float(np.partition(totals, len(totals) - n)[len(totals) - n])
+
+
+def throughput_stats(link_series: List[Dict]) -> Dict[str, float]:
+    """
+    Top, 5th and 10th highest throughput samples and the PERCENTILES throughput of an edge, in Mbps
+    :return: Dict with highest, fifth_top, tenth_top and p<percentile> keys
+    """
+    stats = {'highest': 0, 'fifth_top': 0, 'tenth_top': 0}
+    stats.update({f'p{percentile}': 0 for percentile in PERCENTILES})
+    totals = link_series_totals(link_series)
+    if not len(totals):
+        return stats
+
+    sample_interval = link_series[0]['series'][0]['tickInterval'] / 1000
+    for name, n in (('highest', 1), ('fifth_top', 5), ('tenth_top', 10)):
+        stats[name] = round((nth_highest(totals, n) * 8) / (sample_interval * 1000 * 1000), 3)
+    for percentile, value in zip(PERCENTILES, np.percentile(totals, PERCENTILES)):
+        stats[f'p{percentile}'] = round((float(value) * 8) / (sample_interval * 1000 * 1000), 3)
+    return stats
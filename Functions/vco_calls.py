@@ -24,7 +24,6 @@ Type hinting MUST be used on all parameters and returns
 
 import json
 from datetime import timedelta, datetime, timezone
-from time import sleep
 from typing import Optional, Dict, List, Tuple
 
 import requests
@@ -36,16 +35,20 @@ from VCOClient import VcoRequestManager, ApiException
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
-def call_api_wrapper(vco_client: VcoRequestManager, call_name: str, method: str, params: dict, timeout: int = None,
-                     sleep_duration: float = .5) -> Tuple[Optional[any], Optional[str]]:
+# Matches the old fixed half second sleep after every call
+DEFAULT_REQUESTS_PER_SECOND = 2.0
+
+
+def call_api_wrapper(vco_client: VcoRequestManager, call_name: str, method: str, params: dict,
+                     timeout: int = None) -> Tuple[Optional[any], Optional[str]]:
     """
     function for standard error and return handling
+    Pacing between calls is handled by the rate limiter inside vco_client.call_api
     :param vco_client:
     :param call_name:
     :param method:
     :param params:
     :param timeout:
-    :param sleep_duration:
     :return:
     """
     if timeout:
@@ -69,9 +72,6 @@ def call_api_wrapper(vco_client: VcoRequestManager, call_name: str, method: str,
     except json.decoder.JSONDecodeError:
         msg = f'{call_name} generated an error at the server'
 
-    # Sleep Always? or only after a successful Call?
-    sleep(sleep_duration)
-
     if timeout:
         vco_client.timeout = original_timeout
 
@@ -82,7 +82,18 @@ def call_api_wrapper(vco_client: VcoRequestManager, call_name: str, method: str,
 
 
 def connect_to_vco(vco: Dict[str, any]) -> Tuple[Optional[VcoRequestManager], Optional[str]]:
-    vco_client = VcoRequestManager(vco['link'], verify_ssl=False, timeout=3)
+    """
+    Create and authenticate a VcoRequestManager for a vco_list entry
+    Optional transport keys on the vco entry: pool_connections, pool_maxsize, max_retries
+    Optional rate limit keys on the vco entry: requests_per_second (default 2), burst (default 1)
+    """
+    transport = {key: int(vco[key]) for key in ('pool_connections', 'pool_maxsize', 'max_retries', 'burst')
+                 if vco.get(key) not in (None, '', 'null')}
+    requests_per_second = vco.get('requests_per_second')
+    if requests_per_second in (None, '', 'null'):
+        requests_per_second = DEFAULT_REQUESTS_PER_SECOND
+    vco_client = VcoRequestManager(vco['link'], verify_ssl=False, timeout=3,
+                                   requests_per_second=float(requests_per_second), **transport)
 
     try:
         token = vco.get('token')
@@ -190,7 +201,6 @@ def get_customer_edges(vco_client: VcoRequestManager, customer_id: int, timeout:
         data, msg = call_api_wrapper(vco_client=vco_client, call_name=call_name, method=method, params=params)
         if data:
             msg = f'getEnterpriseEdges with licenses failed - got without license'
-        sleep(0.5)
 
     if data:
         for edge in data:
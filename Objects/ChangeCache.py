@@ -0,0 +1,81 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Hashable, Iterable, Tuple
+
+
+class ChangeCache:
+    def __init__(self) -> None:
+        """
+        Content hashes of the values last known to be stored in the DB
+        Keys are (edge_uuid, table, column or attribute name). The upsert layer asks has_changed before writing and
+        skips values that are identical to what is already stored, counting skipped vs written rows
+        Seeded in bulk from the DB by fun_mysql_query.load_customer_snapshot
+        """
+        self._hashes: Dict[Tuple[str, str, str], str] = {}
+        self.written = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return "{}(keys={}, written={}, skipped={})".format(self.__class__.__name__, len(self._hashes), self.written,
+                                                           self.skipped)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    @staticmethod
+    def _normalize(value: any) -> any:
+        """
+        Map python values to what MySQL hands back, so a stored 1 and a new True hash the same
+        """
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, (list, tuple)):
+            return [ChangeCache._normalize(item) for item in value]
+        return value
+
+    @staticmethod
+    def content_hash(value: any) -> str:
+        payload = json.dumps(ChangeCache._normalize(value), sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def seed(self, rows: Iterable[Tuple[Tuple[str, str, str], any]]) -> None:
+        """
+        Record values read from the DB
+        :param rows: (key, value)
+        """
+        for key, value in rows:
+            self._hashes[key] = self.content_hash(value)
+        return
+
+    def has_changed(self, key: Tuple[str, str, str], value: any) -> bool:
+        """
+        True when value differs from the stored one and must be written, counts the outcome
+        The new hash is remembered, so call this only right before the write happens
+        """
+        new_hash = self.content_hash(value)
+        if self._hashes.get(key) == new_hash:
+            self.skipped += 1
+            return False
+        self._hashes[key] = new_hash
+        self.written += 1
+        return True
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Drop a key whose stored value was written outside of the cache
+        """
+        self._hashes.pop(key, None)
+        return
@@ -25,6 +25,11 @@ class Config:
         self.files = SectFiles()
         self.slack = SectSlack()
         self.maxmind = SectMaxMind()
+        self.geocode = SectGeocode()
+        self.metric_cache = SectMetricCache()
+        self.scheduler = SectScheduler()
+        self.journal = SectJournal()
+        self.incremental = SectIncremental()
 
     def __repr__(self):
         return "{}({!r})".format(self.__class__.__name__, self.__dict__)
@@ -81,6 +86,8 @@ class SectFiles(Sect):
         self.logging: Optional[str] = None
         self.vco_list: Optional[str] = None
         self.countries: Optional[str] = None
+        # Outdated and end of support life software builds, no version alerts when set empty
+        self.version_catalog: Optional[str] = 'DataFiles/version_catalog.json'
         return
 
 
@@ -98,4 +105,62 @@ class SectMaxMind(Sect):
         # Slack Config Options
         self.account_id: Optional[str] = None
         self.license_key: Optional[str] = None
+        # Local GeoIP2/GeoLite2 City or Enterprise database, the web service is only a fallback when set
+        self.database_file: Optional[str] = None
+        self.cache_size: int = 4096
+        return
+
+
+class SectGeocode(Sect):
+    def __init__(self) -> None:
+        super().__init__()
+        # Reverse geocoding cache, disabled when cache_file is not set
+        self.cache_file: Optional[str] = None
+        self.ttl_days: int = 90
+        self.max_entries: int = 50000
+        self.precision: int = 4
+        # Offline reverse geocoder dataset, Nominatim is only used on a miss when set
+        self.offline_file: Optional[str] = None
+        self.offline_max_km: int = 25
+        return
+
+
+class SectMetricCache(Sect):
+    def __init__(self) -> None:
+        super().__init__()
+        # Store for VCO metrics of closed historical intervals, disabled when cache_file is not set
+        self.cache_file: Optional[str] = None
+        return
+
+
+class SectScheduler(Sect):
+    def __init__(self) -> None:
+        super().__init__()
+        # Work stealing scheduler of powerbi_main_script.py, VCOs run as one task each on a thread pool when 0
+        self.workers: int = 0
+        # Concurrent tasks per VCO unless the VCO sets vco_concurrency in vco_list
+        self.vco_concurrency: int = 4
+        # Seconds between queue depth/throughput log lines
+        self.report_interval: int = 60
+        return
+
+
+class SectJournal(Sect):
+    def __init__(self) -> None:
+        super().__init__()
+        # Run journal of completed VCO/customer/edge units for --resume, disabled when journal_file is not set
+        self.journal_file: Optional[str] = None
+        # --resume only continues runs started within the last window_hours
+        self.window_hours: int = 24
+        self.retention_days: int = 7
+        return
+
+
+class SectIncremental(Sect):
+    def __init__(self) -> None:
+        super().__init__()
+        # Last seen customer/edge change markers, every customer gets the full intake when state_file is not set
+        self.state_file: Optional[str] = None
+        # Unchanged customers and edges still get the full intake this often
+        self.full_refresh_hours: int = 24
         return
@@ -0,0 +1,70 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+from typing import Dict, List, Optional
+
+EDGE_SPECIFIC_PROFILE = 'Edge Specific Profile'
+
+
+class ConfigStackIndex:
+    def __init__(self, *, edge_config_stack: List[dict]) -> None:
+        """
+        Index over the getEdgeConfigurationStack result of one edge, built once per edge
+        Modules are looked up by profile level (position in the stack, 0 is the edge specific profile and 1 the
+        profile the edge is assigned to) and module name, module names are unique within a profile
+        WAN links of the edge specific profile are indexed by internalId
+        :param edge_config_stack: getEdgeConfigurationStack with modules
+        """
+        self.edge_config_stack = edge_config_stack
+        self.schema_version: Optional[str] = edge_config_stack[0].get('schemaVersion') if edge_config_stack else None
+        self._levels: List[Dict[str, dict]] = []
+        self._edge_specific: Dict[str, dict] = {}
+        self._profiles: List[Dict[str, dict]] = []
+        for config in edge_config_stack:
+            modules = {}
+            for module in config.get('modules') or []:
+                modules.setdefault(module['name'], module)
+            self._levels.append(modules)
+            if config.get('name') == EDGE_SPECIFIC_PROFILE:
+                self._edge_specific = modules
+            else:
+                self._profiles.append(modules)
+
+        wan = self.edge_module('WAN')
+        self.wan_links: Dict[str, dict] = {}
+        if wan is not None:
+            self.wan_links = {link['internalId']: link for link in wan['data'].get('links', [])}
+
+    def __repr__(self):
+        return "{}(levels={}, wan_links={})".format(self.__class__.__name__, len(self._levels), len(self.wan_links))
+
+    @property
+    def segmented(self) -> bool:
+        """
+        Profiles older than schema 2.0.0 keep their settings per segment
+        """
+        return self.schema_version != '2.0.0'
+
+    def module(self, profile_level: int, name: str) -> Optional[dict]:
+        """
+        Module of the profile at profile_level, None when the profile or the module doesn't exist
+        """
+        if profile_level >= len(self._levels):
+            return None
+        return self._levels[profile_level].get(name)
+
+    def edge_module(self, name: str) -> Optional[dict]:
+        """
+        Module of the Edge Specific Profile, None when it doesn't exist
+        """
+        return self._edge_specific.get(name)
+
+    def profile_modules(self, name: str) -> List[dict]:
+        """
+        The module of every profile other than the Edge Specific Profile, in stack order
+        """
+        return [modules[name] for modules in self._profiles if name in modules]
@@ -0,0 +1,78 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import json
+from typing import Dict, List, Optional
+
+# Spellings seen in VCO site data and Nominatim replies that are neither an ISO code nor the country.json name
+COUNTRY_ALIASES = {
+    'usa': 'US',
+    'united states of america': 'US',
+    'uk': 'GB',
+}
+
+# Names stored in the Edge table when they differ from country.json
+DISPLAY_NAMES = {
+    'US': 'United States of America',
+}
+
+
+class CountryIndex:
+    def __init__(self, *, countries: List[Dict[str, str]], aliases: Optional[Dict[str, str]] = None) -> None:
+        """
+        Country/region lookups keyed by lower cased ISO code, country name and aliases
+        Built once from country.json (entries with ISO, Country and REG), every lookup is a dict access
+        :param countries: country.json entries
+        :param aliases: alias -> ISO code, defaults to COUNTRY_ALIASES
+        """
+        self._by_iso = {country['ISO'].lower(): country for country in countries}
+        self._by_name = {country['Country'].lower(): country for country in countries}
+        for alias, iso in (COUNTRY_ALIASES if aliases is None else aliases).items():
+            self._by_name.setdefault(alias.lower(), self._by_iso[iso.lower()])
+
+    def __repr__(self):
+        return "{}(countries={})".format(self.__class__.__name__, len(self._by_iso))
+
+    def __len__(self):
+        return len(self._by_iso)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'CountryIndex':
+        with open(path) as f:
+            return cls(countries=json.load(f))
+
+    def get(self, value: Optional[str]) -> Optional[Dict[str, str]]:
+        """
+        country.json entry for an ISO code, country name or alias, None when unknown
+        """
+        if not value:
+            return None
+        key = value.strip().lower()
+        return self._by_iso.get(key) or self._by_name.get(key)
+
+    def region_by_iso(self, iso: str) -> Optional[str]:
+        country = self._by_iso.get(iso.lower())
+        return country['REG'] if country else None
+
+    def region(self, value: Optional[str]) -> Optional[str]:
+        """
+        REG of an ISO code, country name or alias, None when unknown
+        """
+        country = self.get(value)
+        return country['REG'] if country else None
+
+    def display_name(self, value: Optional[str]) -> Optional[str]:
+        """
+        Standard country name for an ISO code, country name or alias, value itself when unknown
+        """
+        country = self.get(value)
+        if country is None:
+            return value
+        return DISPLAY_NAMES.get(country['ISO'], country['Country'])
+
+    def names_by_iso(self) -> Dict[str, str]:
+        return {country['ISO']: country['Country'] for country in self._by_iso.values()}
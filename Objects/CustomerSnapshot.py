@@ -0,0 +1,85 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from Objects.ChangeCache import ChangeCache
+
+
+class CustomerSnapshot:
+    def __init__(self, *, customer_uuid: str, edge_uuids: Iterable[str], qoe_since: str) -> None:
+        """
+        In memory index of the DB state the determine_* queries look at for one customer
+        Loaded with a handful of set based queries (see fun_mysql_query.load_customer_snapshot) so the decision phase
+        of a customer does no per edge SQL
+        The index is authoritative for the edges it was loaded for, and for DailyQOE dates from qoe_since onwards.
+        Anything else is not covered and callers fall back to querying the DB
+        :param customer_uuid: Customer logicalId
+        :param edge_uuids: Edge logicalIds the snapshot covers
+        :param qoe_since: First DailyQOE date covered, formatted as '%Y-%m-%d 00:00:00'
+        """
+        self.customer_uuid = customer_uuid
+        self.edge_uuids = set(edge_uuids)
+        self.qoe_since = qoe_since
+        self.edges: Dict[str, Dict[str, any]] = {}
+        self.qoe_dates: Dict[str, Set[str]] = {}
+        # Stored Edge/EdgeAttributes values, lets the writers skip rows that did not change
+        self.changes = ChangeCache()
+
+    def __repr__(self):
+        return "{}(customer_uuid={!r}, edges={}, qoe_dates={})".format(
+            self.__class__.__name__, self.customer_uuid, len(self.edges), sum(map(len, self.qoe_dates.values())))
+
+    def covers_edge(self, edge_uuid: str) -> bool:
+        return edge_uuid in self.edge_uuids
+
+    def covers_qoe(self, edge_uuid: str, date: str) -> bool:
+        return edge_uuid in self.edge_uuids and date >= self.qoe_since
+
+    def set_edges(self, rows: Iterable[Tuple[str, datetime, str]]) -> None:
+        """
+        Replace the Edge rows of the snapshot
+        :param rows: (EdgeID, lastUpdated, Country)
+        """
+        self.edges = {edge_uuid: {'lastUpdated': last_updated, 'Country': country}
+                      for edge_uuid, last_updated, country in rows}
+        return
+
+    def set_qoe_dates(self, rows: Iterable[Tuple[str, datetime]]) -> None:
+        """
+        Replace the DailyQOE dates of the snapshot
+        :param rows: (EdgeID, Date)
+        """
+        self.qoe_dates = {}
+        for edge_uuid, date in rows:
+            self.qoe_dates.setdefault(edge_uuid, set()).add(date.strftime('%Y-%m-%d %H:%M:%S'))
+        return
+
+    def add_edge(self, edge_uuid: str, last_updated: Optional[datetime] = None, country: str = 'Not set') -> None:
+        """
+        Record an Edge row created after the snapshot was loaded, defaults match the Edge table defaults
+        """
+        self.edge_uuids.add(edge_uuid)
+        self.edges[edge_uuid] = {'lastUpdated': last_updated or datetime.utcnow(), 'Country': country}
+        return
+
+    def edge_rows(self, edge_uuid: str, column: str) -> List[tuple]:
+        """
+        Rows as SELECT {column} from Edge WHERE EdgeID = edge_uuid would return them
+        """
+        if edge_uuid not in self.edges:
+            return []
+        return [(self.edges[edge_uuid][column],)]
+
+    def qoe_rows(self, edge_uuid: str, date: str) -> List[tuple]:
+        """
+        Rows as SELECT Date from DailyQOE WHERE EdgeID = edge_uuid AND Date = date would return them
+        """
+        if date in self.qoe_dates.get(edge_uuid, ()):
+            return [(date,)]
+        return []
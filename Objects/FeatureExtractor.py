@@ -0,0 +1,122 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Path component matching every item of a list (or every value of a dict)
+ANY = '*'
+
+PathKey = Union[str, int]
+
+
+class FeatureRule:
+    AGGREGATIONS = ('value', 'count', 'any')
+
+    def __init__(self, *, name: str, paths: Sequence[Tuple[PathKey, ...]], module: Optional[str] = None,
+                 edge_specific: bool = False, predicate: Optional[Callable[[any], bool]] = None,
+                 aggregation: str = 'value', default: any = None) -> None:
+        """
+        One feature of the flat feature record
+        :param name: Feature name in the record
+        :param paths: Key paths to the values, ANY iterates a list, ints index into a list
+        :param module: Configuration module the paths start at, the edge itself when None
+        :param edge_specific: Only look at the module when it is edge specific (isEdgeSpecific)
+        :param predicate: Values that count as a match, every value found matches when None
+        :param aggregation: value - the last matching value, count - the number of matches,
+                            any - True when anything matched
+        :param default: Value of a 'value' feature without match, count and any start at 0 and False
+        """
+        if aggregation not in self.AGGREGATIONS:
+            raise ValueError(f'Unknown aggregation {aggregation} for feature {name}')
+        self.name = name
+        self.paths = [tuple(path) for path in paths]
+        self.module = module
+        self.edge_specific = edge_specific
+        self.predicate = predicate
+        self.aggregation = aggregation
+        self.default = {'count': 0, 'any': False}.get(aggregation, default)
+
+    def __repr__(self):
+        return "{}(name={!r}, module={!r}, aggregation={!r})".format(self.__class__.__name__, self.name, self.module,
+                                                                     self.aggregation)
+
+    def apply(self, record: Dict[str, any], value: any) -> None:
+        if self.predicate is not None and not self.predicate(value):
+            return
+        if self.aggregation == 'count':
+            record[self.name] += 1
+        elif self.aggregation == 'any':
+            record[self.name] = True
+        else:
+            record[self.name] = value
+        return
+
+
+class FeatureExtractor:
+    def __init__(self, *, rules: Iterable[FeatureRule]) -> None:
+        """
+        Declarative feature extraction over an edge and its configuration modules
+        (edge["configuration"]["enterprise"]["modules"])
+        The rule paths are compiled once into one trie per module, so extract walks every module a single time and
+        shared path prefixes are only visited once, however many features read below them
+        """
+        self.rules: List[FeatureRule] = list(rules)
+        self._edge_trie = self._node()
+        self._module_tries: Dict[Tuple[str, bool], tuple] = {}
+        for rule in self.rules:
+            if rule.module is None:
+                trie = self._edge_trie
+            else:
+                trie = self._module_tries.setdefault((rule.module, rule.edge_specific), self._node())
+            for path in rule.paths:
+                node = trie
+                for key in path:
+                    node = node[0].setdefault(key, self._node())
+                node[1].append(rule)
+
+    def __repr__(self):
+        return "{}(rules={})".format(self.__class__.__name__, len(self.rules))
+
+    @staticmethod
+    def _node() -> tuple:
+        # (children by path key, rules whose path ends here)
+        return {}, []
+
+    def _walk(self, value: any, node: tuple, record: Dict[str, any]) -> None:
+        children, rules = node
+        for rule in rules:
+            rule.apply(record, value)
+        for key, child in children.items():
+            if key == ANY:
+                if isinstance(value, dict):
+                    items = value.values()
+                elif isinstance(value, list):
+                    items = value
+                else:
+                    continue
+                for item in items:
+                    self._walk(item, child, record)
+            elif isinstance(value, dict):
+                if key in value:
+                    self._walk(value[key], child, record)
+            elif isinstance(value, list) and isinstance(key, int):
+                if -len(value) <= key < len(value):
+                    self._walk(value[key], child, record)
+        return
+
+    def extract(self, edge: dict) -> Dict[str, any]:
+        """
+        Flat feature record of the edge, feature name -> value
+        """
+        record = {rule.name: rule.default for rule in self.rules}
+        self._walk(edge, self._edge_trie, record)
+        for module in edge["configuration"]["enterprise"]["modules"]:
+            for edge_specific in (False, True):
+                trie = self._module_tries.get((module["name"], edge_specific))
+                if trie is not None and (not edge_specific or module.get("isEdgeSpecific")):
+                    self._walk(module, trie, record)
+        return record
@@ -0,0 +1,99 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import geoip2.database
+import geoip2.errors
+import geoip2.webservice
+from geoip2.models import City
+
+
+class GeoIPProvider:
+    def __init__(self, *, database_file: Optional[str] = None, account_id: Optional[str] = None,
+                 license_key: Optional[str] = None, cache_size: int = 4096) -> None:
+        """
+        GeoIP lookups from a local MaxMind .mmdb file with the MaxMind web service as fallback
+        The database is opened once with a memory mapped reader and is safe to share between threads
+        Results are kept in an LRU cache per IP address
+        :param database_file: GeoIP2/GeoLite2 City or Enterprise .mmdb file, web service only when None
+        :param account_id: MaxMind web service account, no fallback when None
+        :param license_key: MaxMind web service license key
+        :param cache_size: IP addresses kept in the LRU cache
+        """
+        self.database_file = database_file
+        self.cache_size = cache_size
+        self.hits = 0
+        self.local = 0
+        self.remote = 0
+        self._reader = None
+        self._client = None
+        if database_file:
+            self._reader = geoip2.database.Reader(database_file, mode=geoip2.database.MODE_MMAP)
+        if account_id and license_key:
+            self._client = geoip2.webservice.Client(int(account_id), license_key)
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}(database_file={!r}, hits={}, local={}, remote={})".format(
+            self.__class__.__name__, self.database_file, self.hits, self.local, self.remote)
+
+    def _local_lookup(self, ip_address: str) -> Optional[City]:
+        if self._reader is None:
+            return None
+        try:
+            if 'Enterprise' in self._reader.metadata().database_type:
+                return self._reader.enterprise(ip_address)
+            return self._reader.city(ip_address)
+        except geoip2.errors.AddressNotFoundError:
+            return None
+
+    def _remote_lookup(self, ip_address: str) -> City:
+        if self._client is None:
+            raise ValueError(f'{ip_address} not found in the local GeoIP database and no web service is configured')
+        return self._client.insights(ip_address)
+
+    def lookup(self, ip_address: str, require_organization: bool = False) -> City:
+        """
+        GeoIP record of an IP address, with the same location/country/city/traits attributes as an insights() reply
+        :param require_organization: go to the web service when the local record has no traits.organization
+                                     (City databases don't carry it)
+        """
+        with self._lock:
+            response = self._cache.get(ip_address)
+            if response is not None:
+                self._cache.move_to_end(ip_address)
+        if response is not None and (not require_organization or response.traits.organization is not None or
+                                     self._client is None):
+            self.hits += 1
+            return response
+
+        local_response = response or self._local_lookup(ip_address)
+        if local_response is not None and (not require_organization or
+                                           local_response.traits.organization is not None or self._client is None):
+            self.local += 1
+            response = local_response
+        else:
+            self.remote += 1
+            response = self._remote_lookup(ip_address)
+
+        with self._lock:
+            self._cache[ip_address] = response
+            self._cache.move_to_end(ip_address)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return response
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+        if self._client is not None:
+            self._client.close()
+        return
@@ -0,0 +1,82 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class GeocodeCache:
+    def __init__(self, *, path: str, ttl_days: int = 90, max_entries: int = 50000, precision: int = 4) -> None:
+        """
+        Persistent reverse geocoding cache stored in a SQLite file
+        Keyed by lat/lon rounded to precision decimals (4 decimals is roughly 11 meters), so edges and gateways
+        at the same site share one lookup across customers, scripts and runs
+        Entries older than ttl_days are treated as missing, and the least recently used entries are evicted once
+        the cache holds more than max_entries
+        One connection is shared by all threads of a process, SQLite file locking covers other processes
+        :param path: SQLite file, created if it does not exist
+        """
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cnx = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._cnx:
+            self._cnx.execute("""CREATE TABLE IF NOT EXISTS reverse_geocode (
+                                     location TEXT PRIMARY KEY,
+                                     address TEXT NOT NULL,
+                                     created REAL NOT NULL,
+                                     last_used REAL NOT NULL)""")
+            self._cnx.execute("CREATE INDEX IF NOT EXISTS reverse_geocode_last_used ON reverse_geocode (last_used)")
+
+    def __repr__(self):
+        return "{}(path={!r}, hits={}, misses={})".format(self.__class__.__name__, self.path, self.hits, self.misses)
+
+    def key(self, lat: float, lon: float) -> str:
+        return f'{float(lat):.{self.precision}f},{float(lon):.{self.precision}f}'
+
+    def get(self, lat: float, lon: float) -> Optional[Dict[str, any]]:
+        """
+        Cached address for the location, None when missing or expired
+        """
+        key = self.key(lat, lon)
+        now = time.time()
+        with self._lock, self._cnx:
+            row = self._cnx.execute("SELECT address FROM reverse_geocode WHERE location = ? AND created >= ?",
+                                    (key, now - self.ttl)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._cnx.execute("UPDATE reverse_geocode SET last_used = ? WHERE location = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, lat: float, lon: float, address: Dict[str, any]) -> None:
+        """
+        Store the address of a location and evict the least recently used entries above max_entries
+        """
+        now = time.time()
+        with self._lock, self._cnx:
+            self._cnx.execute("INSERT OR REPLACE INTO reverse_geocode (location, address, created, last_used) "
+                              "VALUES (?, ?, ?, ?)", (self.key(lat, lon), json.dumps(address), now, now))
+            (entries,) = self._cnx.execute("SELECT COUNT(*) FROM reverse_geocode").fetchone()
+            if entries > self.max_entries:
+                self._cnx.execute("DELETE FROM reverse_geocode WHERE location IN "
+                                  "(SELECT location FROM reverse_geocode ORDER BY last_used LIMIT ?)",
+                                  (entries - self.max_entries,))
+        return
+
+    def close(self) -> None:
+        with self._lock:
+            self._cnx.close()
+        return
@@ -0,0 +1,34 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+from typing import List, Set
+
+EDGE_HUB_REF = 'deviceSettings:vpn:edgeHub'
+
+
+class HubIndex:
+    def __init__(self, *, configuration: List[dict]) -> None:
+        """
+        Hubs of a customer, built once per customer
+        An edge is a hub when the deviceSettings module of any configuration profile references it as edge hub
+        (refs deviceSettings:vpn:edgeHub)
+        :param configuration: getEnterpriseConfigurations with modules and refs
+        """
+        self.hubs: Set[str] = set()
+        for config in configuration or []:
+            for module in config.get('modules') or []:
+                if module.get('name') != 'deviceSettings':
+                    continue
+                ref = (module.get('refs') or {}).get(EDGE_HUB_REF)
+                if isinstance(ref, dict) and isinstance(ref.get('data'), dict) and 'logicalId' in ref['data']:
+                    self.hubs.add(str(ref['data']['logicalId']))
+
+    def __repr__(self):
+        return "{}(hubs={})".format(self.__class__.__name__, len(self.hubs))
+
+    def is_hub(self, logical_id: str) -> bool:
+        return str(logical_id) in self.hubs
@@ -0,0 +1,129 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+# Share of full_refresh_hours a last full pass may be early and still count as due, runs on a fixed period
+# record the pass when they finish and start a little less than a period later
+FRESH_MARGIN = 0.1
+
+
+def _digest(value: any) -> str:
+    return hashlib.md5(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class IntakeState:
+    def __init__(self, *, path: str, full_refresh_hours: int = 24) -> None:
+        """
+        Last seen change markers of customers and edges for the incremental intake, stored in a SQLite file
+        A customer whose getNetworkEnterprises marker (modified, edgeConfigUpdate, edgeCount) is unchanged skips the
+        customer attributes, an edge whose configuration marker is unchanged skips the configuration extractors
+        Markers only move when the VCO bumps a modification time, so everything still goes through the full intake
+        once every full_refresh_hours (less FRESH_MARGIN, a daily run must not miss it by a few minutes)
+        One connection is shared by all threads of a process, SQLite file locking covers other processes (shards)
+        :param path: SQLite file, created if it does not exist
+        :param full_refresh_hours: Maximum time between two full passes of a customer or edge
+        """
+        self.path = path
+        self.full_refresh_seconds = full_refresh_hours * 3600
+        self._lock = threading.Lock()
+        self._cnx = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._cnx:
+            self._cnx.execute("""CREATE TABLE IF NOT EXISTS customer_state (
+                                     customer_uuid TEXT PRIMARY KEY,
+                                     marker TEXT NOT NULL,
+                                     last_full REAL NOT NULL)""")
+            self._cnx.execute("""CREATE TABLE IF NOT EXISTS edge_state (
+                                     edge_uuid TEXT PRIMARY KEY,
+                                     marker TEXT NOT NULL,
+                                     last_contact TEXT,
+                                     edge_state TEXT,
+                                     last_full REAL NOT NULL)""")
+
+    def __repr__(self):
+        return "{}(path={!r})".format(self.__class__.__name__, self.path)
+
+    @staticmethod
+    def customer_marker(customer: Dict[str, any]) -> str:
+        """
+        Change marker of a getNetworkEnterprises customer (requested with edgeCount and edgeConfigUpdate)
+        """
+        return _digest([customer.get('modified'), customer.get('edgeConfigUpdate'), customer.get('edgeCount')])
+
+    @staticmethod
+    def edge_marker(edge: Dict[str, any]) -> str:
+        """
+        Change marker of everything the configuration extractors read from a getEnterpriseEdges edge: modification
+        times of the edge, its profile and modules, the VNFs and the cloud security service tunnels
+        """
+        profile = (edge.get('configuration') or {}).get('enterprise') or {}
+        return _digest([edge.get('modified'), profile.get('id'), profile.get('modified'),
+                        [(module.get('name'), module.get('modified')) for module in profile.get('modules') or []],
+                        edge.get('vnfs'),
+                        [(css.get('state'), css.get('nvs_ip')) for css in edge.get('cloudServices') or []]])
+
+    def _fresh(self, last_full: float) -> bool:
+        return time.time() - last_full < self.full_refresh_seconds * (1 - FRESH_MARGIN)
+
+    def customer_changed(self, customer: Dict[str, any]) -> bool:
+        """
+        True when the customer needs the full intake: new, marker changed or last full pass too old
+        """
+        with self._lock:
+            row = self._cnx.execute("SELECT marker, last_full FROM customer_state WHERE customer_uuid = ?",
+                                    (customer.get('logicalId'),)).fetchone()
+        return row is None or row[0] != self.customer_marker(customer) or not self._fresh(row[1])
+
+    def customer_done(self, customer: Dict[str, any]) -> None:
+        """
+        Record a full pass of the customer
+        """
+        with self._lock, self._cnx:
+            self._cnx.execute("INSERT OR REPLACE INTO customer_state (customer_uuid, marker, last_full) "
+                              "VALUES (?, ?, ?)", (customer.get('logicalId'), self.customer_marker(customer),
+                                                   time.time()))
+        return
+
+    def _edge_row(self, edge_uuid: str) -> Optional[tuple]:
+        with self._lock:
+            return self._cnx.execute("SELECT marker, last_contact, edge_state, last_full FROM edge_state "
+                                     "WHERE edge_uuid = ?", (edge_uuid,)).fetchone()
+
+    def edge_changed(self, edge: Dict[str, any]) -> bool:
+        """
+        True when the configuration extractors have to run for the edge: new, marker changed or last run too old
+        """
+        row = self._edge_row(edge.get('logicalId'))
+        return row is None or row[0] != self.edge_marker(edge) or not self._fresh(row[3])
+
+    def edge_seen(self, edge: Dict[str, any], config: bool = False) -> None:
+        """
+        Record the lastContact/edgeState of an edge, with config also its marker as the configuration extractors just
+        ran
+        Edges without a row are only recorded with config
+        """
+        with self._lock, self._cnx:
+            if config:
+                self._cnx.execute("INSERT OR REPLACE INTO edge_state (edge_uuid, marker, last_contact, edge_state, "
+                                  "last_full) VALUES (?, ?, ?, ?, ?)",
+                                  (edge.get('logicalId'), self.edge_marker(edge), edge.get('lastContact'),
+                                   edge.get('edgeState'), time.time()))
+            else:
+                self._cnx.execute("UPDATE edge_state SET last_contact = ?, edge_state = ? WHERE edge_uuid = ?",
+                                  (edge.get('lastContact'), edge.get('edgeState'), edge.get('logicalId')))
+        return
+
+    def close(self) -> None:
+        with self._lock:
+            self._cnx.close()
+        return
@@ -0,0 +1,90 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+# A window is only cached once its end is this far in the past, the VCO may still fill in late samples before that
+SETTLE_MS = 2 * 86400 * 1000
+
+
+class MetricWindowCache:
+    def __init__(self, *, path: str) -> None:
+        """
+        Persistent store for VCO metric results of closed historical intervals, stored in a SQLite file
+        Keyed by edge logicalId, API method, interval and metric list, so an edge is only pulled once per window
+        Only calls with both an interval start and end older than SETTLE_MS are cached, the data of those can no
+        longer change
+        One connection is shared by all threads of a process, SQLite file locking covers other processes
+        :param path: SQLite file, created if it does not exist
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cnx = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._cnx:
+            self._cnx.execute("""CREATE TABLE IF NOT EXISTS metric_window (
+                                     edge_uuid TEXT NOT NULL,
+                                     method TEXT NOT NULL,
+                                     interval_start INTEGER NOT NULL,
+                                     interval_end INTEGER NOT NULL,
+                                     metrics TEXT NOT NULL,
+                                     result TEXT NOT NULL,
+                                     created REAL NOT NULL,
+                                     PRIMARY KEY (edge_uuid, method, interval_start, interval_end, metrics))""")
+
+    def __repr__(self):
+        return "{}(path={!r}, hits={}, misses={})".format(self.__class__.__name__, self.path, self.hits, self.misses)
+
+    @staticmethod
+    def key(edge_uuid: str, method: str, params: Dict[str, any]) -> Optional[tuple]:
+        """
+        Cache key of a metrics call, None when the call is not for a closed historical interval
+        """
+        interval = params.get('interval') or {}
+        start, end = interval.get('start'), interval.get('end')
+        if not isinstance(start, int) or not isinstance(end, int) or end > time.time() * 1000 - SETTLE_MS:
+            return None
+        return edge_uuid, method, start, end, ','.join(sorted(params.get('with') or []))
+
+    def get(self, edge_uuid: str, method: str, params: Dict[str, any]) -> Optional[any]:
+        """
+        Cached result of the call, None when missing or not cacheable
+        """
+        key = self.key(edge_uuid, method, params)
+        if key is None:
+            return None
+        with self._lock, self._cnx:
+            row = self._cnx.execute("SELECT result FROM metric_window WHERE edge_uuid = ? AND method = ? AND "
+                                    "interval_start = ? AND interval_end = ? AND metrics = ?", key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, edge_uuid: str, method: str, params: Dict[str, any], result: any) -> None:
+        """
+        Store the result of the call, calls that are not for a closed historical interval are ignored
+        """
+        key = self.key(edge_uuid, method, params)
+        if key is None:
+            return
+        with self._lock, self._cnx:
+            self._cnx.execute("INSERT OR REPLACE INTO metric_window (edge_uuid, method, interval_start, interval_end, "
+                              "metrics, result, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              key + (json.dumps(result), time.time()))
+        return
+
+    def close(self) -> None:
+        with self._lock:
+            self._cnx.close()
+        return
@@ -0,0 +1,95 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import csv
+import math
+from typing import Dict, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.195
+
+
+class OfflineGeocoder:
+    def __init__(self, *, path: str, max_km: float = 25, countries: Optional[Dict[str, str]] = None,
+                 cell_degrees: float = 1.0) -> None:
+        """
+        Local reverse geocoder over a city/admin region dataset, indexed with a lat/lon grid
+        The dataset is a CSV file with a header row and the columns:
+            lat, lon, city, state, country_code and optionally postcode and country
+        (a reduced GeoNames cities export works well)
+        reverse returns the nearest place within max_km as a Nominatim style address dict, or None on a miss so the
+        caller can fall back to Nominatim
+        :param path: dataset CSV file
+        :param max_km: places further away than this are a miss
+        :param countries: ISO code to country name, used when the dataset has no country column
+        :param cell_degrees: grid cell size
+        """
+        self.path = path
+        self.max_km = max_km
+        self.cell_degrees = cell_degrees
+        self.countries = {iso.upper(): name for iso, name in (countries or {}).items()}
+        self._places: List[Tuple[float, float, Dict[str, str]]] = []
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+        self._load()
+
+    def __repr__(self):
+        return "{}(path={!r}, places={})".format(self.__class__.__name__, self.path, len(self._places))
+
+    def __len__(self):
+        return len(self._places)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def _load(self) -> None:
+        with open(self.path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                lat, lon = float(row['lat']), float(row['lon'])
+                country_code = row['country_code'].upper()
+                address = {'city': row['city'], 'state': row['state'], 'country_code': country_code.lower(),
+                           'country': row.get('country') or self.countries.get(country_code, country_code)}
+                if row.get('postcode'):
+                    address['postcode'] = row['postcode']
+                self._grid.setdefault(self._cell(lat, lon), []).append(len(self._places))
+                self._places.append((lat, lon, address))
+        return
+
+    @staticmethod
+    def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+        """
+        Haversine distance
+        """
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        d_phi = phi2 - phi1
+        d_lambda = math.radians(lon2 - lon1)
+        a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+    def reverse(self, lat: float, lon: float) -> Optional[Dict[str, str]]:
+        """
+        Address of the nearest place within max_km, None when there is none
+        """
+        lat, lon = float(lat), float(lon)
+        lat_cells = int(math.ceil(self.max_km / (KM_PER_DEGREE * self.cell_degrees)))
+        # Cells get narrower towards the poles, widen the lon search so max_km is always covered
+        lon_km = KM_PER_DEGREE * self.cell_degrees * max(math.cos(math.radians(min(abs(lat) + self.cell_degrees *
+                                                                                   lat_cells, 89.9))), 1e-3)
+        lon_cells = min(int(math.ceil(self.max_km / lon_km)), int(math.ceil(180 / self.cell_degrees)))
+        lon_wrap = int(round(360 / self.cell_degrees))
+
+        cell_lat, cell_lon = self._cell(lat, lon)
+        best, best_km = None, self.max_km
+        for i in range(cell_lat - lat_cells, cell_lat + lat_cells + 1):
+            for j in range(cell_lon - lon_cells, cell_lon + lon_cells + 1):
+                # wrap around the antimeridian
+                j_wrapped = (j + lon_wrap // 2) % lon_wrap - lon_wrap // 2
+                for index in self._grid.get((i, j_wrapped), ()):
+                    place_lat, place_lon, address = self._places[index]
+                    km = self.distance_km(lat, lon, place_lat, place_lon)
+                    if km <= best_km:
+                        best, best_km = address, km
+        return dict(best) if best is not None else None
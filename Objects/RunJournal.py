@@ -0,0 +1,117 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Set, Tuple
+
+# Units of the intake run, a customer is done once all its edges are. VCOs are not units: a resumed run logs in to
+# every VCO again and skips the customers and edges it completed, so customers whose tasks never ran are retried
+UNIT_CUSTOMER = 'customer'
+UNIT_EDGE = 'edge'
+
+
+class RunJournal:
+    def __init__(self, *, path: str, scope: str, resume: bool = False, window_hours: int = 24,
+                 retention_days: int = 7) -> None:
+        """
+        Journal of the customer and edge units an intake run completed, stored in a SQLite file
+        Every run gets a run id, with resume the latest unfinished run of the same scope started within window_hours
+        is continued instead and its completed units are skipped. Finished runs are never resumed
+        One connection is shared by all threads of a process, SQLite file locking covers other processes (shards)
+        :param path: SQLite file, created if it does not exist
+        :param scope: Runs only resume runs of the same scope (IE: the script and its --shard)
+        :param resume: Continue the latest unfinished run of the scope
+        :param window_hours: Unfinished runs older than this start over
+        :param retention_days: Runs started before this are deleted
+        """
+        self.path = path
+        self.scope = scope
+        self.resumed = False
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._done: Set[Tuple[str, str]] = set()
+        self._cnx = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        now = time.time()
+        with self._lock, self._cnx:
+            self._cnx.execute("PRAGMA journal_mode=WAL")
+            self._cnx.execute("""CREATE TABLE IF NOT EXISTS run (
+                                     run_id TEXT PRIMARY KEY,
+                                     scope TEXT NOT NULL,
+                                     started REAL NOT NULL,
+                                     finished REAL)""")
+            self._cnx.execute("""CREATE TABLE IF NOT EXISTS unit (
+                                     run_id TEXT NOT NULL,
+                                     level TEXT NOT NULL,
+                                     unit_key TEXT NOT NULL,
+                                     completed REAL NOT NULL,
+                                     PRIMARY KEY (run_id, level, unit_key))""")
+            expired = now - retention_days * 86400
+            self._cnx.execute("DELETE FROM unit WHERE run_id IN (SELECT run_id FROM run WHERE started < ?)",
+                              (expired,))
+            self._cnx.execute("DELETE FROM run WHERE started < ?", (expired,))
+
+            row = None
+            if resume:
+                row = self._cnx.execute("SELECT run_id FROM run WHERE scope = ? AND finished IS NULL AND started >= ? "
+                                        "ORDER BY started DESC LIMIT 1",
+                                        (scope, now - window_hours * 3600)).fetchone()
+            if row is not None:
+                self.run_id = row[0]
+                self.resumed = True
+                self._done = set(self._cnx.execute("SELECT level, unit_key FROM unit WHERE run_id = ?",
+                                                   (self.run_id,)).fetchall())
+            else:
+                self.run_id = uuid.uuid4().hex
+                self._cnx.execute("INSERT INTO run (run_id, scope, started) VALUES (?, ?, ?)",
+                                  (self.run_id, scope, now))
+
+    def __repr__(self):
+        return "{}(run_id={!r}, scope={!r}, resumed={}, done={})".format(self.__class__.__name__, self.run_id,
+                                                                          self.scope, self.resumed, len(self._done))
+
+    @staticmethod
+    def unit_key(vco: str, record: Optional[dict] = None) -> str:
+        """
+        Key of a customer/edge of the VCO by its logicalId (of the VCO itself without record)
+        """
+        return vco if record is None else f'{vco}/{record.get("logicalId")}'
+
+    def is_done(self, level: str, key: str) -> bool:
+        """
+        True when the unit was completed by this run before it was resumed (or earlier in this process)
+        """
+        with self._lock:
+            done = (level, str(key)) in self._done
+            if done:
+                self.skipped += 1
+        return done
+
+    def done(self, level: str, key: str) -> None:
+        """
+        Record a completed unit, committed right away so a crash right after it doesn't repeat it
+        """
+        with self._lock, self._cnx:
+            self._done.add((level, str(key)))
+            self._cnx.execute("INSERT OR IGNORE INTO unit (run_id, level, unit_key, completed) VALUES (?, ?, ?, ?)",
+                              (self.run_id, level, str(key), time.time()))
+        return
+
+    def finish(self) -> None:
+        """
+        Mark the run as finished, the next resume starts a new run
+        """
+        with self._lock, self._cnx:
+            self._cnx.execute("UPDATE run SET finished = ? WHERE run_id = ?", (time.time(), self.run_id))
+        return
+
+    def close(self) -> None:
+        with self._lock:
+            self._cnx.close()
+        return
@@ -0,0 +1,66 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import bisect
+import hashlib
+from typing import Iterable, List, Tuple
+
+# Points per shard on the ring, more points spread the VCOs more evenly over the shards
+VIRTUAL_NODES = 160
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    --shard N/M into (N, M), shards are numbered 1 to M
+    """
+    try:
+        shard, shards = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f'Invalid shard {value}, expected N/M (IE: 2/4)')
+    if shards < 1 or not 1 <= shard <= shards:
+        raise ValueError(f'Invalid shard {value}, N has to be between 1 and M')
+    return shard, shards
+
+
+def _hash(key: str) -> int:
+    # hash() is salted per process, every process and host has to place a VCO on the same shard
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class ShardRing:
+    def __init__(self, *, shards: int, virtual_nodes: int = VIRTUAL_NODES) -> None:
+        """
+        Consistent hash ring of the vco_list.yml VCO names over shards numbered 1 to shards
+        The placement only depends on the VCO name and the number of shards, so processes on one or several hosts
+        split the VCOs without talking to each other. Going from M to M + 1 shards only moves about 1/(M + 1) of the
+        VCOs, the others keep their shard (and their warm caches)
+        :param shards: Number of shards (M of --shard N/M)
+        :param virtual_nodes: Points per shard on the ring
+        """
+        if shards < 1:
+            raise ValueError(f'shards must be at least 1 - got {shards}')
+        self.shards = shards
+        points = sorted((_hash(f'shard-{shard}-{node}'), shard)
+                        for shard in range(1, shards + 1) for node in range(virtual_nodes))
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def __repr__(self):
+        return "{}(shards={})".format(self.__class__.__name__, self.shards)
+
+    def shard_of(self, vco: str) -> int:
+        """
+        Shard of a VCO, the owner of the first ring point at or after the hash of its name
+        """
+        index = bisect.bisect_left(self._points, _hash(str(vco)))
+        return self._owners[index % len(self._points)]
+
+    def select(self, vcos: Iterable[str], shard: int) -> List[str]:
+        """
+        VCOs of vcos that belong to shard, in their original order
+        """
+        return [vco for vco in vcos if self.shard_of(vco) == shard]
@@ -0,0 +1,105 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+# R331-20190925-GA-35295, R15-AFTER-R11-MERGE-v1-676-g8e2f74a, R330-MAESTRO-20190404-MFG
+_BUILD_RE = re.compile(r'^R(\d)(\d)(\d*)(?:-(.*))?$')
+_DATE_RE = re.compile(r'^\d{8}$')
+
+
+class BuildVersion(NamedTuple):
+    major: int
+    minor: int
+    patch: int
+    date: Optional[str]
+    tag: str
+
+    @property
+    def release(self) -> Tuple[int, int, int]:
+        return self.major, self.minor, self.patch
+
+
+@lru_cache(maxsize=1024)
+def parse_build(build: Optional[str]) -> Optional[BuildVersion]:
+    """
+    Split an edge buildNumber into release, build date (YYYYMMDD) and the remaining tag, None when it is not an
+    R<major><minor><patch> build
+    IE: R331-20190925-GA-35295 is BuildVersion(major=3, minor=3, patch=1, date='20190925', tag='GA-35295')
+    """
+    match = _BUILD_RE.match(build or '')
+    if match is None:
+        return None
+    major, minor, patch, rest = match.groups()
+    parts = rest.split('-') if rest else []
+    date = None
+    for i, part in enumerate(parts):
+        if _DATE_RE.match(part):
+            date = part
+            parts = parts[:i] + parts[i + 1:]
+            break
+    return BuildVersion(major=int(major), minor=int(minor), patch=int(patch or 0), date=date, tag='-'.join(parts))
+
+
+class VersionCatalog:
+    def __init__(self, *, outdated: Iterable[str], eosl: Iterable[str], eosl_before: Optional[str] = None,
+                 recommended_from: Optional[str] = None) -> None:
+        """
+        Edge software builds that raise NOT_RECOMMENDED_VERSION and END_OF_SUPPORT_LIFE, loaded once from
+        version_catalog.json
+        Listed builds are frozenset lookups, eosl_before and recommended_from compare the parsed release so a whole
+        release line can be covered without listing every build
+        :param outdated: Builds that are not recommended anymore
+        :param eosl: Builds that are end of support life
+        :param eosl_before: Every build of a release older than this one (IE: R30) is end of support life
+        :param recommended_from: Only builds of this release (IE: R340) or newer are recommended
+        """
+        self.outdated = frozenset(outdated)
+        self.eosl = frozenset(eosl)
+        self.eosl_before = self._release(eosl_before)
+        self.recommended_from = self._release(recommended_from)
+
+    def __repr__(self):
+        return "{}(outdated={}, eosl={})".format(self.__class__.__name__, len(self.outdated), len(self.eosl))
+
+    @classmethod
+    def from_file(cls, path: str) -> 'VersionCatalog':
+        with open(path) as f:
+            catalog = json.load(f)
+        return cls(outdated=catalog.get('outdated', []), eosl=catalog.get('eosl', []),
+                   eosl_before=catalog.get('eosl_before'), recommended_from=catalog.get('recommended_from'))
+
+    @staticmethod
+    def _release(release: Optional[str]) -> Optional[Tuple[int, int, int]]:
+        if not release:
+            return None
+        build = parse_build(release)
+        if build is None:
+            raise ValueError(f'Invalid release {release}, expected R<major><minor>[<patch>]')
+        return build.release
+
+    def is_outdated(self, build: Optional[str]) -> bool:
+        return build in self.outdated
+
+    def is_eosl(self, build: Optional[str]) -> bool:
+        if build in self.eosl:
+            return True
+        if self.eosl_before is None:
+            return False
+        version = parse_build(build)
+        return version is not None and version.release < self.eosl_before
+
+    def is_recommended(self, build: Optional[str]) -> bool:
+        if self.is_outdated(build) or self.is_eosl(build):
+            return False
+        if self.recommended_from is None:
+            return True
+        version = parse_build(build)
+        return version is not None and version.release >= self.recommended_from
@@ -0,0 +1,305 @@
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Levels of the intake hierarchy, deeper levels run first so started customers finish before new ones are opened
+LEVEL_EDGE = 'edge'
+LEVEL_CUSTOMER = 'customer'
+LEVEL_VCO = 'vco'
+LEVELS = (LEVEL_EDGE, LEVEL_CUSTOMER, LEVEL_VCO)
+
+
+class Task:
+    def __init__(self, *, level: str, vco: str, fn: Callable, args: tuple = (), priority: float = 0,
+                 name: Optional[str] = None) -> None:
+        """
+        Unit of work of the WorkScheduler, fn is called as fn(worker_context, *args)
+        :param level: One of LEVELS
+        :param vco: VCO the task belongs to, counts against the concurrency cap of that VCO
+        :param priority: Lower runs first within a level (IE: lastUpdated epoch so stale edges go first)
+        :param name: Shown in errors, defaults to the function name
+        """
+        if level not in LEVELS:
+            raise ValueError(f'Unknown task level {level}')
+        self.level = level
+        self.vco = vco
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.name = name or getattr(fn, '__name__', repr(fn))
+        self.then: Optional[_Join] = None
+
+    def __repr__(self):
+        return "{}(level={!r}, vco={!r}, name={!r}, priority={!r})".format(self.__class__.__name__, self.level,
+                                                                         self.vco, self.name, self.priority)
+
+
+class _Join:
+    def __init__(self, scheduler: 'WorkScheduler', count: int, then: Task) -> None:
+        # Submits then once count tasks finished
+        self._scheduler = scheduler
+        self._count = count
+        self._then = then
+        self._lock = threading.Lock()
+
+    def done(self, worker: Optional['_Worker']) -> None:
+        with self._lock:
+            self._count -= 1
+            ready = self._count == 0
+        if ready:
+            self._scheduler._push(self._then, worker)
+        return
+
+
+class _Worker:
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.heap: List[tuple] = []
+        self.lock = threading.Lock()
+        self.context = None
+        self.thread: Optional[threading.Thread] = None
+
+
+class WorkScheduler:
+    def __init__(self, *, workers: int, vco_caps: Optional[Dict[str, int]] = None, default_vco_cap: int = 0,
+                 worker_init: Optional[Callable[[], any]] = None,
+                 worker_close: Optional[Callable[[any], None]] = None,
+                 on_error: Optional[Callable[[Task, Exception], None]] = None) -> None:
+        """
+        Work stealing scheduler for the VCO -> customer -> edge task hierarchy
+        Every worker thread has its own priority queue, tasks submitted from a task go to the queue of the worker
+        running it and idle workers steal from the others. A task only starts when its VCO runs fewer than its cap
+        of tasks, so one VCO can't take every worker or exceed the API capacity of its host
+        Tasks never block on other tasks, a task that needs the results of its children hands the follow up task to
+        submit_all, which submits it once the children finished
+        :param workers: Number of worker threads
+        :param vco_caps: Concurrent tasks allowed per VCO
+        :param default_vco_cap: Cap of VCOs missing from vco_caps, 0 is no cap
+        :param worker_init: Called once on each worker thread, the result is passed to every task the worker runs
+                            (IE: a MySQL connection per worker)
+        :param worker_close: Called with the worker_init result when the worker stops
+        :param on_error: Called with the task and the exception when a task raises
+        """
+        if workers < 1:
+            raise ValueError(f'workers must be at least 1 - got {workers}')
+        self.vco_caps = dict(vco_caps or {})
+        self.default_vco_cap = default_vco_cap
+        self._workers = [_Worker(index) for index in range(workers)]
+        self._worker_init = worker_init
+        self._worker_close = worker_close
+        self._on_error = on_error
+        self._local = threading.local()
+        self._seq = itertools.count()
+        self._next_worker = itertools.cycle(range(workers))
+        # _cond guards the counters below, worker heap locks are always taken before it
+        self._cond = threading.Condition()
+        self._version = 0
+        self._pending = 0
+        self._running: Dict[str, int] = {}
+        self._init_errors: List[Exception] = []
+        self._started: Optional[float] = None
+        self.steals = 0
+        self.submitted = {level: 0 for level in LEVELS}
+        self.completed = {level: 0 for level in LEVELS}
+        self.failed = {level: 0 for level in LEVELS}
+        self.busy_seconds = {level: 0.0 for level in LEVELS}
+
+    def __repr__(self):
+        return "{}(workers={}, pending={})".format(self.__class__.__name__, len(self._workers), self._pending)
+
+    def submit(self, task: Task) -> None:
+        """
+        Queue a task, from a task it goes to the queue of the current worker
+        """
+        with self._cond:
+            self._pending += 1
+            self.submitted[task.level] += 1
+        self._push(task, getattr(self._local, 'worker', None))
+        return
+
+    def submit_all(self, tasks: Iterable[Task], then: Optional[Task] = None) -> None:
+        """
+        Queue tasks and submit then once all of them finished (failed tasks count as finished)
+        then is submitted right away when tasks is empty
+        """
+        tasks = list(tasks)
+        if then is not None:
+            with self._cond:
+                self._pending += 1
+                self.submitted[then.level] += 1
+            if not tasks:
+                self._push(then, getattr(self._local, 'worker', None))
+                return
+            join = _Join(self, len(tasks), then)
+            for task in tasks:
+                task.then = join
+        for task in tasks:
+            self.submit(task)
+        return
+
+    def _push(self, task: Task, worker: Optional[_Worker]) -> None:
+        if worker is None:
+            worker = self._workers[next(self._next_worker)]
+        with worker.lock:
+            heapq.heappush(worker.heap, (LEVELS.index(task.level), task.priority, next(self._seq), task))
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+        return
+
+    def _cap(self, vco: str) -> int:
+        return self.vco_caps.get(vco, self.default_vco_cap)
+
+    def _pop_eligible(self, worker: _Worker) -> Optional[Task]:
+        """
+        Best task of the worker queue whose VCO is below its cap, the task is counted as running
+        """
+        with worker.lock:
+            skipped = []
+            task = None
+            with self._cond:
+                while worker.heap:
+                    entry = heapq.heappop(worker.heap)
+                    cap = self._cap(entry[3].vco)
+                    if cap and self._running.get(entry[3].vco, 0) >= cap:
+                        skipped.append(entry)
+                        continue
+                    task = entry[3]
+                    self._running[task.vco] = self._running.get(task.vco, 0) + 1
+                    break
+            for entry in skipped:
+                heapq.heappush(worker.heap, entry)
+        return task
+
+    def _take(self, worker: _Worker) -> Optional[Task]:
+        task = self._pop_eligible(worker)
+        if task is not None:
+            return task
+        victims = [victim for victim in self._workers if victim is not worker]
+        random.shuffle(victims)
+        for victim in sorted(victims, key=lambda victim: -len(victim.heap)):
+            task = self._pop_eligible(victim)
+            if task is not None:
+                with self._cond:
+                    self.steals += 1
+                return task
+        return None
+
+    def _run_worker(self, worker: _Worker) -> None:
+        self._local.worker = worker
+        try:
+            worker.context = self._worker_init() if self._worker_init is not None else None
+        except Exception as e:
+            with self._cond:
+                self._init_errors.append(e)
+                self._cond.notify_all()
+            return
+        try:
+            while True:
+                with self._cond:
+                    version = self._version
+                task = self._take(worker)
+                if task is None:
+                    with self._cond:
+                        if self._pending == 0:
+                            return
+                        if self._version == version:
+                            self._cond.wait(timeout=1)
+                    continue
+                self._execute(worker, task)
+        finally:
+            if self._worker_close is not None and worker.context is not None:
+                self._worker_close(worker.context)
+
+    def _execute(self, worker: _Worker, task: Task) -> None:
+        started = time.monotonic()
+        failed = False
+        try:
+            task.fn(worker.context, *task.args)
+        except Exception as e:
+            failed = True
+            if self._on_error is not None:
+                self._on_error(task, e)
+        if task.then is not None:
+            task.then.done(worker)
+        with self._cond:
+            self._running[task.vco] -= 1
+            self._pending -= 1
+            self.completed[task.level] += 1
+            if failed:
+                self.failed[task.level] += 1
+            self.busy_seconds[task.level] += time.monotonic() - started
+            self._version += 1
+            self._cond.notify_all()
+        return
+
+    def queue_depth(self) -> Dict[str, int]:
+        """
+        Queued (not running) tasks per level
+        """
+        depth = {level: 0 for level in LEVELS}
+        for worker in self._workers:
+            with worker.lock:
+                for entry in worker.heap:
+                    depth[entry[3].level] += 1
+        return depth
+
+    def report(self) -> Dict[str, any]:
+        """
+        Queue depth, running tasks per VCO and per level counters with throughput in tasks per second
+        """
+        depth = self.queue_depth()
+        with self._cond:
+            elapsed = time.monotonic() - self._started if self._started is not None else 0
+            return {
+                'elapsed': round(elapsed, 1),
+                'pending': self._pending,
+                'steals': self.steals,
+                'running': {vco: count for vco, count in self._running.items() if count},
+                'levels': {level: {'queued': depth[level],
+                                   'submitted': self.submitted[level],
+                                   'completed': self.completed[level],
+                                   'failed': self.failed[level],
+                                   'per_second': round(self.completed[level] / elapsed, 3) if elapsed else 0,
+                                   'busy_seconds': round(self.busy_seconds[level], 1)}
+                           for level in LEVELS},
+            }
+
+    def run(self, report: Optional[Callable[[Dict[str, any]], None]] = None, report_interval: float = 60) -> None:
+        """
+        Start the workers and block until every submitted task (and everything they submit) finished
+        :param report: Called with report() every report_interval seconds and once at the end
+        """
+        self._started = time.monotonic()
+        for worker in self._workers:
+            worker.thread = threading.Thread(target=self._run_worker, args=(worker,),
+                                             name=f'scheduler-{worker.index}', daemon=True)
+            worker.thread.start()
+        next_report = time.monotonic() + report_interval
+        with self._cond:
+            while self._pending and len(self._init_errors) < len(self._workers):
+                self._cond.wait(timeout=max(0.1, min(1.0, next_report - time.monotonic())))
+                if report is not None and time.monotonic() >= next_report:
+                    self._cond.release()
+                    try:
+                        report(self.report())
+                    finally:
+                        self._cond.acquire()
+                    next_report = time.monotonic() + report_interval
+        for worker in self._workers:
+            worker.thread.join()
+        if report is not None:
+            report(self.report())
+        if self._pending:
+            raise RuntimeError(f'No worker could start, {self._pending} tasks left') from self._init_errors[0]
+        return
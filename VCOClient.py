@@ -22,20 +22,168 @@ Examples:
 
 (2) Get Edges
     client.call_api("enterprise/getEnterpriseEdges", { "enterpriseId": 1 })
+
+(3) Connection reuse
+    client.connection_stats()
+    get_transport_stats()
+
+(4) Rate limiting
+    client = VcoRequestManager("vcoXX-usvi1.velocloud.net", requests_per_second=2, burst=1)
+    Every call_api/authenticate waits on a token bucket shared by all clients of the same host.
+    requests_per_second=None (the default) disables limiting.
+
+Transport:
+Every VcoRequestManager pointed at the same VCO host shares one keep-alive HTTPAdapter (and so one urllib3 pool
+manager). Sessions stay per client so auth cookies and tokens are not shared, but TCP/TLS connections are.
+The first client created for a host decides the pool sizing for that host.
 """
 
 import json
 import re
+import socket
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+DEFAULT_MAX_RETRIES = 0
+
+_host_adapters = {}
+_host_adapters_lock = threading.Lock()
+_host_limiters = {}
+_host_limiters_lock = threading.Lock()
 
 
 class ApiException(Exception):
     pass
 
 
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that turns on TCP keep-alive for every pooled socket so idle connections to a VCO survive
+    between calls instead of being dropped by middle boxes and paying a new TLS handshake
+    """
+
+    def __init__(self, keepalive_idle=60, keepalive_interval=15, keepalive_count=4, **kwargs):
+        self._socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        # Tuning options are platform specific, only add the ones this OS knows about
+        for name, value in (('TCP_KEEPIDLE', keepalive_idle), ('TCP_KEEPINTVL', keepalive_interval),
+                            ('TCP_KEEPCNT', keepalive_count)):
+            if hasattr(socket, name):
+                self._socket_options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+    def connection_stats(self):
+        """
+        Sum request and connection counters over every urllib3 pool owned by this adapter
+        reused is the number of requests that went out on an already open connection
+        """
+        stats = {'pools': 0, 'requests': 0, 'connections': 0, 'reused': 0}
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['pools'] += 1
+            stats['requests'] += pool.num_requests
+            stats['connections'] += pool.num_connections
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
+
+
+def get_host_adapter(root_url, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                     max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Return the shared KeepAliveAdapter for a VCO root url, creating it on first use
+    """
+    with _host_adapters_lock:
+        adapter = _host_adapters.get(root_url)
+        if adapter is None:
+            adapter = KeepAliveAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                       max_retries=max_retries, pool_block=False)
+            _host_adapters[root_url] = adapter
+        return adapter
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket - refills at rate tokens per second up to capacity tokens
+    Callers that find the bucket empty reserve their token anyway and are told how long to wait, which keeps waiting
+    callers in arrival order instead of letting them race for the next token
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError(f'rate must be greater than 0 - got {rate}')
+        self.rate = float(rate)
+        self.capacity = float(max(capacity, 1))
+        self.waited = 0.0
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens from the bucket and return the number of seconds the caller must wait before using them
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            wait = -self._tokens / self.rate
+            self.waited += wait
+            return wait
+
+    def acquire(self, tokens=1):
+        """
+        Block until tokens are available, returns the time spent waiting
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def get_host_limiter(root_url, requests_per_second, burst=1):
+    """
+    Return the shared TokenBucket for a VCO root url, creating it on first use
+    Returns None when requests_per_second is not set, which disables rate limiting
+    """
+    if not requests_per_second:
+        return None
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(root_url)
+        if limiter is None:
+            limiter = TokenBucket(rate=requests_per_second, capacity=burst)
+            _host_limiters[root_url] = limiter
+        return limiter
+
+
+def get_transport_stats():
+    """
+    Connection reuse statistics for every VCO host used by this process, keyed by root url
+    """
+    with _host_adapters_lock:
+        adapters = dict(_host_adapters)
+    return {root_url: adapter.connection_stats() for root_url, adapter in adapters.items()}
+
+
 class VcoRequestManager(object):
 
-    def __init__(self, hostname, verify_ssl=True, timeout=30):
+    def __init__(self, hostname, verify_ssl=True, timeout=30, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, max_retries=DEFAULT_MAX_RETRIES, requests_per_second=None,
+                 burst=1):
         self._session = requests.Session()
         self._verify_ssl = verify_ssl
         self.timeout = timeout
@@ -43,6 +191,12 @@ class VcoRequestManager(object):
         self._portal_url = self._root_url + "/portal/"
         self._livepull_url = self._root_url + "/livepull/liveData/"
         self._seqno = 0
+        self._adapter = get_host_adapter(self._root_url, pool_connections=pool_connections,
+                                         pool_maxsize=pool_maxsize, max_retries=max_retries)
+        self._session.mount(self._root_url, self._adapter)
+        self._limiter = get_host_limiter(self._root_url, requests_per_second=requests_per_second, burst=burst)
+        # Headers are merged by the session on every request, set them once instead of per call
+        self._session.headers["Content-Type"] = "application/json"
 
     @staticmethod
     def _clean_method_name(raw_name):
@@ -60,6 +214,13 @@ class VcoRequestManager(object):
             re.sub('http(s)?://', '', hostname)
         return "https://" + hostname
 
+    def _wait_for_token(self):
+        """
+        Block until the host rate limit allows another request
+        """
+        if self._limiter is not None:
+            self._limiter.acquire()
+
     def authenticate(self, username, password, is_operator=True):
         """
         Authenticate to API - on success, a cookie is stored in the session
@@ -67,9 +228,9 @@ class VcoRequestManager(object):
         path = "/login/operatorLogin" if is_operator else "/login/enterpriseLogin"
         url = self._root_url + path
         data = {"username": username, "password": password}
-        self._session.headers["Content-Type"] = "application/json"
-        r = self._session.post(url, headers=self._session.headers, data=json.dumps(data), allow_redirects=False,
-                               verify=self._verify_ssl, timeout=self.timeout)
+        self._wait_for_token()
+        r = self._session.post(url, data=json.dumps(data), allow_redirects=False, verify=self._verify_ssl,
+                               timeout=self.timeout)
         return r
 
     def call_api(self, method, params, **kwargs):
@@ -78,7 +239,6 @@ class VcoRequestManager(object):
         Returns method result as a Python dictionary
         """
         self._seqno += 1
-        self._session.headers["Content-Type"] = "application/json"
         method = self._clean_method_name(method)
         payload = {"jsonrpc": "2.0", "id": self._seqno, "method": method, "params": params}
 
@@ -86,12 +246,12 @@ class VcoRequestManager(object):
             url = self._livepull_url
         else:
             url = self._portal_url
+        self._wait_for_token()
         if "timeout" not in kwargs:
-            r = self._session.post(url, headers=self._session.headers, data=json.dumps(payload),
-                                   verify=self._verify_ssl, timeout=self.timeout, **kwargs)
+            r = self._session.post(url, data=json.dumps(payload), verify=self._verify_ssl, timeout=self.timeout,
+                                   **kwargs)
         else:
-            r = self._session.post(url, headers=self._session.headers, data=json.dumps(payload),
-                                   verify=self._verify_ssl, **kwargs)
+            r = self._session.post(url, data=json.dumps(payload), verify=self._verify_ssl, **kwargs)
         response_dict = r.json()
         if "error" in response_dict:
             raise ApiException(response_dict["error"]["message"])
@@ -100,3 +260,9 @@ class VcoRequestManager(object):
     def update_token(self, token):
         self._session.headers.update({"Authorization": f"Token {token}"})
         return
+
+    def connection_stats(self):
+        """
+        Connection reuse statistics for this client's VCO host (shared with other clients on the same host)
+        """
+        return self._adapter.connection_stats()
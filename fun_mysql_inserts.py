@@ -6,12 +6,23 @@ SPDX-License-Identifier: BSD-2-Clause
 """
 
 import logging
+import os
 import re
+import threading
 from datetime import datetime
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional
 
 from mysql.connector import cursor, MySQLConnection
 
+from Objects.ChangeCache import ChangeCache
+
+# Schema the Edge column whitelist is read from
+EDGE_SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'customer.sql')
+
+_active_edge_builders: Dict[int, 'EdgeRowBuilder'] = {}
+_active_edge_builders_lock = threading.Lock()
+
 
 def mysql_PowerBI_SLA_EDGE_INSERT(mysql_handle, mysql_cursor, EdgeID, VCO, EdgeName, EdgeStatus, CustomerName,
                                   Customer_ID):
@@ -122,11 +133,126 @@ def mysql_PowerBI_EDGE_UPDATE_LOCATION(mysql_handle, mysql_cursor, Customer_ID,
     mysql_handle.commit()
 
 
+@lru_cache(maxsize=None)
+def get_edge_columns(schema_file: str = EDGE_SCHEMA_FILE) -> FrozenSet[str]:
+    """
+    Column names of the Edge table as defined in customer.sql
+    """
+    with open(schema_file) as f:
+        schema = f.read()
+    table = re.search(r"CREATE TABLE `Edge` \((.*?)\n\)", schema, re.S)
+    return frozenset(re.findall(r"^\s*`(\w+)`", table.group(1), re.M))
+
+
+def validate_edge_column(column: str) -> None:
+    if column not in get_edge_columns():
+        raise ValueError(f'{column} is not a column of the Edge table')
+
+
+class EdgeRowBuilder(object):
+    def __init__(self, *, mysql_cursor: cursor, mysql_handle: MySQLConnection, log_name: str,
+                 change_cache: Optional[ChangeCache] = None):
+        """
+        Collects Edge column changes and writes them as one UPDATE Edge per edge with one commit
+        While active (used as a context manager) mysql_PowerBI_EDGE_UPDATE_GENERIC_ATTRIBUTE calls on the same cursor
+        are collected instead of being written one column at a time
+        Column names are validated against the Edge table in customer.sql
+        With a change_cache, columns identical to the stored ones are left out of the UPDATE
+        Usage:
+            with EdgeRowBuilder(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle, log_name=VCO_CUSTOMER_EDGE):
+                update_qos(...)
+                update_config_specific(...)
+        """
+        self.mysql_cursor = mysql_cursor
+        self.mysql_handle = mysql_handle
+        self.log_name = log_name
+        self.change_cache = change_cache
+        # EdgeID -> column -> value, a later value for a column replaces an earlier one
+        self._rows: Dict[str, Dict[str, any]] = {}
+        self._previous: Optional[EdgeRowBuilder] = None
+
+    def __enter__(self):
+        with _active_edge_builders_lock:
+            self._previous = _active_edge_builders.get(id(self.mysql_cursor))
+            _active_edge_builders[id(self.mysql_cursor)] = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.flush()
+        finally:
+            with _active_edge_builders_lock:
+                if self._previous is None:
+                    _active_edge_builders.pop(id(self.mysql_cursor), None)
+                else:
+                    _active_edge_builders[id(self.mysql_cursor)] = self._previous
+        return False
+
+    @staticmethod
+    def active(mysql_cursor: cursor) -> Optional['EdgeRowBuilder']:
+        """
+        Builder collecting Edge updates for this cursor, None when updates should be written right away
+        """
+        return _active_edge_builders.get(id(mysql_cursor))
+
+    def set(self, edge_id: str, column: str, value: any) -> None:
+        validate_edge_column(column)
+        columns = self._rows.setdefault(edge_id, {})
+        if self.change_cache is not None:
+            # A value collected earlier in this pass is newer than the cache, compare against it first
+            if column in columns and columns[column] == value:
+                return
+            if not self.change_cache.has_changed((edge_id, 'Edge', column), value) and column not in columns:
+                return
+        columns[column] = value
+        return
+
+    def flush(self) -> None:
+        """
+        Write one UPDATE Edge per edge with every collected column and commit once
+        If the UPDATE of an edge fails its columns are retried one by one so one bad value doesn't drop the others
+        """
+        logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': self.log_name})
+        logger.setLevel(logging.INFO)
+
+        columns_written = 0
+        for edge_id, columns in self._rows.items():
+            if not columns:
+                continue
+            query = "UPDATE Edge SET " + ", ".join(f"{column}=%s" for column in columns) + " WHERE EdgeID=%s;"
+            val = (*columns.values(), edge_id)
+            logger.info(f'UPDATE {", ".join(columns)} VALUE EDGE')
+            logger.info(val)
+            try:
+                self.mysql_cursor.execute(query, val)
+                columns_written += len(columns)
+            except Exception as e:
+                logger.error(f'UPDATE of {len(columns)} Edge columns failed, writing one by one: {e}')
+                for column, value in columns.items():
+                    try:
+                        self.mysql_cursor.execute(f"UPDATE Edge SET {column}=%s WHERE EdgeID=%s;", (value, edge_id))
+                        columns_written += 1
+                    except Exception as column_e:
+                        logger.error(f'UPDATE {column} VALUE EDGE failed: {value} - {column_e}')
+                        if self.change_cache is not None:
+                            self.change_cache.forget((edge_id, 'Edge', column))
+        self._rows = {}
+        if columns_written:
+            self.mysql_handle.commit()
+        return
+
+
 def mysql_PowerBI_EDGE_UPDATE_GENERIC_ATTRIBUTE(mysql_handle, mysql_cursor, Customer_ID, edge, VCO, VCO_CUSTOMER_EDGE,
                                                 ATTRIBUTE, VALUE):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
 
+    builder = EdgeRowBuilder.active(mysql_cursor)
+    if builder is not None:
+        builder.set(edge['logicalId'], ATTRIBUTE, VALUE)
+        return
+
+    validate_edge_column(ATTRIBUTE)
     query = """UPDATE Edge 
                SET """ + ATTRIBUTE + """=%s
                WHERE EdgeID=%s; """
@@ -153,31 +279,43 @@ def mysql_PowerBI_CUSTOMER_UPDATE_GENERIC_ATTRIBUTE(mysql_handle, mysql_cursor,
     mysql_handle.commit()
 
 
+DAILY_QOE_COLUMNS = ('Date', 'EdgeID', 'LinkUUID', 'Score', 'lowest_linkscore', 'LinkBlackouts',
+                     'LinkBlackoutDuration', 'LinkBrownouts', 'LinkBrownoutDuration')
+# Rows per DailyQOE INSERT statement, 30 days of a multi link edge fit in one
+DAILY_QOE_ROWS_PER_STATEMENT = 500
+
+
 def mysql_PowerBI_EDGE_INSERT_QOE(mysql_handle, mysql_cursor, edge, vco, VCO_CUSTOMER_EDGE, Date, EdgeID, LinkUUID,
                                   Score, lowest_linkscore, LinkBlackouts, LinkBlackoutDuration, LinkBrownouts,
                                   LinkBrownoutDuration):
+    row = {'Date': Date, 'EdgeID': EdgeID, 'LinkUUID': LinkUUID, 'Score': Score, 'lowest_linkscore': lowest_linkscore,
+           'LinkBlackouts': LinkBlackouts, 'LinkBlackoutDuration': LinkBlackoutDuration, 'LinkBrownouts': LinkBrownouts,
+           'LinkBrownoutDuration': LinkBrownoutDuration}
+    mysql_PowerBI_EDGE_INSERT_QOE_MANY(mysql_handle, mysql_cursor, VCO_CUSTOMER_EDGE, [row])
+
+
+def mysql_PowerBI_EDGE_INSERT_QOE_MANY(mysql_handle, mysql_cursor, VCO_CUSTOMER_EDGE, rows: List[Dict[str, any]]):
+    """
+    Upsert DailyQOE rows with multi row INSERT statements and a single commit
+    :param rows: Dicts keyed by DAILY_QOE_COLUMNS
+    """
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
-    query = """INSERT  IGNORE  INTO DailyQOE (Date, EdgeID, LinkUUID , Score,lowest_linkscore, LinkBlackouts, LinkBlackoutDuration, LinkBrownouts,LinkBrownoutDuration)
-                                            VALUES ( %s, %s, %s, %s, %s, %s, %s,%s,%s)
-                                            ON DUPLICATE KEY UPDATE
-                                            Date= VALUES(Date),
-                                            EdgeID= VALUES(EdgeID),
-                                            LinkUUID= VALUES(LinkUUID),
-                                            Score= VALUES(Score),
-                                            lowest_linkscore = VALUES(lowest_linkscore),
-                                            LinkBlackouts= VALUES(LinkBlackouts),
-                                            LinkBlackoutDuration= VALUES(LinkBlackoutDuration),
-                                            LinkBrownouts= VALUES(LinkBrownouts),
-                                            LinkBrownoutDuration= VALUES(LinkBrownoutDuration)
-                                            ;
-                               """
-    val = (Date, EdgeID, LinkUUID, Score, lowest_linkscore, LinkBlackouts, LinkBlackoutDuration, LinkBrownouts,
-           LinkBrownoutDuration)
-    logger.info(
-        "INSERT IGNORE INTO DailyQOE (Date, EdgeID, LinkUUID , Score,lowest_linkscore, LinkBlackouts, LinkBlackoutDuration, LinkBrownouts,LinkBrownoutDuration)")
-    logger.info(val)
-    mysql_cursor.execute(query, val)
+    if not rows:
+        return
+    placeholders = '(' + ', '.join(['%s'] * len(DAILY_QOE_COLUMNS)) + ')'
+    updates = ',\n'.join(f'{column} = VALUES({column})' for column in DAILY_QOE_COLUMNS)
+    logger.info(f'INSERT IGNORE INTO DailyQOE ({", ".join(DAILY_QOE_COLUMNS)}) {len(rows)} rows')
+    for start in range(0, len(rows), DAILY_QOE_ROWS_PER_STATEMENT):
+        chunk = rows[start:start + DAILY_QOE_ROWS_PER_STATEMENT]
+        query = f"""INSERT IGNORE INTO DailyQOE ({', '.join(DAILY_QOE_COLUMNS)})
+                    VALUES {', '.join([placeholders] * len(chunk))}
+                    ON DUPLICATE KEY UPDATE
+                    {updates};
+                 """
+        val = tuple(row[column] for row in chunk for column in DAILY_QOE_COLUMNS)
+        logger.info(val)
+        mysql_cursor.execute(query, val)
     mysql_handle.commit()
 
 
@@ -344,8 +482,11 @@ def update_customer_with_vco_name_partner(mysql_cursor: cursor, mysql_handle, cu
     mysql_handle.commit()
 
 
-def upsert_attribute(curs: cursor, table_name: str, unique_key: str, unique_key_name: str, name: str, used: bool,
-                     num: int, text: str, filter_val: str = None, sql_cnx: MySQLConnection = None):
+def attribute_values(unique_key: str, unique_key_name: str, name: str, used: bool, num: int, text: str,
+                     filter_val: str = None) -> Dict[str, any]:
+    """
+    Validate an attribute and build the values used by the attribute upsert query
+    """
     # Raise Error if input is not a boolean or None
     if used not in [True, False, 0, 1, None]:
         raise TypeError(f'Used parameter is not boolean or None - Parameter was: {used}')
@@ -354,10 +495,12 @@ def upsert_attribute(curs: cursor, table_name: str, unique_key: str, unique_key_
     if filter_val is None:
         filter_val = f'{name}-{used}'
 
-    values = {'table_name': table_name, unique_key_name: unique_key, 'name': name, 'used': used, 'num': num,
-              'text': text, 'filter_val': filter_val}
+    return {unique_key_name: unique_key, 'name': name, 'used': used, 'num': num, 'text': text,
+            'filter_val': filter_val}
+
 
-    query = f"""
+def attribute_upsert_query(table_name: str, unique_key_name: str) -> str:
+    return f"""
             INSERT INTO {table_name} ({unique_key_name}, name, used, num, text, filter_val)
             VALUES (%({unique_key_name})s, %(name)s, %(used)s, %(num)s, %(text)s, %(filter_val)s)
             ON DUPLICATE KEY UPDATE 
@@ -367,7 +510,29 @@ def upsert_attribute(curs: cursor, table_name: str, unique_key: str, unique_key_
                 filter_val=VALUES(filter_val);
             """
 
-    curs.execute(query, values)
+
+def upsert_attribute(curs: cursor, table_name: str, unique_key: str, unique_key_name: str, name: str, used: bool,
+                     num: int, text: str, filter_val: str = None, sql_cnx: MySQLConnection = None):
+    values = attribute_values(unique_key=unique_key, unique_key_name=unique_key_name, name=name, used=used, num=num,
+                              text=text, filter_val=filter_val)
+    values['table_name'] = table_name
+
+    curs.execute(attribute_upsert_query(table_name, unique_key_name), values)
+    # only commit if a handle is provided, leaving the ability to commit multiple attributes with one commit call
+    if sql_cnx:
+        sql_cnx.commit()
+    return
+
+
+def upsert_attributes_many(curs: cursor, table_name: str, unique_key_name: str, rows: List[Dict[str, any]],
+                           sql_cnx: MySQLConnection = None):
+    """
+    Multi row version of upsert_attribute
+    :param rows: values as built by attribute_values
+    """
+    if not rows:
+        return
+    curs.executemany(attribute_upsert_query(table_name, unique_key_name), rows)
     # only commit if a handle is provided, leaving the ability to commit multiple attributes with one commit call
     if sql_cnx:
         sql_cnx.commit()
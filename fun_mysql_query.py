@@ -7,11 +7,15 @@ SPDX-License-Identifier: BSD-2-Clause
 
 from datetime import timedelta, datetime
 import logging
-from typing import Dict
+from typing import Dict, List, Optional
 
 from mysql.connector import MySQLConnection
 
 import fun_mysql_inserts as sql_inserts
+from Objects.CustomerSnapshot import CustomerSnapshot
+
+# Edges per EdgeID IN (...) query when loading a customer snapshot
+SNAPSHOT_CHUNK_SIZE = 500
 
 
 def determine_if_customer_needs_update(mysql_cursor, mysql_handle, customerid, VCO_CUSTOMER_EDGE):
@@ -37,12 +41,16 @@ def determine_if_customer_needs_update(mysql_cursor, mysql_handle, customerid, V
     return True
 
 
-def determine_if_edge_needs_update(mysql_cursor, mysql_handle, EdgeID, VCO_CUSTOMER_EDGE):
+def determine_if_edge_needs_update(mysql_cursor, mysql_handle, EdgeID, VCO_CUSTOMER_EDGE,
+                                   snapshot: Optional[CustomerSnapshot] = None):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
     # THIS FUNCNTION WILL DETERMINE IF CUSTOMER NEEDS UPDATE AND RETURN YES/NO
-    mysql_cursor.execute("SELECT lastUpdated from Edge WHERE EdgeID  = '%s'" % (EdgeID))
-    result = mysql_cursor.fetchall()
+    if snapshot is not None and snapshot.covers_edge(EdgeID):
+        result = snapshot.edge_rows(EdgeID, 'lastUpdated')
+    else:
+        mysql_cursor.execute("SELECT lastUpdated from Edge WHERE EdgeID  = '%s'" % (EdgeID))
+        result = mysql_cursor.fetchall()
     date = datetime.utcnow()
     date_before = date - timedelta(days=8)
     date_before = date_before.strftime('%Y-%m-%d')
@@ -60,15 +68,19 @@ def determine_if_edge_needs_update(mysql_cursor, mysql_handle, EdgeID, VCO_CUSTO
     return True
 
 
-def determine_if_link_qoe_needs_update(mysql_cursor, mysql_handle, Lastupdate, EdgeID, VCO_CUSTOMER_EDGE):
+def determine_if_link_qoe_needs_update(mysql_cursor, mysql_handle, Lastupdate, EdgeID, VCO_CUSTOMER_EDGE,
+                                       snapshot: Optional[CustomerSnapshot] = None):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
     logger.debug(Lastupdate)
     # Lastupdate= "2020-05-01 00:00:00"
     # ysql_cursor.execute("SELECT Date from DailyQOE  WHERE EdgeID  = '%s'" % (EdgeID))
-    mysql_cursor.execute("SELECT Date from DailyQOE  WHERE EdgeID  = '%s' AND Date = '%s'" % (EdgeID,Lastupdate))
-    logger.debug("SELECT Date from DailyQOE  WHERE EdgeID  = '%s' AND Date = '%s'" % (EdgeID,Lastupdate))
-    result = mysql_cursor.fetchall()
+    if snapshot is not None and snapshot.covers_qoe(EdgeID, Lastupdate):
+        result = snapshot.qoe_rows(EdgeID, Lastupdate)
+    else:
+        mysql_cursor.execute("SELECT Date from DailyQOE  WHERE EdgeID  = '%s' AND Date = '%s'" % (EdgeID,Lastupdate))
+        logger.debug("SELECT Date from DailyQOE  WHERE EdgeID  = '%s' AND Date = '%s'" % (EdgeID,Lastupdate))
+        result = mysql_cursor.fetchall()
     if result:
         logger.debug("NO QOE UPDATE NEEDED")
         return False
@@ -95,11 +107,15 @@ def determine_if_velo_qoe_needs_update(mysql_cursor, mysql_handle, Lastupdate, E
         return True
 
 
-def determine_if_edge_needs_location_update(mysql_cursor, mysql_handle, EdgeID, VCO_CUSTOMER_EDGE):
+def determine_if_edge_needs_location_update(mysql_cursor, mysql_handle, EdgeID, VCO_CUSTOMER_EDGE,
+                                            snapshot: Optional[CustomerSnapshot] = None):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
-    mysql_cursor.execute("SELECT Country from Edge WHERE EdgeID  = '%s'" % (EdgeID))
-    result = mysql_cursor.fetchall()
+    if snapshot is not None and snapshot.covers_edge(EdgeID):
+        result = snapshot.edge_rows(EdgeID, 'Country')
+    else:
+        mysql_cursor.execute("SELECT Country from Edge WHERE EdgeID  = '%s'" % (EdgeID))
+        result = mysql_cursor.fetchall()
     date = datetime.utcnow()
     for row in result:
         country = row[0]
@@ -145,12 +161,15 @@ def determine_if_customer_exists_in_mysql_creates_if_not(mysql_cursor, mysql_han
 
 
 def determine_if_edge_exists_in_mysql_creates_if_not(mysql_cursor, mysql_handle, customerid, edge, VCO,
-                                                     VCO_CUSTOMER_EDGE):
+                                                     VCO_CUSTOMER_EDGE, snapshot: Optional[CustomerSnapshot] = None):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
     # THIS FUNCNTION WILL DETERMINE IF EDGE EXISTS
-    mysql_cursor.execute("SELECT lastUpdated from Edge WHERE EdgeID  = '%s'" % (edge["logicalId"]))
-    result = mysql_cursor.fetchall()
+    if snapshot is not None and snapshot.covers_edge(edge["logicalId"]):
+        result = snapshot.edge_rows(edge["logicalId"], 'lastUpdated')
+    else:
+        mysql_cursor.execute("SELECT lastUpdated from Edge WHERE EdgeID  = '%s'" % (edge["logicalId"]))
+        result = mysql_cursor.fetchall()
 
     for row in result:
         logger.info("UPDATING EDGE PRESENT IN DATABASE")
@@ -158,6 +177,8 @@ def determine_if_edge_exists_in_mysql_creates_if_not(mysql_cursor, mysql_handle,
 
     logger.info("EDGE NOT PRESENT IN DATABASE CREATE EDGE IN DATABASE")
     sql_inserts.mysql_PowerBI_EDGE_INSERT(mysql_handle, mysql_cursor, customerid, edge, VCO, VCO_CUSTOMER_EDGE)
+    if snapshot is not None:
+        snapshot.add_edge(edge["logicalId"])
     return True
 
 
@@ -182,3 +203,65 @@ def get_edge_attributes(sql_cnx: MySQLConnection, edge_uuid: str, log_name) -> D
 
     logger.info('Done with get_edge_attributes')
     return return_result
+
+
+def _snapshot_chunks(edge_uuids: List[str]):
+    for i in range(0, len(edge_uuids), SNAPSHOT_CHUNK_SIZE):
+        yield edge_uuids[i:i + SNAPSHOT_CHUNK_SIZE]
+
+
+def load_customer_snapshot_edges(mysql_cursor, snapshot: CustomerSnapshot, VCO_CUSTOMER_EDGE) -> CustomerSnapshot:
+    """
+    (Re)load the Edge rows of every edge the snapshot covers, seeding the change cache with their column values
+    Run again after a phase that writes Edge rows so lastUpdated matches what a per edge SELECT would return
+    """
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    rows = []
+    for chunk in _snapshot_chunks(sorted(snapshot.edge_uuids)):
+        query = "SELECT * from Edge WHERE EdgeID IN (" + ", ".join(["%s"] * len(chunk)) + ")"
+        mysql_cursor.execute(query, tuple(chunk))
+        rows += [dict(zip(mysql_cursor.column_names, row)) for row in mysql_cursor.fetchall()]
+    snapshot.set_edges((row['EdgeID'], row['lastUpdated'], row['Country']) for row in rows)
+    snapshot.changes.seed(((row['EdgeID'], 'Edge', column), value) for row in rows for column, value in row.items()
+                          if column not in ('EdgeID', 'lastUpdated'))
+    logger.debug(f'Loaded {len(rows)} Edge rows into snapshot')
+    return snapshot
+
+
+def load_customer_snapshot(mysql_cursor, customer_uuid: str, edge_uuids: List[str], VCO_CUSTOMER_EDGE,
+                           qoe_days: int = 31) -> CustomerSnapshot:
+    """
+    Load the DB state the determine_* queries need for a whole customer with set based queries
+    Also seeds the snapshot change cache with the stored Edge columns and EdgeAttributes of the customer edges
+    :param customer_uuid: Customer logicalId
+    :param edge_uuids: logicalIds of the customer edges as returned by getEnterpriseEdges
+    :param qoe_days: Days of DailyQOE dates to load, must cover the QoE window of update_edge_qoe
+    :return: CustomerSnapshot to pass to the determine_* functions
+    """
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.INFO)
+
+    qoe_since = (datetime.now() - timedelta(days=qoe_days)).strftime('%Y-%m-%d 00:00:00')
+    snapshot = CustomerSnapshot(customer_uuid=customer_uuid, edge_uuids=[uuid for uuid in edge_uuids if uuid],
+                                qoe_since=qoe_since)
+    load_customer_snapshot_edges(mysql_cursor, snapshot, VCO_CUSTOMER_EDGE)
+
+    rows = []
+    for chunk in _snapshot_chunks(sorted(snapshot.edge_uuids)):
+        query = "SELECT EdgeID, Date from DailyQOE WHERE Date >= %s AND EdgeID IN (" + \
+                ", ".join(["%s"] * len(chunk)) + ")"
+        mysql_cursor.execute(query, (qoe_since, *chunk))
+        rows += mysql_cursor.fetchall()
+    snapshot.set_qoe_dates(rows)
+
+    rows = []
+    for chunk in _snapshot_chunks(sorted(snapshot.edge_uuids)):
+        query = "SELECT edge_uuid, name, used, num, text, filter_val from EdgeAttributes WHERE edge_uuid IN (" + \
+                ", ".join(["%s"] * len(chunk)) + ")"
+        mysql_cursor.execute(query, tuple(chunk))
+        rows += mysql_cursor.fetchall()
+    snapshot.changes.seed(((edge_uuid, 'EdgeAttributes', name), (used, num, text, filter_val))
+                          for edge_uuid, name, used, num, text, filter_val in rows)
+
+    logger.info(f'Loaded DB snapshot {snapshot}')
+    return snapshot
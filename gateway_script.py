@@ -9,7 +9,6 @@ SPDX-License-Identifier: BSD-2-Clause
 import mysql.connector
 import argparse
 import concurrent.futures
-import json
 import logging
 import os
 import sys
@@ -22,11 +21,11 @@ import re
 import urllib3
 import certifi
 from geopy.geocoders import Nominatim
-import geoip2.webservice
-from time import sleep
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import Functions.geolocation as geolocation
 import Functions.vco_calls as vco_calls
 from Objects.Config import Config
+from Objects.ShardRing import ShardRing, parse_shard
 from VCOClient import VcoRequestManager
 # LOAD AUX FILES
 
@@ -35,6 +34,8 @@ parser.add_argument('--start_range', type=int, help='start_vco', required=False)
 parser.add_argument('--end_range', type=int, help='end_vco', required=False)
 parser.add_argument('--logging_file', type=str, help='logging File', required=True)
 parser.add_argument('--VCO', type=str, help='VCO', required=False)
+parser.add_argument('--shard', type=parse_shard, help='N/M - only process the VCOs of shard N out of M',
+                    required=False)
 
 args = parser.parse_args()
 # setup config
@@ -79,6 +80,12 @@ mycursor = cnx.cursor()
 with open(cfg.files.vco_list) as f:
     vco_list = yaml.load(f, Loader=yaml.BaseLoader)
 
+vcos = list(vco_list)
+if args.shard:
+    shard, shards = args.shard
+    vcos = ShardRing(shards=shards).select(vcos, shard)
+    local_logger.info(f'Shard {shard}/{shards}: {len(vcos)} of {len(vco_list)} VCOs')
+
 
 def uo(args, **kwargs):
     return urllib.request.urlopen(args, cafile=certifi.where(), **kwargs)
@@ -117,20 +124,19 @@ def gateway_update_process(client, mycursor, VCO_CUSTOMER_EDGE):
       GWPostalCode = "Not set"
       geolocator = Nominatim(user_agent="get link details")
       geolocator.urlopen = uo
+      geocode_cache = geolocation.get_geocode_cache(cfg)
+      offline_geocoder = geolocation.get_offline_geocoder(cfg)
       #print (gw["ipAddress"])
       # Try to get location using geolocation
       try:
-        geos = [json.loads(line) for line in open('DataFiles/country.json', 'r')]
+        countries = geolocation.get_country_index(cfg)
         try:
             ### NOTE THIS CODE NEEDS TO BE IMPROVED, WE SHOULD TAKE IN ACCOUNT WHEN WE DONT HAVE LAT AND LONG BUT WE HAVE AN ADDRESS THAT WE CAN USE TO DETERMINE LAT AND LON
             if gw["site"]["lat"] != None and gw["site"]["lon"] != None:
                 lat = gw["site"]["lat"]
                 lon = gw["site"]["lon"]
-                geoval = '%s,%s' % (gw["site"]["lat"], gw["site"]["lon"])
-                location = geolocator.reverse(geoval, language="en-US,en")
-                sleep(10)  # sleeping since there is a limit of quota usage
-                data = location.raw
-                data = data['address']
+                data = geolocation.reverse_geocode(geolocator, lat, lon, VCO_CUSTOMER_EDGE, cache=geocode_cache,
+                                                   offline=offline_geocoder)
                 local_logger.info(data)
                 if 'state' in data:
                     GWState = str(data['state'])
@@ -161,22 +167,15 @@ def gateway_update_process(client, mycursor, VCO_CUSTOMER_EDGE):
                     GWPostalCode = gw["site"]["postalCode"]
 
 
-                for geo in geos:
-                    #if geo["Country"] == Country or geo["ISO"] == Country:
-                    if geo["ISO"].lower() == data['country_code'].lower():
-                        geospecific = geo["REG"]
+                geospecific = countries.region_by_iso(data['country_code']) or geospecific
 
             else:
                  logger.info("using maxmind")
-                 client = geoip2.webservice.Client(73615, 'WZgmKOkO3ywZ')
-                 response = client.insights(gw['ipAddress'])
+                 response = geolocation.get_geoip_provider(cfg).lookup(gw['ipAddress'])
                  lat = response.location.latitude
                  lon = response.location.longitude
-                 geoval = '%s,%s' % (lat, lon)
-                 location = geolocator.reverse(geoval, language="en-US,en")
-                 sleep(10)
-                 data = location.raw
-                 data = data['address']
+                 data = geolocation.reverse_geocode(geolocator, lat, lon, VCO_CUSTOMER_EDGE, cache=geocode_cache,
+                                                    offline=offline_geocoder)
                  local_logger.info(data)
                  if 'state' in data:
                      GWState = str(data['state'])
@@ -207,10 +206,7 @@ def gateway_update_process(client, mycursor, VCO_CUSTOMER_EDGE):
                      GWPostalCode = gw["site"]["postalCode"]
 
 
-                 for geo in geos:
-                     #if geo["Country"] == Country or geo["ISO"] == Country:
-                     if geo["ISO"].lower() == data['country_code'].lower():
-                         geospecific = geo["REG"]
+                 geospecific = countries.region_by_iso(data['country_code']) or geospecific
 
         except Exception as e:
             local_logger.critical(e)
@@ -342,7 +338,7 @@ if args.VCO:
     gateway_update_process(client, mycursor, VCO_CUSTOMER_EDGE)
 
 with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-    for vco in vco_list:
+    for vco in vcos:
             local_logger.info(vco_list[vco]['link'])
             vco_info = vco_list.get(vco)
             vco_info['name'] = vco
@@ -5,21 +5,23 @@ SPDX-License-Identifier: BSD-2-Clause
 
 """
 
+import asyncio
+import bisect
 import calendar
+import concurrent.futures
 import csv
-import json
 import logging
+import queue
 import random
 import re
 import sys
+import threading
 import time
 import urllib
 from datetime import datetime, timedelta
-from time import sleep
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import certifi
-import geoip2.webservice
 import mysql.connector
 import requests
 from geopy.geocoders import Nominatim
@@ -28,16 +30,36 @@ from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from slack_webhook import Slack
 
 import Functions.data_sanitization as data_sanitization
+import Functions.edge_features as edge_features
+import Functions.geolocation as geolocation
+import Functions.qoe as qoe
 import Functions.sql_upserts as sql_upserts
 import Functions.vco_calls as vco_calls
 import fun_mysql_inserts as sql_inserts
 import fun_mysql_query as sql_queries
 from Objects.Config import Config
+from Objects.ConfigStackIndex import ConfigStackIndex
+from Objects.HubIndex import HubIndex
+from Objects.IntakeState import IntakeState
+from Objects.MetricWindowCache import MetricWindowCache
+from Objects.RunJournal import UNIT_CUSTOMER, UNIT_EDGE, RunJournal
+from Objects.VersionCatalog import VersionCatalog
+from Objects.WorkScheduler import LEVEL_CUSTOMER, LEVEL_EDGE, LEVEL_VCO, Task, WorkScheduler
+from AsyncVCOClient import AsyncVcoRequestManager
 from VCOClient import VcoRequestManager, ApiException
 from Functions.helpers import log_critical_error
+from Functions.throughput import PERCENTILES, throughput_stats
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+_metric_caches: Dict[str, MetricWindowCache] = {}
+_metric_caches_lock = threading.Lock()
+_version_catalogs: Dict[str, VersionCatalog] = {}
+_version_catalogs_lock = threading.Lock()
+_version_catalog_unset_logged = False
+_intake_states: Dict[str, IntakeState] = {}
+_intake_states_lock = threading.Lock()
+
 
 def determine_if_any_edge_in_customer_needs_update(mycursor, cnx, customer, client, VCO_CUSTOMER_EDGE):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
@@ -45,7 +67,6 @@ def determine_if_any_edge_in_customer_needs_update(mycursor, cnx, customer, clie
     params = {"enterpriseId": customer["id"], "with": []}
     kwargs = {"timeout": 10}
     get_edges = client.call_api('/enterprise/getEnterpriseEdges', params, **kwargs)
-    sleep(0.1)
     for edge in get_edges:
         if edge["logicalId"]:
             if sql_queries.determine_if_edge_needs_update(mycursor, cnx, edge["logicalId"], VCO_CUSTOMER_EDGE):
@@ -59,7 +80,6 @@ def determine_full_permissions_to_this_customer(client, customer, VCO_CUSTOMER_E
     params = {"enterpriseId": customer["id"]}
     kwargs = {"timeout": 10}
     privileges = client.call_api('/role/getEnterpriseDelegatedPrivileges', params, **kwargs)
-    sleep(0.1)
 
     if len(privileges) == 0:
         logger.info("no privileges")
@@ -75,8 +95,12 @@ def determine_full_permissions_to_this_customer(client, customer, VCO_CUSTOMER_E
     return True
 
 
-def process_vco(vco: str, cfg: Config, vco_list, slack_notifications: bool = False, arg_customer: Optional[int] = None,
-                debug: bool = False, ):
+def prepare_vco(vco: str, cfg: Config, vco_list, mysql_cursor, mysql_handle, slack_notifications: bool = False,
+                arg_customer: Optional[int] = None):
+    """
+    Connect to the VCO, upsert it and get its cleaned customer list
+    Returns (vco_client, customer_list), (None, None) when the VCO can't be processed
+    """
     slack_client = Slack(url=cfg.slack.url)
     vco_info = vco_list.get(vco)
     print(vco_info)
@@ -94,12 +118,7 @@ def process_vco(vco: str, cfg: Config, vco_list, slack_notifications: bool = Fal
         logger.critical(f'Not Connected - {conn_err_msg}')
         if slack_notifications:
             slack_client.post(text=f'VCO: {vco_info.get("name")} - Unable to connect {conn_err_msg}')
-        return False
-
-    mysql_handle = mysql.connector.connect(host=cfg.mysql_prod.host, database=cfg.mysql_prod.db,
-                                           user=cfg.mysql_prod.user, password=cfg.mysql_prod.password)
-
-    mysql_cursor = mysql_handle.cursor()
+        return None, None
 
     logger.info('Getting version and upserting VCO')
 
@@ -122,44 +141,126 @@ def process_vco(vco: str, cfg: Config, vco_list, slack_notifications: bool = Fal
         logger.critical(f'Unable to get customers for this VCO - {cust_err_msg}')
         if slack_notifications:
             slack_client.post(text=f'VCO: {vco_info.get("name")} - Unable to get customers from VCO - {cust_err_msg}')
-        return False
+        return None, None
     elif len(raw_customer_list) == 0:
         logger.error(f'No customers received for this VCO')
-        return False
+        return None, None
 
     # Clean the customer list
     # if arg_customer exists it will only return arg_customer
     customer_list = data_sanitization.clean_customers(customer_list=raw_customer_list, vco_name=vco_info.get('name'),
                                                       arg_customer=arg_customer)
+    return vco_client, customer_list
+
+
+def log_vco_connection_stats(vco_client, VCO_CUSTOMER_EDGE):
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.INFO)
+    stats = vco_client.connection_stats()
+    logger.info(f'Connection reuse - requests: {stats["requests"]} - connections: {stats["connections"]} - '
+                f'reused: {stats["reused"]}')
+    return
+
+
+def process_vco(vco: str, cfg: Config, vco_list, slack_notifications: bool = False, arg_customer: Optional[int] = None,
+                debug: bool = False, journal: Optional[RunJournal] = None):
+    VCO_CUSTOMER_EDGE = vco_list.get(vco).get('link')
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.INFO)
+
+    mysql_handle = connect_mysql(cfg)
+
+    mysql_cursor = mysql_handle.cursor()
+
+    vco_client, customer_list = prepare_vco(vco, cfg, vco_list, mysql_cursor, mysql_handle,
+                                            slack_notifications=slack_notifications, arg_customer=arg_customer)
+    if vco_client is None:
+        return False
+    vco_info = vco_list.get(vco)
 
     # Process each customer
-    for customer in customer_list:
-        try:
-            logger.info('Processing customer')
-            process_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, vco_client, cfg=cfg)
-        except Exception as e:
-            logger.critical(f'Unable to process customer - Name: {customer.get("name")} - ID: {customer.get("id")} - '
-                            f'UUID: {customer.get("logicalId")}')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-            if debug:
-                raise e.with_traceback(sys.exc_info()[2])
+    # Debug runs stay sequential so the first error stops the run
+    customer_workers = 1 if debug else max(1, int(vco_info.get('customer_workers') or 1))
+    if customer_workers == 1:
+        for customer in customer_list:
+            process_customer_logged(mysql_cursor, mysql_handle, customer, vco_list, vco, vco_client, cfg,
+                                    VCO_CUSTOMER_EDGE, debug=debug, journal=journal)
+    else:
+        logger.info(f'Processing {len(customer_list)} customers with {customer_workers} workers')
+        customers = queue.Queue()
+        for customer in customer_list:
+            customers.put(customer)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=customer_workers,
+                                                   thread_name_prefix=f'{vco}-customers') as executor:
+            workers = [executor.submit(run_customer_worker, customers, vco_list, vco, vco_client, cfg,
+                                       VCO_CUSTOMER_EDGE, journal) for _ in range(customer_workers)]
+            for worker in concurrent.futures.as_completed(workers):
+                try:
+                    worker.result()
+                except Exception as e:
+                    logger.critical('Customer worker failed')
+                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
 
+    log_vco_connection_stats(vco_client, VCO_CUSTOMER_EDGE)
     return True
 
 
-def process_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client, cfg: Config, force_run=True):
+def connect_mysql(cfg: Config) -> MySQLConnection:
+    return mysql.connector.connect(host=cfg.mysql_prod.host, database=cfg.mysql_prod.db, user=cfg.mysql_prod.user,
+                                   password=cfg.mysql_prod.password)
+
+
+def process_customer_logged(mysql_cursor, mysql_handle, customer, vco_list, vco, vco_client, cfg: Config,
+                            VCO_CUSTOMER_EDGE, debug: bool = False, journal: Optional[RunJournal] = None):
+    """
+    process_customer with its errors logged, errors are only raised in debug mode
+    """
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.INFO)
+    try:
+        logger.info('Processing customer')
+        process_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, vco_client, cfg=cfg, journal=journal)
+    except Exception as e:
+        logger.critical(f'Unable to process customer - Name: {customer.get("name")} - ID: {customer.get("id")} - '
+                        f'UUID: {customer.get("logicalId")}')
+        log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+        if debug:
+            raise e.with_traceback(sys.exc_info()[2])
+    return
+
+
+def run_customer_worker(customers: queue.Queue, vco_list, vco, vco_client, cfg: Config, VCO_CUSTOMER_EDGE,
+                        journal: Optional[RunJournal] = None):
+    """
+    Worker of the customer pool of a VCO (customer_workers in vco_list), takes customers from the shared queue until
+    it is empty, so a few large customers don't hold up the rest of the VCO
+    Every worker has its own MySQL connection, the VCO client and the rate limit of its host are shared
+    """
+    mysql_handle = connect_mysql(cfg)
+    mysql_cursor = mysql_handle.cursor()
+    try:
+        while True:
+            try:
+                customer = customers.get_nowait()
+            except queue.Empty:
+                return
+            process_customer_logged(mysql_cursor, mysql_handle, customer, vco_list, vco, vco_client, cfg,
+                                    VCO_CUSTOMER_EDGE, journal=journal)
+    finally:
+        mysql_cursor.close()
+        mysql_handle.close()
+
+
+def update_customer_rows(mysql_cursor, mysql_handle, customer, vco_list, vco):
+    """
+    Customer row with the getNetworkEnterprises data (VCO, partner, marketing name), created when missing
+    """
     vco_info = vco_list.get(vco, {})
     customer_name = customer.get('name')
     customer_uuid = customer.get('logicalId')
     vco_link = vco_info.get('link')
-
     VCO_CUSTOMER_EDGE = f'{vco_link}:{customer_name}'
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.DEBUG)
-
-    logger.info("STARTED")
 
-    # Determine if we should bypass customer
     # STEP1: Determine if Customer exist in Database create if it doesn't
     sql_queries.determine_if_customer_exists_in_mysql_creates_if_not(mysql_cursor=mysql_cursor,
                                                                      mysql_handle=mysql_handle,
@@ -171,10 +272,26 @@ def process_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client
                                                       customer=customer, vco_link=vco_link,
                                                       vco_partner=vco_info.get('partner'), log_name=VCO_CUSTOMER_EDGE)
     process_marketing_name(mysql_cursor, mysql_handle, customer, VCO_CUSTOMER_EDGE)
+    return
+
+
+def prepare_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client):
+    """
+    Customer rows, getEnterpriseEdges and the DB snapshot of the customer, the steps before the basic edge pass
+    Returns (get_edges, snapshot), None when there are no edges to process
+    """
+    customer_uuid = customer.get('logicalId')
+    VCO_CUSTOMER_EDGE = f'{vco_list.get(vco, {}).get("link")}:{customer.get("name")}'
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.DEBUG)
+
+    logger.info("STARTED")
+
+    # Determine if we should bypass customer
+    update_customer_rows(mysql_cursor, mysql_handle, customer, vco_list, vco)
 
     logger.info("Pull getEnterpriseEdges")
     try:
-        sleep(0.5)
         # NEEDS ENHANCEMENTE FOR VCO PROPERTIES
         # We will try to get this info with licenses, if that fails we will get without license
         try:
@@ -194,90 +311,414 @@ def process_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client
             logger.info('Pull getEnterpriseEdges:DONE')
         if len(get_edges) == 0:
             logger.info('This customer has no Edges, nothing to do here')
-            return
+            return None
     except Exception as e:
         logger.critical('getEnterpriseEdges:ERROR')
         log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        return
+        return None
+
+    # Load the DB state of the whole customer once so the per edge decisions don't query the DB
+    snapshot = None
+    try:
+        snapshot = sql_queries.load_customer_snapshot(mysql_cursor, customer_uuid,
+                                                      [edge['logicalId'] for edge in get_edges], VCO_CUSTOMER_EDGE)
+    except Exception as e:
+        logger.error('Unable to load DB snapshot, falling back to per edge queries')
+        log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+    return get_edges, snapshot
+
+
+def load_customer_services(mysql_cursor, customer, vco_list, vco, client, cfg: Config, snapshot=None):
+    """
+    Customer level data the full edge pass needs, pulled after the basic edge pass
+    Returns (services, pulled), services is a dict with get_services, configuration, identifiable_applications,
+    hub_index, metric_cache, version_catalog and the (refreshed) snapshot, None without full permissions or when a
+    pull failed. pulled is False when any pull failed, without full permissions there is nothing to pull
+    """
+    VCO_CUSTOMER_EDGE = f'{vco_list.get(vco, {}).get("link")}:{customer.get("name")}'
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.DEBUG)
 
-    for edge in get_edges:
-        try:
-            process_basic_edge(mysql_cursor, mysql_handle, customer, customer_name, vco_list, vco, edge, cfg=cfg,
-                               force_run=force_run)
-        except Exception as e:
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
     permissions = determine_full_permissions_to_this_customer(client, customer, VCO_CUSTOMER_EDGE)
+    if not permissions:
+        return None, True
+
+    pulled = False
+    get_services = []
+    identifiable_applications = []
+    configuration = []
+
+    logger.info("Pull getEnterpriseServices")
+    try:
+        params = {"enterpriseId": customer["id"], "with": ["configuration", "profileCount", "edgeUsage"]}
+        kwargs = {"timeout": 300}
+        get_services = client.call_api('/enterprise/getEnterpriseServices', params, **kwargs)
+        pulled = True
+        logger.info("Pull getEnterpriseServices DONE")
+    except ApiException:
+        logger.error('Unable to getEnterpriseServices')
+    except Exception as e:
+        logger.critical("getEnterpriseServices:ERROR")
+        log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
 
-    if permissions:
-        get_services = []
-        identifiable_applications = []
-        configuration = []
+    logger.info("Get Enterprice Configuration")
+    try:
+        kwargs = {"timeout": 300}
+        params = {"enterpriseId": customer["id"], "with": ["edgeCount", "modules", "refs"]}
+        configuration = client.call_api('/enterprise/getEnterpriseConfigurations', params, **kwargs)
+        # logger.info( json.dumps(alert, indent=4, sort_keys=True)
+        logger.info("Get Enterprice Configuration Done")
+    except ApiException:
+        logger.error('Unable to getEnterpriseConfigurations')
+        pulled = False
+    except Exception as e:
+        logger.critical("getEnterpriseConfigurations:ERROR")
+        log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+        return None, False
 
-        logger.info("Pull getEnterpriseServices")
+    try:
+        logger.info("Pull getIdentifiableApplications")
+        params = {"enterpriseId": customer["id"]}
+        logger.info(params)
+        kwargs = {"timeout": 200}
+        identifiable_applications = client.call_api('/configuration/getIdentifiableApplications', params, **kwargs)
+        logger.info("Pull getIdentifiableApplications:DONE")
+    except ApiException:
+        logger.error('Unable to getIdentifiableApplications')
+        pulled = False
+    except Exception as e:
+        logger.critical("getIdentifiableApplications:ERROR - q8QG4fR59dEV4f7e6gv")
+        logger.error("getIdentifiableApplications:ERROR")
+        log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+
+        return None, False
+
+    if snapshot is not None:
+        # The basic edge pass touched Edge rows, pick up their new lastUpdated in one query
         try:
-            params = {"enterpriseId": customer["id"], "with": ["configuration", "profileCount", "edgeUsage"]}
-            kwargs = {"timeout": 300}
-            get_services = client.call_api('/enterprise/getEnterpriseServices', params, **kwargs)
-            logger.info("Pull getEnterpriseServices DONE")
-        except ApiException:
-            logger.error('Unable to getEnterpriseServices')
+            sql_queries.load_customer_snapshot_edges(mysql_cursor, snapshot, VCO_CUSTOMER_EDGE)
         except Exception as e:
-            logger.critical("getEnterpriseServices:ERROR")
             log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-
-        sleep(0.5)
-
-        logger.info("Get Enterprice Configuration")
+            snapshot = None
+
+    return {
+        'get_services': get_services,
+        'configuration': configuration,
+        'identifiable_applications': identifiable_applications,
+        # Hubs are looked up per edge, event and WAN link, the profiles are only scanned once per customer
+        'hub_index': HubIndex(configuration=configuration),
+        'metric_cache': get_metric_cache(cfg),
+        'version_catalog': get_version_catalog(cfg),
+        'snapshot': snapshot,
+    }, pulled
+
+
+def process_full_edges(mysql_cursor, mysql_handle, customer, vco_list, vco, client, edges, services,
+                       force_run=True, journal: Optional[RunJournal] = None):
+    """
+    Full edge pass over edges with the load_customer_services result, concurrent API calls when the VCO has
+    async_edges set
+    Edges whose pulls all succeeded are recorded in journal
+    :return: True when the full edge pass succeeded for every edge
+    """
+    vco_info = vco_list.get(vco, {})
+    customer_name = customer.get('name')
+    VCO_CUSTOMER_EDGE = f'{vco_info.get("link")}:{customer_name}'
+    if vco_info.get('async_edges'):
+        # Edge level API calls are sent concurrently, bounded by edge_concurrency edges at a time
         try:
-            kwargs = {"timeout": 300}
-            params = {"enterpriseId": customer["id"], "with": ["edgeCount", "modules", "refs"]}
-            configuration = client.call_api('/enterprise/getEnterpriseConfigurations', params, **kwargs)
-            # logger.info( json.dumps(alert, indent=4, sort_keys=True)
-            logger.info("Get Enterprice Configuration Done")
-        except ApiException:
-            logger.error('Unable to getEnterpriseConfigurations')
+            edges_ok = asyncio.run(
+                process_full_edges_async(mysql_cursor, mysql_handle, customer, customer_name, vco_list, vco, client,
+                                         edges, services['get_services'], services['hub_index'], force_run,
+                                         services['identifiable_applications'],
+                                         max_concurrency=int(vco_info.get('edge_concurrency', 8)),
+                                         snapshot=services['snapshot'], metric_cache=services['metric_cache'],
+                                         version_catalog=services['version_catalog']))
         except Exception as e:
-            logger.critical("getEnterpriseConfigurations:ERROR")
             log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-            return
+            edges_ok = [False] * len(edges)
+        if journal is not None:
+            for edge, edge_ok in zip(edges, edges_ok):
+                if edge_ok:
+                    journal.done(UNIT_EDGE, RunJournal.unit_key(vco, edge))
+    else:
+        edges_ok = []
+        for edge in edges:
+            try:
+                edge_ok = process_full_edge(mysql_cursor, mysql_handle, customer, customer_name, vco_list, vco, client,
+                                            edge, services['get_services'], services['hub_index'], force_run,
+                                            services['identifiable_applications'], snapshot=services['snapshot'],
+                                            metric_cache=services['metric_cache'],
+                                            version_catalog=services['version_catalog'])
+            except Exception as e:
+                log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+                edge_ok = False
+            edges_ok.append(edge_ok)
+            if edge_ok and journal is not None:
+                journal.done(UNIT_EDGE, RunJournal.unit_key(vco, edge))
+    return all(edges_ok)
+
+
+def finish_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client, get_edges, services, snapshot=None,
+                    force_run=True, journal: Optional[RunJournal] = None,
+                    intake_state: Optional[IntakeState] = None, complete: bool = True):
+    """
+    Customer attributes once every edge of the customer went through the full edge pass, the customer is then
+    recorded in journal and intake_state
+    With intake_state the customer attributes only run (and the customer is only recorded there) when the customer
+    marker changed or its last full pass is too old, the edge passes still run for every customer
+    :param services: load_customer_services result, customer attributes are only updated with it
+    :param complete: False when a customer level pull or the full edge pass of an edge failed, the customer is not
+                     recorded so the next run (or resume) goes through it again
+    """
+    customer_name = customer.get('name')
+    VCO_CUSTOMER_EDGE = f'{vco_list.get(vco, {}).get("link")}:{customer_name}'
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.DEBUG)
 
+    customer_changed = intake_state is None or intake_state.customer_changed(customer)
+    if not customer_changed:
+        logger.info('Customer unchanged, skipping the customer attributes')
+    elif services is not None and (force_run or random.random() < 0.1):
+        # Customer attributes don't change often we can update once in 10 days
         try:
-            logger.info("Pull getIdentifiableApplications")
-            sleep(0.5)
-            date = datetime.utcnow()
-            date_before = date - timedelta(days=15)
-            start = int(calendar.timegm(date_before.timetuple())) * 1000
-            params = {"enterpriseId": customer["id"]}
-            logger.info(params)
-            kwargs = {"timeout": 200}
-            identifiable_applications = client.call_api('/configuration/getIdentifiableApplications', params, **kwargs)
-            logger.info("Pull getIdentifiableApplications:DONE")
-        except ApiException:
-            logger.error('Unable to getIdentifiableApplications')
+            process_attributes_full_customer(mysql_cursor, mysql_handle, customer, customer_name, vco_list, vco, client,
+                                             get_edges, services['get_services'], services['configuration'],
+                                             force_run, VCO_CUSTOMER_EDGE)
         except Exception as e:
-            logger.critical("getIdentifiableApplications:ERROR - q8QG4fR59dEV4f7e6gv")
-            logger.error("getIdentifiableApplications:ERROR")
             log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
 
-            return
+    if snapshot is not None:
+        logger.info(f'Change cache skipped {snapshot.changes.skipped} unchanged rows, wrote {snapshot.changes.written}')
+    if not complete:
+        logger.info("Customer pulls failed, the customer is not recorded as done")
+        return
+    # Recorded only after a full pass, so the full refresh of an unchanged customer isn't pushed back every run
+    if intake_state is not None and customer_changed:
+        intake_state.customer_done(customer)
+    if journal is not None:
+        journal.done(UNIT_CUSTOMER, RunJournal.unit_key(vco, customer))
+    return
 
-        for edge in get_edges:
-            try:
-                process_full_edge(mysql_cursor, mysql_handle, customer, customer_name, vco_list, vco, client, edge,
-                                  get_services, configuration, force_run, identifiable_applications)
-            except Exception as e:
-                log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
 
-        if force_run or random.random() < 0.1:
-            # Customer attributes don't change often we can update once in 10 days
-            try:
-                process_attributes_full_customer(mysql_cursor, mysql_handle, customer, customer_name, vco_list, vco, client,
-                                                 get_edges, get_services, configuration, force_run, VCO_CUSTOMER_EDGE)
-            except Exception as e:
-                log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+def pending_edges(vco, edges, journal: Optional[RunJournal] = None):
+    """
+    Edges the journal has not recorded yet, all edges without journal
+    """
+    if journal is None:
+        return edges
+    return [edge for edge in edges if not journal.is_done(UNIT_EDGE, RunJournal.unit_key(vco, edge))]
+
+
+def process_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client, cfg: Config, force_run=True,
+                     journal: Optional[RunJournal] = None):
+    VCO_CUSTOMER_EDGE = f'{vco_list.get(vco, {}).get("link")}:{customer.get("name")}'
+    if journal is not None and journal.is_done(UNIT_CUSTOMER, RunJournal.unit_key(vco, customer)):
+        return True
+    intake_state = get_intake_state(cfg)
+    prepared = prepare_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client)
+    if prepared is None:
+        return
+    get_edges, snapshot = prepared
+    # Edges a resumed run already finished skip both edge passes, customer attributes still use every edge
+    edges = pending_edges(vco, get_edges, journal)
+
+    for edge in edges:
+        try:
+            process_basic_edge(mysql_cursor, mysql_handle, customer, customer.get('name'), vco_list, vco, edge,
+                               cfg=cfg, force_run=force_run, snapshot=snapshot, intake_state=intake_state)
+        except Exception as e:
+            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+
+    services, complete = load_customer_services(mysql_cursor, customer, vco_list, vco, client, cfg,
+                                                snapshot=snapshot)
+    if services is not None:
+        snapshot = services['snapshot']
+        complete = process_full_edges(mysql_cursor, mysql_handle, customer, vco_list, vco, client, edges, services,
+                                      force_run=force_run, journal=journal) and complete
+    finish_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client, get_edges, services,
+                    snapshot=snapshot, force_run=force_run, journal=journal, intake_state=intake_state,
+                    complete=complete)
     return True
 
 
+def open_worker_connection(cfg: Config):
+    """
+    MySQL connection of a scheduler worker, returned as (mysql_handle, mysql_cursor)
+    """
+    mysql_handle = connect_mysql(cfg)
+    return mysql_handle, mysql_handle.cursor()
+
+
+def close_worker_connection(connection) -> None:
+    mysql_handle, mysql_cursor = connection
+    mysql_cursor.close()
+    mysql_handle.close()
+    return
+
+
+def edge_staleness(snapshot, edge) -> float:
+    """
+    Scheduler priority of an edge task, the epoch of the Edge lastUpdated so the edges updated longest ago run first
+    Edges without a row (or without a snapshot) go first
+    """
+    if snapshot is None:
+        return 0
+    row = snapshot.edges.get(edge.get('logicalId'))
+    if row is None or row['lastUpdated'] is None:
+        return 0
+    return row['lastUpdated'].timestamp()
+
+
+def vco_task(connection, scheduler: WorkScheduler, vco, cfg: Config, vco_list, slack_notifications=False,
+             journal: Optional[RunJournal] = None):
+    """
+    VCO level task of the scheduled run, queues a task per customer and logs the connection stats after them
+    """
+    mysql_handle, mysql_cursor = connection
+    vco_client, customer_list = prepare_vco(vco, cfg, vco_list, mysql_cursor, mysql_handle,
+                                            slack_notifications=slack_notifications)
+    if vco_client is None:
+        return
+    tasks = [Task(level=LEVEL_CUSTOMER, vco=vco, fn=customer_task, args=(scheduler, customer, vco_list, vco,
+                                                                           vco_client, cfg, journal),
+                  name=f'customer {customer.get("name")}') for customer in customer_list]
+    scheduler.submit_all(tasks, then=Task(level=LEVEL_VCO, vco=vco, fn=vco_stats_task,
+                                          args=(vco_client, vco_list[vco].get('link'))))
+    return
+
+
+def vco_stats_task(connection, vco_client, VCO_CUSTOMER_EDGE):
+    log_vco_connection_stats(vco_client, VCO_CUSTOMER_EDGE)
+    return
+
+
+def customer_task(connection, scheduler: WorkScheduler, customer, vco_list, vco, client, cfg: Config,
+                  journal: Optional[RunJournal] = None):
+    """
+    Customer level task of the scheduled run, same steps as process_customer with the basic edge pass queued as edge
+    tasks, stalest edges first
+    """
+    mysql_handle, mysql_cursor = connection
+    if journal is not None and journal.is_done(UNIT_CUSTOMER, RunJournal.unit_key(vco, customer)):
+        return
+    intake_state = get_intake_state(cfg)
+    prepared = prepare_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client)
+    if prepared is None:
+        return
+    get_edges, snapshot = prepared
+    edges = pending_edges(vco, get_edges, journal)
+    tasks = [Task(level=LEVEL_EDGE, vco=vco, fn=basic_edge_task, args=(customer, vco_list, vco, edge, cfg, snapshot),
+                  priority=edge_staleness(snapshot, edge), name=f'basic edge {edge.get("name")}')
+             for edge in edges]
+    scheduler.submit_all(tasks, then=Task(level=LEVEL_CUSTOMER, vco=vco, fn=customer_services_task,
+                                          args=(scheduler, customer, vco_list, vco, client, cfg, get_edges,
+                                                snapshot, edges, journal)))
+    return
+
+
+def basic_edge_task(connection, customer, vco_list, vco, edge, cfg: Config, snapshot):
+    mysql_handle, mysql_cursor = connection
+    try:
+        process_basic_edge(mysql_cursor, mysql_handle, customer, customer.get('name'), vco_list, vco, edge, cfg=cfg,
+                           force_run=True, snapshot=snapshot, intake_state=get_intake_state(cfg))
+    except Exception as e:
+        log_critical_error(ex=e, log_name=f'{vco_list[vco].get("link")}:{customer.get("name")}')
+    return
+
+
+def customer_services_task(connection, scheduler: WorkScheduler, customer, vco_list, vco, client, cfg: Config,
+                           get_edges, snapshot, edges=None, journal: Optional[RunJournal] = None):
+    """
+    Runs once the basic edge pass of the customer finished, queues the full edge pass as edge tasks
+    Async VCOs keep one task for all edges, their API calls are already concurrent
+    :param edges: Edges of get_edges that still need the edge passes, all of them when None
+    """
+    mysql_handle, mysql_cursor = connection
+    if edges is None:
+        edges = get_edges
+    intake_state = get_intake_state(cfg)
+    services, complete = load_customer_services(mysql_cursor, customer, vco_list, vco, client, cfg,
+                                                snapshot=snapshot)
+    if services is None:
+        finish_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client, get_edges, services,
+                        snapshot=snapshot, journal=journal, intake_state=intake_state, complete=complete)
+        return
+    # full edge tasks add the edges they failed on, the finish task only records the customer when there are none
+    failed_edges = []
+    if vco_list[vco].get('async_edges'):
+        tasks = [Task(level=LEVEL_EDGE, vco=vco, fn=full_edges_task,
+                      args=(customer, vco_list, vco, client, edges, services, journal, failed_edges),
+                      name='full edges async')]
+    else:
+        tasks = [Task(level=LEVEL_EDGE, vco=vco, fn=full_edges_task,
+                      args=(customer, vco_list, vco, client, [edge], services, journal, failed_edges),
+                      priority=edge_staleness(services['snapshot'], edge), name=f'full edge {edge.get("name")}')
+                 for edge in edges]
+    scheduler.submit_all(tasks, then=Task(level=LEVEL_CUSTOMER, vco=vco, fn=finish_customer_task,
+                                          args=(customer, vco_list, vco, client, get_edges, services, journal,
+                                                intake_state, complete, failed_edges)))
+    return
+
+
+def full_edges_task(connection, customer, vco_list, vco, client, edges, services,
+                    journal: Optional[RunJournal] = None, failed_edges: Optional[list] = None):
+    mysql_handle, mysql_cursor = connection
+    if not process_full_edges(mysql_cursor, mysql_handle, customer, vco_list, vco, client, edges, services,
+                              journal=journal) and failed_edges is not None:
+        failed_edges.extend(edges)
+    return
+
+
+def finish_customer_task(connection, customer, vco_list, vco, client, get_edges, services,
+                         journal: Optional[RunJournal] = None, intake_state: Optional[IntakeState] = None,
+                         complete: bool = True, failed_edges: Optional[list] = None):
+    mysql_handle, mysql_cursor = connection
+    finish_customer(mysql_cursor, mysql_handle, customer, vco_list, vco, client, get_edges, services,
+                    snapshot=services['snapshot'], journal=journal, intake_state=intake_state,
+                    complete=complete and not failed_edges)
+    return
+
+
+def log_scheduler_report(report: Dict[str, any]) -> None:
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': 'SCHEDULER'})
+    logger.setLevel(logging.INFO)
+    levels = ' - '.join(f'{level}: queued {stats["queued"]} done {stats["completed"]}/{stats["submitted"]} '
+                        f'failed {stats["failed"]} {stats["per_second"]}/s busy {stats["busy_seconds"]}s'
+                        for level, stats in report['levels'].items())
+    logger.info(f'elapsed {report["elapsed"]}s - pending {report["pending"]} - steals {report["steals"]} - {levels}')
+    logger.info(f'running per VCO: {report["running"]}')
+    return
+
+
+def process_vcos_scheduled(cfg: Config, vco_list, vcos: List[str], slack_notifications: bool = False,
+                           journal: Optional[RunJournal] = None) -> None:
+    """
+    Process vcos with the WorkScheduler (SCHEDULER section of the config), the run is split in VCO -> customer ->
+    edge tasks spread over cfg.scheduler.workers threads with one MySQL connection each
+    Each VCO runs at most vco_concurrency tasks at a time (vco_list key, SCHEDULER vco_concurrency by default)
+    Units already recorded in journal are skipped, completed ones are recorded
+    """
+    vco_caps = {vco: int(vco_list[vco].get('vco_concurrency') or cfg.scheduler.vco_concurrency) for vco in vcos}
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': 'SCHEDULER'})
+    for vco in vcos:
+        if int(vco_list[vco].get('customer_workers') or 1) > 1:
+            logger.warning(f'{vco}: customer_workers is not used by the scheduler, vco_concurrency {vco_caps[vco]} '
+                           f'caps the VCO')
+
+    def on_error(task: Task, e: Exception) -> None:
+        log_critical_error(ex=e, log_name=f'{vco_list.get(task.vco, {}).get("link")}:{task.name}')
+
+    scheduler = WorkScheduler(workers=cfg.scheduler.workers, vco_caps=vco_caps,
+                              worker_init=lambda: open_worker_connection(cfg), worker_close=close_worker_connection,
+                              on_error=on_error)
+    for vco in vcos:
+        scheduler.submit(Task(level=LEVEL_VCO, vco=vco, fn=vco_task,
+                              args=(scheduler, vco, cfg, vco_list, slack_notifications, journal)))
+    scheduler.run(report=log_scheduler_report, report_interval=cfg.scheduler.report_interval)
+    return
+
+
 def process_attributes_full_customer(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_list, vco, client,
                                      get_edges, get_services, configuration, force_run, VCO_CUSTOMER_EDGE):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
@@ -384,7 +825,6 @@ def process_attributes_full_customer(mysql_cursor, mysql_handle, customer, Custo
     ROUTE_NUM = 0
     number_of_routes_changes = 0
     try:
-        sleep(0.5)
         params = {"enterpriseId": customer["id"]}
         logger.info(params)
         kwargs = {"timeout": 300}
@@ -428,28 +868,38 @@ def process_attributes_full_customer(mysql_cursor, mysql_handle, customer, Custo
                                                                 number_of_routes_changes)
 
 
-def process_full_edge(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_list, vco, client, edge, get_services,
-                      configuration, force_run=False, identifiable_applications=[]):
-    VCO_CUSTOMER_EDGE = vco_list[vco]['link'] + ":" + Customer_NAME + ":" + edge["name"]
+def prepare_full_edge(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, get_services,
+                      force_run=False, snapshot=None):
+    """
+    Checks and light updates that run before any edge level API call
+    Returns True when the edge is connected and should go through the full edge process
+    """
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
     if not force_run:
-        if sql_queries.determine_if_edge_needs_update(mysql_cursor, mysql_handle, edge["logicalId"], VCO_CUSTOMER_EDGE):
+        if sql_queries.determine_if_edge_needs_update(mysql_cursor, mysql_handle, edge["logicalId"], VCO_CUSTOMER_EDGE,
+                                                      snapshot=snapshot):
             logger.info("UPDATING EDGE SINCE ITS NOT UPDATED LAST 8 DAYS")
         elif (datetime.now() - datetime.strptime(re.split('T| ', edge["created"])[0], '%Y-%m-%d')).days % 6 == 0:
             logger.info("UPDATING BASED ON CREATION DATE")
         else:
             logger.info("NO UPDATE NEEDED")
-            return
+            return False
     else:
         logger.info("Force RUN")
 
     if not edge["logicalId"]:
         logger.info("This edge is empty in VCO nothing to do here")
-        return
+        return False
 
     # Process HA
-    update_ha_and_cluster(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE, get_services)
+    change_cache = snapshot.changes if snapshot is not None else None
+    with sql_upserts.AttributeWriter(curs=mysql_cursor, sql_cnx=mysql_handle, log_name=VCO_CUSTOMER_EDGE,
+                                     change_cache=change_cache), \
+            sql_inserts.EdgeRowBuilder(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle,
+                                       log_name=VCO_CUSTOMER_EDGE, change_cache=change_cache):
+        update_ha_and_cluster(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE,
+                              get_services)
 
     ### CHECK IF EDGE is CONNECTED
 
@@ -457,22 +907,129 @@ def process_full_edge(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_l
         logger.info("EDGE IS CONNECTED we will process events config stack and so on")
     else:
         logger.info("edge is not connected we will be done here")
-        return
+        return False
+    return True
+
+
+def full_edge_requests(customer, edge):
+    """
+    The independent edge level API calls of the full edge process
+    :return: Dict of call name to (method, params, timeout)
+    """
+    date = datetime.utcnow()
+    events_start = date - timedelta(days=15)
+    metrics_start = int(calendar.timegm((date - timedelta(days=5)).timetuple())) * 1000
+    return {
+        'getEnterpriseEvents': (
+            '/event/getEnterpriseEvents',
+            {"enterpriseId": customer["id"], "edgeId": edge["id"],
+             "interval": {"start": events_start.strftime('%Y-%m-%dT%H:%M:%S.%fZ')[:-3]}}, 200),
+        'getEdgeConfigurationStack': (
+            '/edge/getEdgeConfigurationStack',
+            {"enterpriseId": customer["id"], "edgeId": edge["id"], "with": ["modules"]}, 200),
+        'getEdgeLinkMetrics': (
+            '/metrics/getEdgeLinkMetrics',
+            {"edgeId": edge["id"], "enterpriseId": customer["id"], "interval": {"start": metrics_start},
+             "with": ["bpsOfBestPathRx", "bpsOfBestPathTx", "scoreTx", "scoreRx", "bytesRx", "bytesTx"]}, 200),
+        # Temporary fixed interval from 1 December 2019 till 31 December 2019 for pre-covid19
+        # The window is closed, its result is kept in the MetricWindowCache after the first pull
+        'getEdgeLinkSeries': (
+            '/metrics/getEdgeLinkSeries',
+            {"edgeId": edge["id"], "enterpriseId": customer["id"],
+             "interval": {"start": 1575118800000, "end": 1577795400000}, "with": ["bytesRx", "bytesTx"]}, 200),
+    }
+
+
+def get_metric_cache(cfg: Config) -> Optional[MetricWindowCache]:
+    """
+    Process wide MetricWindowCache for the configured cache file, None when no cache file is configured
+    """
+    if not cfg.metric_cache.cache_file:
+        return None
+    with _metric_caches_lock:
+        metric_cache = _metric_caches.get(cfg.metric_cache.cache_file)
+        if metric_cache is None:
+            metric_cache = MetricWindowCache(path=cfg.metric_cache.cache_file)
+            _metric_caches[cfg.metric_cache.cache_file] = metric_cache
+    return metric_cache
+
+
+def get_intake_state(cfg: Config) -> Optional[IntakeState]:
+    """
+    Process wide IntakeState of the incremental intake, None when INCREMENTAL state_file is not configured
+    """
+    if not cfg.incremental.state_file:
+        return None
+    with _intake_states_lock:
+        intake_state = _intake_states.get(cfg.incremental.state_file)
+        if intake_state is None:
+            intake_state = IntakeState(path=cfg.incremental.state_file,
+                                       full_refresh_hours=cfg.incremental.full_refresh_hours)
+            _intake_states[cfg.incremental.state_file] = intake_state
+    return intake_state
+
+
+def get_version_catalog(cfg: Config) -> Optional[VersionCatalog]:
+    """
+    Process wide VersionCatalog loaded from cfg.files.version_catalog on first use, None when no catalog is configured
+    """
+    global _version_catalog_unset_logged
+    if not cfg.files.version_catalog:
+        with _version_catalogs_lock:
+            if not _version_catalog_unset_logged:
+                _version_catalog_unset_logged = True
+                logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': 'VERSION_CATALOG'})
+                logger.warning('FILES version_catalog is not set, software version alerts are disabled')
+        return None
+    with _version_catalogs_lock:
+        version_catalog = _version_catalogs.get(cfg.files.version_catalog)
+        if version_catalog is None:
+            version_catalog = VersionCatalog.from_file(cfg.files.version_catalog)
+            _version_catalogs[cfg.files.version_catalog] = version_catalog
+    return version_catalog
+
+
+def call_api_cached(client, metric_cache: Optional[MetricWindowCache], edge, method, params, timeout):
+    """
+    client.call_api for metrics calls, results of closed historical intervals come from and go to metric_cache
+    """
+    if metric_cache is not None:
+        result = metric_cache.get(edge['logicalId'], method, params)
+        if result is not None:
+            return result
+    result = client.call_api(method, params, timeout=timeout)
+    if metric_cache is not None:
+        metric_cache.put(edge['logicalId'], method, params, result)
+    return result
+
+
+def process_full_edge(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_list, vco, client, edge, get_services,
+                      hub_index, force_run=False, identifiable_applications=[], snapshot=None,
+                      metric_cache=None, version_catalog=None):
+    """
+    :param metric_cache: MetricWindowCache for the fixed getEdgeLinkSeries window, always pulled when None
+    :param version_catalog: VersionCatalog for the software version alerts, no version alerts when None
+    :return: True when the edge needed no update or every pull of it succeeded
+    """
+    VCO_CUSTOMER_EDGE = vco_list[vco]['link'] + ":" + Customer_NAME + ":" + edge["name"]
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.INFO)
+    if not prepare_full_edge(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, get_services,
+                             force_run=force_run, snapshot=snapshot):
+        return True
+    requests_ = full_edge_requests(customer, edge)
 
     ##########
     # Process events - This should be light
     ##########
     logger.info("Pull getEnterpriseEvents")
     events = {'data': []}
+    events_pulled = False
     try:
-        sleep(0.5)
-        date = datetime.utcnow()
-        date_before = date - timedelta(days=15)
-        params = {"enterpriseId": customer["id"], "edgeId": edge["id"],
-                  "interval": {"start": date_before.strftime('%Y-%m-%dT%H:%M:%S.%fZ')[:-3]}}
+        method, params, timeout = requests_['getEnterpriseEvents']
         logger.info(params)
-        kwargs = {"timeout": 200}
-        events = client.call_api('/event/getEnterpriseEvents', params, **kwargs)
+        events = client.call_api(method, params, timeout=timeout)
+        events_pulled = True
         logger.info("Pull getEnterpriseEdges:DONE")
     except ApiException:
         logger.error('Unable to getEnterpriseEvents')
@@ -480,13 +1037,8 @@ def process_full_edge(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_l
         logger.critical("getEnterpriseEvents:ERROR")
         log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
 
-    update_edge_events(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle, edge=edge,
-                       VCO_CUSTOMER_EDGE=VCO_CUSTOMER_EDGE, events=events)
-
-    update_edge_alerts_based_on_events(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
-                                       events, configuration)
-
-    # update_edge_other_alerts
+    process_full_edge_events(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client, hub_index,
+                             events, snapshot)
 
     ##########
     ## Process Links - This is light
@@ -494,88 +1046,251 @@ def process_full_edge(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_l
 
     logger.info("Pull getEdgeConfigurationStack")
     try:
-        sleep(0.5)
-        params = {"enterpriseId": customer["id"], "edgeId": edge["id"], "with": ["modules"]}
+        method, params, timeout = requests_['getEdgeConfigurationStack']
         logger.info(params)
-        kwargs = {"timeout": 200}
-        edge_config_stack = client.call_api('/edge/getEdgeConfigurationStack', params, **kwargs)
+        edge_config_stack = client.call_api(method, params, timeout=timeout)
         logger.info("Pull getEnterpriseEdges:DONE")
     except ApiException:
         logger.error('Unable to getEdgeConfigurationStack')
+        return False
     except Exception as e:
         logger.critical("getEdgeConfigurationStack:ERROR")
         log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        return
+        return False
 
-        # Alerts based on config
-    update_edge_alerts_based_on_configuration(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE,
-                                              client, edge_config_stack, configuration)
-    # dump_appd+id was a request from engineering
-    # dump_appid_specific_qos_rules(customer_name=customer['name'], edge_uuid=edge['logicalId'], vco_name=vco,
-    #                              log_prefix=VCO_CUSTOMER_EDGE, edge_config_stack=edge_config_stac
+    # modules of the config stack are looked up through one index instead of walking the stack in every update
+    config_index = ConfigStackIndex(edge_config_stack=edge_config_stack)
+    process_full_edge_configuration(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
+                                    hub_index, config_index, snapshot, version_catalog)
 
     logger.info("Pull getEdgeLinkMetrics")
     try:
-        sleep(0.5)
-        date = datetime.utcnow()
-        date_before = date - timedelta(days=5)
-        start = int(calendar.timegm(date_before.timetuple())) * 1000
-        params = {"edgeId": edge["id"], "enterpriseId": customer["id"], "interval": {"start": start},
-                  "with": ["bpsOfBestPathRx", "bpsOfBestPathTx", "scoreTx", "scoreRx", "bytesRx", "bytesTx"]}
+        method, params, timeout = requests_['getEdgeLinkMetrics']
         logger.info(params)
-        kwargs = {"timeout": 200}
-        link_metrics = client.call_api('/metrics/getEdgeLinkMetrics', params, **kwargs)
+        link_metrics = client.call_api(method, params, timeout=timeout)
         logger.info("Pull getEdgeLinkMetrics:DONE")
     except ApiException:
         logger.error('Unable to getEdgeLinkMetrics')
+        return False
     except Exception as e:
         logger.critical("getEdgeLinkMetrics:ERROR")
         log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        return
+        return False
 
     logger.info("Pull getEdgeLinkSeries")
     try:
-        sleep(0.5)
-        date = datetime.utcnow()
-        date_before = date - timedelta(days=30)
-        start = int(calendar.timegm(date_before.timetuple())) * 1000
-        # params = {"edgeId": edge["id"], "enterpriseId": customer["id"], "interval": {"start": start},"with": ["bytesRx", "bytesTx"]}
-        ####Adding temporary start and end interval from 1 December 2019 till 31 December 2019 for pre-covid19
-        params = {"edgeId": edge["id"], "enterpriseId": customer["id"],
-                  "interval": {"start": 1575118800000, "end": 1577795400000}, "with": ["bytesRx", "bytesTx"]}
+        method, params, timeout = requests_['getEdgeLinkSeries']
         logger.info(params)
-        kwargs = {"timeout": 200}
-        link_series = client.call_api('/metrics/getEdgeLinkSeries', params, **kwargs)
+        link_series = call_api_cached(client, metric_cache, edge, method, params, timeout)
         logger.info("Pull getEdgeLinkSeries:DONE")
     except ApiException:
         logger.error('Unable to getEdgeLinkSeries')
+        return False
     except Exception as e:
         logger.critical("getEdgeLinkSeries:ERROR")
         log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        return
+        return False
 
-    ###########
-    ## Process QoE
-    ###########
+    qoe_results, qoe_pulled = fetch_edge_qoe(mysql_cursor, mysql_handle, customer, edge, VCO_CUSTOMER_EDGE, client,
+                                             ranged=vco_list[vco].get('ranged_qoe', False), snapshot=snapshot)
+
+    process_full_edge_results(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
+                              hub_index, config_index, link_metrics, link_series, qoe_results, snapshot)
+    return events_pulled and qoe_pulled
+
+
+def process_full_edge_events(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client, hub_index,
+                             events, snapshot=None):
+    """
+    Events and the alerts based on them, written as soon as getEnterpriseEvents is in - no VCO calls happen here
+    """
+    change_cache = snapshot.changes if snapshot is not None else None
+    with sql_upserts.AttributeWriter(curs=mysql_cursor, sql_cnx=mysql_handle, log_name=VCO_CUSTOMER_EDGE,
+                                     change_cache=change_cache), \
+            sql_inserts.EdgeRowBuilder(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle,
+                                       log_name=VCO_CUSTOMER_EDGE, change_cache=change_cache):
+        update_edge_events(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle, edge=edge,
+                           VCO_CUSTOMER_EDGE=VCO_CUSTOMER_EDGE, events=events)
+
+        update_edge_alerts_based_on_events(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
+                                           events, hub_index)
+    return
 
-    update_edge_links(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client, link_metrics,
-                      configuration, edge_config_stack)
 
-    update_edge_overlay_link(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client)
+def process_full_edge_configuration(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
+                                    hub_index, config_index, snapshot=None, version_catalog=None):
+    """
+    Alerts based on the config stack, written as soon as getEdgeConfigurationStack is in - no VCO calls happen here
+    """
+    change_cache = snapshot.changes if snapshot is not None else None
+    with sql_upserts.AttributeWriter(curs=mysql_cursor, sql_cnx=mysql_handle, log_name=VCO_CUSTOMER_EDGE,
+                                     change_cache=change_cache), \
+            sql_inserts.EdgeRowBuilder(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle,
+                                       log_name=VCO_CUSTOMER_EDGE, change_cache=change_cache):
+        # Alerts based on config
+        update_edge_alerts_based_on_configuration(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE,
+                                                  client, config_index, hub_index, version_catalog)
+        # dump_appd+id was a request from engineering
+        # dump_appid_specific_qos_rules(customer_name=customer['name'], edge_uuid=edge['logicalId'], vco_name=vco,
+        #                              log_prefix=VCO_CUSTOMER_EDGE, edge_config_stack=edge_config_stac
+    return
+
+
+def process_full_edge_results(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
+                              hub_index, config_index, link_metrics, link_series, qoe_results, snapshot=None):
+    """
+    Links, usage, QoE and the remaining config stack updates once the link metrics are in - no VCO calls happen here
+    """
+    change_cache = snapshot.changes if snapshot is not None else None
+    with sql_upserts.AttributeWriter(curs=mysql_cursor, sql_cnx=mysql_handle, log_name=VCO_CUSTOMER_EDGE,
+                                     change_cache=change_cache), \
+            sql_inserts.EdgeRowBuilder(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle,
+                                       log_name=VCO_CUSTOMER_EDGE, change_cache=change_cache):
+        ###########
+        ## Process QoE
+        ###########
 
-    update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
-                                  link_metrics, link_series, configuration, edge_config_stack)
+        update_edge_links(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client, link_metrics,
+                          hub_index, config_index)
 
-    update_edge_qoe(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client)
-    snmpv3_status(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, edge_config_stack)
+        update_edge_overlay_link(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client)
 
-    update_segment_firewall(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, edge_config_stack)
+        update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
+                                      link_metrics, link_series, hub_index, config_index)
+
+        update_edge_qoe(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client, qoe_results)
+        snmpv3_status(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, config_index)
+
+        update_segment_firewall(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, config_index)
 
     return
 
 
+async def process_full_edge_async(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_list, vco, async_client,
+                                  edge, get_services, hub_index, force_run=False, identifiable_applications=[],
+                                  snapshot=None, metric_cache=None, version_catalog=None):
+    """
+    Same as process_full_edge but the edge level API calls (events, config stack, link metrics, link series and the
+    daily QoE windows) are sent concurrently through an AsyncVcoRequestManager
+    The async client semaphore bounds how many edges of a VCO are fetching at the same time, over all customers
+    Calls answered by metric_cache are not sent
+    MySQL work stays synchronous on the event loop thread, so one connection is safe to share between edges
+    :return: True when the edge needed no update or every pull of it succeeded
+    """
+    VCO_CUSTOMER_EDGE = vco_list[vco]['link'] + ":" + Customer_NAME + ":" + edge["name"]
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.INFO)
+    if not prepare_full_edge(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, get_services,
+                             force_run=force_run, snapshot=snapshot):
+        return True
+
+    requests_ = full_edge_requests(customer, edge)
+    cached = {}
+    if metric_cache is not None:
+        for call_name, (method, params, timeout) in requests_.items():
+            result = metric_cache.get(edge['logicalId'], method, params)
+            if result is not None:
+                cached[call_name] = result
+        requests_ = {call_name: request for call_name, request in requests_.items() if call_name not in cached}
+    qoe_windows = get_qoe_windows_needing_update(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, snapshot)
+    qoe_runs = get_qoe_runs(qoe_windows, ranged=vco_list[vco].get('ranged_qoe', False))
+
+    async with async_client.semaphore:
+        logger.info(f'Pull {", ".join(requests_)} and {len(qoe_runs)} getLinkQualityEvents')
+        calls = [async_client.call_api(method, params, timeout=timeout) for method, params, timeout in
+                 requests_.values()]
+        calls += [async_client.call_api(method, params, timeout=timeout) for method, params, timeout in
+                  (qoe_request(customer, edge, run) for run in qoe_runs)]
+        results = await asyncio.gather(*calls, return_exceptions=True)
+
+    fetched = dict(zip(requests_, results[:len(requests_)]))
+    for call_name, result in fetched.items():
+        if isinstance(result, ApiException):
+            logger.error(f'Unable to {call_name}')
+        elif isinstance(result, Exception):
+            logger.critical(f'{call_name}:ERROR')
+            log_critical_error(ex=result, log_name=VCO_CUSTOMER_EDGE)
+        elif metric_cache is not None:
+            method, params, timeout = requests_[call_name]
+            metric_cache.put(edge['logicalId'], method, params, result)
+    fetched.update(cached)
+
+    # results are written in the order of process_full_edge, a failed pull only stops the updates that need it
+    events = fetched['getEnterpriseEvents']
+    if isinstance(events, Exception):
+        events = {'data': []}
+    process_full_edge_events(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, async_client,
+                             hub_index, events, snapshot)
+
+    if isinstance(fetched['getEdgeConfigurationStack'], Exception):
+        return False
+    config_index = ConfigStackIndex(edge_config_stack=fetched['getEdgeConfigurationStack'])
+    process_full_edge_configuration(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, async_client,
+                                    hub_index, config_index, snapshot, version_catalog)
+
+    for call_name in ('getEdgeLinkMetrics', 'getEdgeLinkSeries'):
+        if isinstance(fetched[call_name], Exception):
+            return False
+
+    qoe_results = []
+    qoe_pulled = True
+    qoe_pulls = list(zip(qoe_runs, results[len(requests_):]))
+    while qoe_pulls:
+        day_runs = []
+        for run, qoe_metrics in qoe_pulls:
+            if isinstance(qoe_metrics, Exception):
+                logger.critical(f'getLinkQualityEvents:ERROR {run[0][0].strftime("%Y-%m-%d")}')
+                log_critical_error(ex=qoe_metrics, log_name=VCO_CUSTOMER_EDGE)
+                qoe_pulled = False
+                continue
+            day_results = split_qoe_metrics_by_day(qoe_metrics, run)
+            if day_results is None:
+                day_runs += [[window] for window in run]
+                continue
+            qoe_results += day_results
+        qoe_pulls = []
+        if day_runs:
+            # the VCO returned samples without timestamp, the days of those runs are pulled one by one
+            async with async_client.semaphore:
+                logger.info(f'Pull {len(day_runs)} getLinkQualityEvents day by day')
+                day_metrics = await asyncio.gather(*(async_client.call_api(method, params, timeout=timeout)
+                                                     for method, params, timeout in
+                                                     (qoe_request(customer, edge, run) for run in day_runs)),
+                                                   return_exceptions=True)
+            qoe_pulls = list(zip(day_runs, day_metrics))
+
+    process_full_edge_results(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, async_client,
+                              hub_index, config_index, fetched['getEdgeLinkMetrics'], fetched['getEdgeLinkSeries'],
+                              qoe_results, snapshot)
+    return qoe_pulled and not isinstance(fetched['getEnterpriseEvents'], Exception)
+
+
+async def process_full_edges_async(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_list, vco, client, edges,
+                                   get_services, hub_index, force_run=False, identifiable_applications=[],
+                                   max_concurrency=8, snapshot=None, metric_cache=None, version_catalog=None):
+    """
+    Run process_full_edge_async for every edge of a customer, at most max_concurrency edges of the VCO at a time
+    (shared with the other customers of the VCO running in the same process)
+    The async client borrows the auth and rate limiter of the connected sync client
+    :return: process_full_edge_async result of every edge, False for edges that raised
+    """
+    VCO_CUSTOMER_EDGE = vco_list[vco]['link'] + ":" + Customer_NAME
+
+    async def guarded(edge):
+        try:
+            return await process_full_edge_async(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_list, vco,
+                                                 async_client, edge, get_services, hub_index, force_run,
+                                                 identifiable_applications, snapshot, metric_cache, version_catalog)
+        except Exception as e:
+            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+            return False
+
+    async with AsyncVcoRequestManager.from_sync_client(client, max_concurrency=max_concurrency) as async_client:
+        return await asyncio.gather(*(guarded(edge) for edge in edges))
+
+
 def process_basic_edge(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_list, vco, edge, cfg: Config,
-                       force_run=False):
+                       force_run=False, snapshot=None, intake_state: Optional[IntakeState] = None):
     VCO_CUSTOMER_EDGE = vco_list[vco]['link'] + ":" + Customer_NAME + ":" + edge["name"]
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
@@ -585,47 +1300,72 @@ def process_basic_edge(mysql_cursor, mysql_handle, customer, Customer_NAME, vco_
         return
 
     sql_queries.determine_if_edge_exists_in_mysql_creates_if_not(mysql_cursor, mysql_handle, customer["logicalId"],
-                                                                 edge, vco, VCO_CUSTOMER_EDGE)
-
-    update_location_information(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE,
-                                cfg=cfg)
-    # Process Location
-    update_attributes(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE)
-
-    # Process routing features (OSPF,BGP,Multicast,Static/Netflox"
-    update_routing(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE)
-    # Process firewall
-    update_non_segment_firewall(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE)
-    # Process Edge VNF
-    update_edge_vnf(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE)
-    # Process Cloud Security service
-    update_edge_css(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, cfg=cfg)
-    # Process QOS
-    update_qos(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE)
-    # Process config specific
-    update_config_specific(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE)
-
-    # Process link information
-    update_recent_link_list(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE)
-
-    # Process link information
-    update_vco_license(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle, edge=edge,
-                       vco_customer_edge=VCO_CUSTOMER_EDGE)
+                                                                 edge, vco, VCO_CUSTOMER_EDGE, snapshot=snapshot)
+
+    # Incremental intake, the configuration extractors only run when the configuration marker of the edge moved
+    config_changed = intake_state is None or intake_state.edge_changed(edge)
+    if not config_changed:
+        logger.info('Configuration unchanged, skipping the configuration extractors')
+
+    # Attribute upserts of the edge are written with one multi row upsert and Edge columns with one UPDATE
+    change_cache = snapshot.changes if snapshot is not None else None
+    with sql_upserts.AttributeWriter(curs=mysql_cursor, sql_cnx=mysql_handle, log_name=VCO_CUSTOMER_EDGE,
+                                     change_cache=change_cache), \
+            sql_inserts.EdgeRowBuilder(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle,
+                                       log_name=VCO_CUSTOMER_EDGE, change_cache=change_cache):
+        update_location_information(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE,
+                                    cfg=cfg, snapshot=snapshot)
+        # Process Location
+        update_attributes(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE)
+
+        if config_changed:
+            # One walk of the configuration modules for all the feature attributes below
+            features = edge_features.extract_edge_features(edge)
+            # Process routing features (OSPF,BGP,Multicast,Static/Netflox"
+            update_routing(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE,
+                           features=features)
+            # Process firewall
+            update_non_segment_firewall(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco,
+                                        VCO_CUSTOMER_EDGE, features=features)
+            # Process Edge VNF
+            update_edge_vnf(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, features=features)
+            # Process Cloud Security service
+            update_edge_css(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, cfg=cfg)
+            # Process QOS
+            update_qos(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE,
+                       features=features)
+            # Process config specific
+            update_config_specific(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE,
+                                   features=features)
+
+        # Process link information
+        update_recent_link_list(mysql_cursor, mysql_handle, customer["logicalId"], edge, vco, VCO_CUSTOMER_EDGE)
+
+        # Process link information
+        update_vco_license(mysql_cursor=mysql_cursor, mysql_handle=mysql_handle, edge=edge,
+                           vco_customer_edge=VCO_CUSTOMER_EDGE)
+
+    # Recorded once the rows are written, a failed edge runs the extractors again next time
+    if intake_state is not None:
+        intake_state.edge_seen(edge, config=config_changed)
 
 
 def uo(args, **kwargs):
     return urllib.request.urlopen(args, cafile=certifi.where(), **kwargs)
 
 
-def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE, cfg: Config):
+def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE, cfg: Config,
+                                snapshot=None):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
 
     geolocator = Nominatim(user_agent="get link details")
     geolocator.urlopen = uo
+    geocode_cache = geolocation.get_geocode_cache(cfg)
+    offline_geocoder = geolocation.get_offline_geocoder(cfg)
 
     if not sql_queries.determine_if_edge_needs_location_update(mysql_cursor, mysql_handle, edge['logicalId'],
-                                                               VCO_CUSTOMER_EDGE):
+                                                               VCO_CUSTOMER_EDGE, snapshot=snapshot):
         if random.random() > 0.01:
             return
         logger.info("Updating address 1 in 100 times")
@@ -642,17 +1382,14 @@ def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, v
     # Try to get location using geolocation
     geolocation_worked = False
     try:
-        geos = json.load(open('DataFiles/country.json', 'r'))
+        countries = geolocation.get_country_index(cfg)
         try:
             ### NOTE THIS CODE NEEDS TO BE IMPROVED, WE SHOULD TAKE IN ACCOUNT WHEN WE DONT HAVE LAT AND LONG BUT WE HAVE AN ADDRESS THAT WE CAN USE TO DETERMINE LAT AND LON
             if edge["site"]["lat"] != None and edge["site"]["lon"] != None:
                 lat = edge["site"]["lat"]
                 lon = edge["site"]["lon"]
-                geoval = '%s,%s' % (edge["site"]["lat"], edge["site"]["lon"])
-                location = geolocator.reverse(geoval, language="en-US,en")
-                sleep(10)  # sleeping since there is a limit of quota usage
-                data = location.raw
-                data = data['address']
+                data = geolocation.reverse_geocode(geolocator, lat, lon, VCO_CUSTOMER_EDGE, cache=geocode_cache,
+                                                   offline=offline_geocoder)
                 logger.info(data)
 
                 # if data is available via geo let's use that since it's standardized, otherwise use VCO
@@ -685,9 +1422,7 @@ def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, v
                 else:
                     PostalCode = edge["site"]["postalCode"]
 
-                for geo in geos:
-                    if geo["ISO"].lower() == data['country_code'].lower():
-                        Geospecific = geo["REG"]
+                Geospecific = countries.region_by_iso(data['country_code']) or Geospecific
 
                 geolocation_worked = True
             else:
@@ -698,11 +1433,8 @@ def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, v
                         logger.info("got here")
                         lat = link['lat']
                         lon = link['lon']
-                        geoval = '%s,%s' % (lat, lon)
-                        location = geolocator.reverse(geoval, language="en-US,en")
-                        sleep(10)
-                        data = location.raw
-                        data = data['address']
+                        data = geolocation.reverse_geocode(geolocator, lat, lon, VCO_CUSTOMER_EDGE,
+                                                           cache=geocode_cache, offline=offline_geocoder)
                         logger.info(data)
 
                         if 'state' in data:
@@ -728,26 +1460,16 @@ def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, v
                             if not re.findall('[^A-Za-z0-9_  .-]', str(data['postcode'])):
                                 PostalCode = PostalCode
 
-                        for geo in geos:
-                            if geo["ISO"].lower() == data['country_code'].lower():
-                                Geospecific = geo["REG"]
+                        Geospecific = countries.region_by_iso(data['country_code']) or Geospecific
                         geolocation_worked = True
                     else:
                         logger.info("using maxmind")
                         try:
-                            client = geoip2.webservice.Client(cfg.maxmind.account_id, cfg.maxmind.license_key)
-                        except Exception as e:
-                            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-                            pass
-                        try:
-                            response = client.insights(link['ipAddress'])
+                            response = geolocation.get_geoip_provider(cfg).lookup(link['ipAddress'])
                             lat = response.location.latitude
                             lon = response.location.longitude
-                            geoval = '%s,%s' % (lat, lon)
-                            location = geolocator.reverse(geoval, language="en-US,en")
-                            sleep(10)
-                            data = location.raw
-                            data = data['address']
+                            data = geolocation.reverse_geocode(geolocator, lat, lon, VCO_CUSTOMER_EDGE,
+                                                               cache=geocode_cache, offline=offline_geocoder)
                             logger.info(data)
 
                             if 'state' in data:
@@ -773,17 +1495,13 @@ def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, v
                                 if not re.findall('[^A-Za-z0-9_  .-]', str(data['postcode'])):
                                     PostalCode = PostalCode
 
-                            for geo in geos:
-                                if geo["ISO"].lower() == data['country_code'].lower():
-                                    Geospecific = geo["REG"]
+                            Geospecific = countries.region_by_iso(data['country_code']) or Geospecific
                             geolocation_worked = True
                         except Exception as e:
                             log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
 
             logger.info(Country + City + PostalCode + State + Geospecific)
-            for geo in geos:
-                if geo["Country"] == Country or geo["ISO"] == Country:
-                    Geospecific = geo["REG"]
+            Geospecific = countries.region(Country) or Geospecific
 
         except Exception as e:
             log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
@@ -794,29 +1512,8 @@ def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, v
                 City = edge["site"]["city"]
 
             if edge["site"]["country"] != None:
-                Country = edge["site"]["country"]
-                if Country == "United States" or Country == "US" or Country == "USA":
-                    Country = "United States of America"
-                elif Country == "TH":
-                    Country = "Thailand"
-                elif Country == "DE":
-                    Country = "Germany"
-                elif Country == "ES":
-                    Country = "Spain"
-                elif Country == "UK":
-                    Country = "United Kingdom"
-                elif Country == "NL":
-                    Country = "Netherlands"
-                elif Country == "CA":
-                    Country = "Canada"
-                elif Country == "FR":
-                    Country = "France"
-                elif Country == "IT":
-                    Country = "Italy"
-                elif Country == "AU":
-                    Country = "Australia"
-                else:
-                    Country = edge["site"]["country"]
+                # ISO codes and aliases (US, USA, UK...) become the standard country name
+                Country = countries.display_name(edge["site"]["country"])
 
             if edge["site"]["postalCode"] != None:
                 PostalCode = edge["site"]["postalCode"]
@@ -825,9 +1522,7 @@ def update_location_information(mysql_cursor, mysql_handle, customer_ID, edge, v
                 State = edge["site"]["state"]
 
             logger.info(Country + City + PostalCode + State + Geospecific)
-            for geo in geos:
-                if geo["Country"] == Country or geo["ISO"] == Country:
-                    Geospecific = geo["REG"]
+            Geospecific = countries.region(Country) or Geospecific
 
         if Country != "Not set":
             sql_inserts.mysql_PowerBI_EDGE_UPDATE_LOCATION(mysql_handle, mysql_cursor, customer_ID, edge, vco,
@@ -856,31 +1551,8 @@ def update_edge_events(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, even
     return
 
 
-def determine_if_edge_is_hub(configuration, edge, VCO_CUSTOMER_EDGE):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
-    for config in configuration:
-        # print config["id"]
-        for module in config["modules"]:
-            if module["name"] == "deviceSettings" and "refs" in module.keys():
-                if "deviceSettings:vpn:edgeHub" in module["refs"].keys():
-                    try:
-                        if "data" in module["refs"]["deviceSettings:vpn:edgeHub"]:
-                            if str(module["refs"]["deviceSettings:vpn:edgeHub"]["data"]["logicalId"]) == str(
-                                    edge["logicalId"]):
-                                logger.info("edge is hub")
-                                return True
-                    except KeyError:
-                        logger.info("failed to detect if edge is hub")
-                    except Exception as e:
-                        logger.critical("failed to detect if edge is hub")
-                        log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-
-    return False
-
-
 def update_edge_alerts_based_on_events(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
-                                       events, configuration):
+                                       events, hub_index):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
     date_now = datetime.utcnow()
@@ -896,7 +1568,7 @@ def update_edge_alerts_based_on_events(mysql_cursor, mysql_handle, customer, edg
                 Type = "BADCONFIG"
                 sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge,
                                                             vco, VCO_CUSTOMER_EDGE, Date, Name, Type)
-            if determine_if_edge_is_hub(configuration, edge, VCO_CUSTOMER_EDGE) and Name == "EDGE_TUNNEL_CAP_WARNING":
+            if hub_index.is_hub(edge["logicalId"]) and Name == "EDGE_TUNNEL_CAP_WARNING":
                 Type = "BADCONFIG"
                 sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge,
                                                             vco, VCO_CUSTOMER_EDGE, Date, "HUB_TUNNEL_CAP_WARNING",
@@ -935,27 +1607,14 @@ def dump_appid_specific_qos_rules(customer_name: str, edge_uuid: str, vco_name:
 
 
 def update_edge_alerts_based_on_configuration(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE,
-                                              client, edge_config_stack, configuration):
+                                              client, config_index: ConfigStackIndex, hub_index: HubIndex,
+                                              version_catalog: Optional[VersionCatalog] = None):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
     date_now = datetime.utcnow()
     Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
 
-    outdatedversion = ["R30-20170828-GA", "R31-20171207-GA", "R31-20180125-GA-22337", "R31-20180223-GA-22230",
-                       "R311-20180315-GA", "R311-20180317-GA", "R312-20180607-GA", "R312-20180607-GA-24109",
-                       "R312-20180716-GA", "R312-20180716-GA-24162", "R312-20180716-GA-24652", "R312-20180716-GA-25117",
-                       "R312-20180716-GA-25713", "R312-20180716-GA-POC", "R320-20180409-GA", "R320-20180409-GA-23248",
-                       "R320-20180409-GA-23248-24818", "R320-20180409-GA-23706", "R320-20180409-GA-23706-SKYUS",
-                       "R320-20180427-GA", "R320-20180508-GA-MFG", "R320-20180911-GA-ADIDAS", "R330-20190619-GA",
-                       "R330-20190630-GA", "R330-20190711-GA", "R330-20190723-GA", "R330-20190723-GA-35295",
-                       "R330-20190723-GA-35836-31747", "R330-20190807-GA-610", "R330-MAESTRO-20190404-MFG",
-                       "R330-MTHD-20190328-GA", "R331-20190815-GA", "R331-20190925-GA", "R331-20190925-GA-35295",
-                       "R331-20190925-GA-35295-36582-34794-35562-34370", "R331-20190925-GA-35295-36582-35562",
-                       "R331-20190925-GA-36719", "R331-20191021-GA", "R331-20191021-GA-28378-34801-37003",
-                       "R331-20191212-GA-ATT", "R331-20200120-GA-ATT", "R331-20200120-GA-ATT-DES-ONLY",
-                       "R340-20200128-BETA-f59c1d0c7d", "R340-20200131-GA-d5aabea079", "R340-20200218-GA-c57f8316dd"]
-
-    if edge["buildNumber"] in outdatedversion:
+    if version_catalog is not None and version_catalog.is_outdated(edge["buildNumber"]):
         Type = "BADCONFIG"
         logger.debug("this is a badconfig")
         Name = "NOT_RECOMMENDED_VERSION"
@@ -964,46 +1623,7 @@ def update_edge_alerts_based_on_configuration(mysql_cursor, mysql_handle, custom
     else:
         logger.info("Valid version")
 
-    eoslversion = ["R15-20141211-GA", "R15-AFTER-R11-MERGE-v1-676-g8e2f74a", "R171-20150420-P1", "R18-20150526-GA",
-                   "R182-20150702-GA", "R183-20150820-VCG", "R183-20150903-P1", "R183-20150911-METTEL",
-                   "R183-20151119-METTEL-B", "R184-20151125-P1", "R184-20151222-P1-VONAGE", "R185-20160229-GA",
-                   "R185-20160316-GA-VONAGE", "R185-20160411-GA-PPTP-HOTFIX", "R185-20160413-P1-GA",
-                   "R185-20160530-P2-GA", "R185-20160530-P2-GA-VONAGE", "R185-20160616-P3-GA",
-                   "R185-20160625-P3-GA-VONAGE", "R186-20160718-GA-APN", "R186-20160822-P1-GA-VONAGE",
-                   "R20-20160401-GA", "R20-20160402-GA", "R20-20160415-P1-GA", "R20-20160424-P2-GA",
-                   "R20-20160427-P2-GA", "R20-20160531-P3-GA", "R20-20160708-MFG", "R21-20160704-GA", "R21-20160708-GA",
-                   "R21-20160715-GA", "R21-20160715-GA-13429-13424", "R211-20160809-GA", "R211-20160814-GA",
-                   "R212-20160904-GA", "R212-20160909-GA", "R213-20160926-GA", "R213-20160929-GA", "R213-20161006-GA",
-                   "R213-20161006-GA-HA", "R213-20161008-GA-CLOUD-EDGE-PPTP", "R214-20161111-GA", "R215-20161227-GA",
-                   "R215-20161227-GA-16281", "R215-20161227-GA-MITEL", "R215-20170113-GA-14155", "R221-20161109-GA",
-                   "R23-20161227-GA", "R23-20161227-GA-16187", "R23-20161227-GA-MITEL", "R23-20170118-GA",
-                   "R231-20170217-GA", "R232-20170318-GA", "R232-20170318-GA-16997", "R232-20170403-GA-METTEL",
-                   "R232-20170414-GA-TPAC", "R233-20170416-QA", "R233-20170426-GA", "R233-20170426-GA-MITEL",
-                   "R233-20170515-GA-TPAC", "R233-20170516-GA-WINDSTREAM", "R233-20170517-GA-CDK",
-                   "R233-20170522-GA-MDM89", "R234-20170606-GA", "R234-20170606-GA-16721", "R234-20170606-GA-18670",
-                   "R234-20170606-GA-18781", "R234-20170606-GA-MITEL", "R234-20170606-GA-VONAGE",
-                   "R234-20170815-GA-VONAGE", "R234-20170825-GA-TPAC", "R24-20170418-BETA", "R24-20170425-BETA",
-                   "R24-20170425-QA", "R24-20170428-GA", "R241-20170503-QA-23-g68926a4", "R241-20170531-QA-37-g5b9d1cc",
-                   "R241-20170531-QA-39-gddbac50", "R241-20170612-RC1", "R241-20170615-GA", "R241-20170621-GA",
-                   "R241-20170629-GA", "R241-20170720-P1-GA", "R241-20170720-P1-GA-18997", "R241-20170722-MFG",
-                   "R241-20170809-MFG", "R241-20170809-MFG-2", "R242-20170714-QA", "R242-20170827-QA",
-                   "R242-20170911-GA", "R242-20171004-GA-20424", "R243-20171031-GA", "R243-20171031-GA-19026",
-                   "R243-20171031-GA-21313", "R243-20171031-GA-23380", "R243-20171031-GA-24968",
-                   "R243-20171031-GA-MITEL", "R243-20171031-GA-MITEL-USB", "R243-20171031-GA-VONAGE",
-                   "R243-20171120-GA-21288", "R243-20180123-GA-22204", "R244-20180220-GA", "R244-20180220-GA-21288",
-                   "R244-20180220-GA-23706", "R244-20180220-GA-23706-24597", "R244-20180220-GA-23706-USB",
-                   "R244-20180220-GA-24267", "R244-20180220-GA-24267-21988", "R244-20180220-GA-24652",
-                   "R244-20180220-GA-27682", "R244-20180220-GA-USB", "R244-20180220-GA-USB-23871",
-                   "R244-20180327-GA-23079", "R244-20190521-GA-31333", "R244-20190530-GA-31333", "R25-20171003-GA",
-                   "R25-20171010-GA", "R25-20171103-GA", "R25-20171107-GA", "R251-20180109-GA", "R251-20180131-GA",
-                   "R251-20180131-GA-21552", "R251-20180131-GA-22591", "R251-20180131-GA-23871",
-                   "R251-20180317-GA-23060", "R252-20180430-GA", "R252-20180430-GA-23854", "R252-20180430-GA-24267",
-                   "R252-20180430-GA-24335", "R252-20180430-GA-25167", "R252-20180430-GA-25497", "R252-20180430-GA-CDK",
-                   "R252-20180430-GA-MITEL", "R252-20180430-GA-ZTEMODEM-29480", "R252-20181004-GA-CDK",
-                   "R252-20181116-GA-CDK", "R252-20181116-GA-CDK-23372", "R252-20190131-GA-COCC", "R253-20180727-GA-PS",
-                   "R253-20190430-GA-DG"]
-
-    if edge["buildNumber"] in eoslversion:
+    if version_catalog is not None and version_catalog.is_eosl(edge["buildNumber"]):
         print("EOSL Version")
         Type = "BADCONFIG"
         Name = "END_OF_SUPPORT_LIFE"
@@ -1015,74 +1635,63 @@ def update_edge_alerts_based_on_configuration(mysql_cursor, mysql_handle, custom
 
     if edge["modelNumber"] == "edge1000qat" or edge["modelNumber"] == "edge3400" or edge["modelNumber"] == "edge3X00" or \
             edge["modelNumber"] == "edge840" or edge["modelNumber"] == "edge3800" and edge["edgeState"] == "CONNECTED":
-        for configs in edge_config_stack:
+        modules = config_index.edge_module("deviceSettings")
+        if modules is not None:
             sw_int = []
-            if configs["name"] == "Edge Specific Profile":
-                for modules in configs["modules"]:
-                    if modules["name"] == "deviceSettings":
-                        for net in modules["data"]["lan"]["networks"]:
-                            try:
-                                for interface in net["interfaces"]:
-                                    if interface == "GE1":
-                                        if modules["data"]["ha"]["enabled"] == True:
-                                            logger.info("GE1 is HA enabled")
-                                        else:
-                                            sw_int.append(interface)
-                                    else:
-                                        sw_int.append(interface)
-                            except KeyError:
-                                continue
-                            except Exception as e:
-                                logger.critical('Failure in update_edge_alerts_based_on_configuration ACEzJ9e9nDhu7WdW')
-                                log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-                                continue
-                        if sw_int:
-                            if edge["modelNumber"] == "edge1000qat":
-                                Type = "BADCONFIG"
-                                Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-                                Name = "EDGE2000_SWITCHED_INT"
-                                val = (Date, edge["logicalId"], Name, Type)
-                                sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor,
-                                                                            customer["logicalId"], edge, vco,
-                                                                            VCO_CUSTOMER_EDGE, Date, Name, Type)
-                            elif edge["modelNumber"] == "edge3400" or edge["modelNumber"] == "edge3X00" or edge[
-                                "modelNumber"] == "edge840" or edge["modelNumber"] == "edge3800":
-                                Type = "BADCONFIG"
-                                Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-                                Name = edge["modelNumber"] + "_SWITCHED_INT"
-                                val = (Date, edge["logicalId"], Name, Type)
-                                sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor,
-                                                                            customer["logicalId"], edge, vco,
-                                                                            VCO_CUSTOMER_EDGE, Date, Name, Type)
+            for net in modules["data"]["lan"]["networks"]:
+                try:
+                    for interface in net["interfaces"]:
+                        if interface == "GE1":
+                            if modules["data"]["ha"]["enabled"] == True:
+                                logger.info("GE1 is HA enabled")
                             else:
-                                logger.info("Catured nothing")
+                                sw_int.append(interface)
                         else:
-                            logger.info("Good Config with edge 2000")
-
-    for configs in edge_config_stack:
-        # print json.dumps(configs, indent=4, sort_keys=True)
-        if configs["name"] == "Edge Specific Profile":
-            for modules in configs["modules"]:
-                if modules["name"] == "WAN":
-                    if "links" in modules["data"].keys():
-                        for link in modules["data"]["links"]:
-                            if link["bwMeasurement"] != "USER_DEFINED" and edge[
-                                "edgeState"] == "CONNECTED" and determine_if_edge_is_hub(configuration, edge,
-                                                                                         VCO_CUSTOMER_EDGE):
-                                Type = "BADCONFIG"
-                                Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-                                Name = "HUB_WITH_DYNAMIC_BANDWIDTH"
-                                sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor,
-                                                                            customer["logicalId"], edge, vco,
-                                                                            VCO_CUSTOMER_EDGE, Date, Name, Type)
-                            if link["dynamicBwAdjustmentEnabled"] and edge["edgeState"] == "CONNECTED":
-                                if re.match('R2', edge["buildNumber"]) is not None:
-                                    Type = "BADCONFIG"
-                                    Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-                                    Name = "R2_EDGE_DBA"
-                                    sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor,
-                                                                                customer["logicalId"], edge, vco,
-                                                                                VCO_CUSTOMER_EDGE, Date, Name, Type)
+                            sw_int.append(interface)
+                except KeyError:
+                    continue
+                except Exception as e:
+                    logger.critical('Failure in update_edge_alerts_based_on_configuration ACEzJ9e9nDhu7WdW')
+                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+                    continue
+            if sw_int:
+                if edge["modelNumber"] == "edge1000qat":
+                    Type = "BADCONFIG"
+                    Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
+                    Name = "EDGE2000_SWITCHED_INT"
+                    val = (Date, edge["logicalId"], Name, Type)
+                    sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge,
+                                                                vco, VCO_CUSTOMER_EDGE, Date, Name, Type)
+                elif edge["modelNumber"] == "edge3400" or edge["modelNumber"] == "edge3X00" or edge[
+                    "modelNumber"] == "edge840" or edge["modelNumber"] == "edge3800":
+                    Type = "BADCONFIG"
+                    Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
+                    Name = edge["modelNumber"] + "_SWITCHED_INT"
+                    val = (Date, edge["logicalId"], Name, Type)
+                    sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge,
+                                                                vco, VCO_CUSTOMER_EDGE, Date, Name, Type)
+                else:
+                    logger.info("Catured nothing")
+            else:
+                logger.info("Good Config with edge 2000")
+
+    modules = config_index.edge_module("WAN")
+    if modules is not None and "links" in modules["data"].keys():
+        for link in modules["data"]["links"]:
+            if link["bwMeasurement"] != "USER_DEFINED" and edge["edgeState"] == "CONNECTED" and \
+                    hub_index.is_hub(edge["logicalId"]):
+                Type = "BADCONFIG"
+                Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
+                Name = "HUB_WITH_DYNAMIC_BANDWIDTH"
+                sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge,
+                                                            vco, VCO_CUSTOMER_EDGE, Date, Name, Type)
+            if link["dynamicBwAdjustmentEnabled"] and edge["edgeState"] == "CONNECTED":
+                if re.match('R2', edge["buildNumber"]) is not None:
+                    Type = "BADCONFIG"
+                    Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
+                    Name = "R2_EDGE_DBA"
+                    sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge,
+                                                                vco, VCO_CUSTOMER_EDGE, Date, Name, Type)
 
 
 def update_attributes(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE):
@@ -1114,13 +1723,7 @@ def update_attributes(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CU
         EdgeName = name.group(0)
     else:
         EdgeName = 'Invalid'
-    if (edge['activationState'] == 'ACTIVATED'):
-        last_contact = datetime.strptime(re.split('T| ', edge["lastContact"])[0], '%Y-%m-%d')
-        activated_time = datetime.strptime(re.split('T| ', edge["activationTime"])[0], '%Y-%m-%d')
-        activated_days = (last_contact - activated_time).days
-    else:
-        activated_days = 0
-        activated_time = None
+    activated_time, activated_days = edge_activation(edge)
 
     sql_inserts.mysql_PowerBI_EDGE_UPDATE_BASIC_ATTRIBUTES(mysql_handle, mysql_cursor, customer_ID, edge, vco,
                                                            VCO_CUSTOMER_EDGE, Profile_ID, Activation_Status,
@@ -1129,48 +1732,26 @@ def update_attributes(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CU
                                                            street_address)
 
 
-def update_non_segment_firewall(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
+def edge_activation(edge):
+    """
+    (activation day, days between activation and lastContact) of an edge, (None, 0) when it is not activated
+    """
+    if edge['activationState'] == 'ACTIVATED':
+        last_contact = datetime.strptime(re.split('T| ', edge["lastContact"])[0], '%Y-%m-%d')
+        activated_time = datetime.strptime(re.split('T| ', edge["activationTime"])[0], '%Y-%m-%d')
+        return activated_time, (last_contact - activated_time).days
+    return None, 0
 
-    Firewall_Edge_Specific = False
-    Firewall_rules_in_bool = False
-    Firewall_rules_out_bool = False
-    Firewall_rules_num = 0
 
-    for config in edge["configuration"]["enterprise"]["modules"]:
-        if config["name"] == "firewall":
-            Firewall_Edge_Specific = config["isEdgeSpecific"]
-            config_firewall = config
+def update_non_segment_firewall(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE,
+                                features=None):
+    if features is None:
+        features = edge_features.extract_edge_features(edge)
 
-    if Firewall_Edge_Specific:
-        try:
-            for rule in config_firewall["edgeSpecificData"]["inbound"]:
-                try:
-                    rule["name"]
-                    Firewall_rules_in_bool = True
-                    Firewall_rules_num = Firewall_rules_num + 1
-                except KeyError:
-                    pass
-                except Exception as e:
-                    logger.critical(f'error in update_firewall njRLXiGeRu4HGzfI4Z1U')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-            for rule in config_firewall["edgeSpecificData"]["outbound"]:
-                try:
-                    rule["name"]
-                    Firewall_rules_out_bool = True
-                    Firewall_rules_num = Firewall_rules_num + 1
-                except KeyError:
-                    pass
-                except Exception as e:
-                    logger.critical(f'error in update_firewall 03KFgKe1WXKsP4wtMG0G')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        except KeyError:
-            pass
-        except Exception as e:
-            logger.critical(f'error in update_firewall SlRpWA291Hdku1nbS4dG')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-            pass
+    Firewall_Edge_Specific = features['firewall_edge_specific']
+    Firewall_rules_in_bool = features['firewall_rules_in_num'] > 0
+    Firewall_rules_out_bool = features['firewall_rules_out_num'] > 0
+    Firewall_rules_num = features['firewall_rules_in_num'] + features['firewall_rules_out_num']
 
     if 'R2' in edge["buildNumber"]:
         sql_inserts.mysql_PowerBI_EDGE_UPDATE_GENERIC_ATTRIBUTE(mysql_handle, mysql_cursor, customer_ID, edge, vco,
@@ -1198,113 +1779,16 @@ def update_non_segment_firewall(mysql_cursor, mysql_handle, customer_ID, edge, v
                                           log_name=VCO_CUSTOMER_EDGE)
 
 
-def update_routing(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
+def update_routing(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE, features=None):
+    if features is None:
+        features = edge_features.extract_edge_features(edge)
 
-    static_routes_bool = False
-    static_routes_num = 0
-    bgp_bool = False
-    ospf_bool = False
-    Multicast_bool = False
-    netflow_bool = False
-
-    # logger.info(json.dumps(edge["configuration"], indent=4, sort_keys=True))
-    Device_Settings_Edge_Specific = False
-    config_device_settings = {}
-    for config in edge["configuration"]["enterprise"]["modules"]:
-        if config["name"] == "deviceSettings":
-            Device_Settings_Edge_Specific = config["isEdgeSpecific"]
-            config_device_settings = config
-
-    if Device_Settings_Edge_Specific:
-        try:
-            for route in config_device_settings["edgeSpecificData"]["routes"]["static"]:
-                static_routes_bool = True
-                static_routes_num = static_routes_num + 1
-        except KeyError:
-            logger.info("no static routes")
-        except Exception as e:
-            logger.critical(f'error in update_routing YeShYykH8BEY6okNA1Cb')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        try:
-            if config_device_settings["edgeSpecificData"]["bgp"]["enabled"] == True:
-                bgp_bool = True
-        except KeyError:
-            logger.info("no bgp ")
-        except Exception as e:
-            logger.critical(f'error in update_routing BKwqrqu7ySQ810PFIEfa')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        try:
-            if config_device_settings["edgeSpecificData"]["netflow"]["enabled"] == True:
-                netflow_bool = True
-        except KeyError:
-            logger.info("no netflow ")
-        except Exception as e:
-            logger.critical(f'error in update_routing Sz72YtIA1ojRFSZ2mqyt')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        try:
-            for interface in config_device_settings["edgeSpecificData"]["routedInterfaces"]:
-                try:
-                    if interface["ospf"]["enabled"] == True:
-                        ospf_bool = True
-                        OSPF_BOOL = True
-                except KeyError:
-                    pass
-                except Exception as e:
-                    logger.critical("error in update_routing N1KzIXZbSOvGOXFksccV")
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-                try:
-                    if interface["multicast"]["igmp"]["enabled"] == True:
-                        Multicast_bool = True
-                    if interface["multicast"]["pim"]["enabled"] == True:
-                        Multicast_bool = True
-                except KeyError:
-                    pass
-                except Exception as e:
-                    logger.critical(f'error in update_routing MjSckx4ni0dZFKgRKU4E')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        except KeyError:
-            logger.info('no edgeSpecificData or no routedInterfaces')
-        except Exception as e:
-            logger.critical(f'error in update_routing TD0FJ77TrVEdroIPXIMd')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-            logger.info("#SHOUD NOT GET HERE")
-
-        try:
-            # logger.info(json.dumps(config_device_settings, indent=4, sort_keys=True))
-            for segment in config_device_settings["edgeSpecificData"]["segments"]:
-                try:
-                    if segment["bgp"]["enabled"] == True:
-                        bgp_bool = True
-                except KeyError:
-                    logger.info('no bgp')
-                    pass
-                except Exception as e:
-                    logger.critical(f'error in update_routing rdwPLCOV9CNO7jP4yNtG')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-                try:
-                    if segment["netflow"]["enabled"] == True:
-                        netflow_bool = True
-                except KeyError:
-                    logger.info("no netflow")
-                except Exception as e:
-                    logger.critical(f'error in update_routing J6RBgM1Zt7yh15C3edZP')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-                try:
-                    for route in segment["routes"]["static"]:
-                        static_routes_bool = True
-                        static_routes_num = static_routes_num + 1
-                except KeyError:
-                    logger.info("no static routes")
-                except Exception as e:
-                    logger.critical(f'error in update_routing AydEjQ4P2cEkwdcsPJ4h')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        except KeyError:
-            logger.info("no segmenets")
-        except Exception as e:
-            logger.critical(f'error in update_routing jZMufq04mZ7kdKAQenOb')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+    static_routes_num = features['static_routes_num']
+    static_routes_bool = static_routes_num > 0
+    bgp_bool = features['bgp']
+    ospf_bool = features['ospf']
+    Multicast_bool = features['multicast']
+    netflow_bool = features['netflow']
 
     sql_inserts.mysql_PowerBI_EDGE_UPDATE_GENERIC_ATTRIBUTE(mysql_handle, mysql_cursor, customer_ID, edge, vco,
                                                             VCO_CUSTOMER_EDGE, "netflow_bool", netflow_bool)
@@ -1332,39 +1816,13 @@ def update_routing(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTO
     return
 
 
-def update_qos(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
-
-    QOS_Edge_Specific = False
-    Business_policy_num = 0
+def update_qos(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE, features=None):
+    if features is None:
+        features = edge_features.extract_edge_features(edge)
 
-    for config in edge["configuration"]["enterprise"]["modules"]:
-        if config["name"] == "QOS":
-            QOS_Edge_Specific = config["isEdgeSpecific"]
-            config_QOS = config
+    QOS_Edge_Specific = features['qos_edge_specific']
+    Business_policy_num = features['business_policy_num']
 
-    if QOS_Edge_Specific:
-        try:
-            for rule in config_QOS["edgeSpecificData"]["rules"]:
-                Business_policy_num = Business_policy_num + 1
-        except KeyError:
-            logger.info("No 2.X Business Policy")
-        try:
-            for segment in config_QOS["edgeSpecificData"]["segments"]:
-                # logger.info(json.dumps(segment, indent=4, sort_keys=True))
-                try:
-                    Business_policy_num += len(segment["rules"])
-                except KeyError:
-                    logger.info("No 3.X Business Policy")
-                except Exception as e:
-                    logger.critical(f'error in update_qos ZpUzztldu2gsPZOo37JY')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        except KeyError:
-            logger.info("no segments")
-        except Exception as e:
-            logger.critical(f'error in update_qos agO7YdppIKy6zACnbbpi')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
     sql_inserts.mysql_PowerBI_EDGE_UPDATE_GENERIC_ATTRIBUTE(mysql_handle, mysql_cursor, customer_ID, edge, vco,
                                                             VCO_CUSTOMER_EDGE, "QOS_Edge_Specific", QOS_Edge_Specific)
     sql_inserts.mysql_PowerBI_EDGE_UPDATE_GENERIC_ATTRIBUTE(mysql_handle, mysql_cursor, customer_ID, edge, vco,
@@ -1388,14 +1846,10 @@ def update_qos(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_
     return
 
 
-def update_ha_and_cluster(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE, services=[]):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
-
-    for config in edge["configuration"]["enterprise"]["modules"]:
-        if config["name"] == "deviceSettings":
-            Device_Settings_Edge_Specific = config["isEdgeSpecific"]
-            config_device_settings = config
+def update_ha_and_cluster(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE, services=[],
+                          features=None):
+    if features is None:
+        features = edge_features.extract_edge_features(edge)
 
     HA = "NONE"
     Cluster_bool = False
@@ -1404,19 +1858,11 @@ def update_ha_and_cluster(mysql_cursor, mysql_handle, customer_ID, edge, vco, VC
         HA = "NONE"
     elif edge["haState"] == "PENDING_INIT" or edge["haState"] == "FAILED" or edge["haState"] == "PENDING_DISSOCIATION":
         HA = "ACTIVE_STANDBY_DOWN"
-    elif config_device_settings["edgeSpecificData"]["ha"]["enabled"]:
+    elif features['ha_enabled']:
         HA = "ACTIVE_STANDBY_UP"
 
-    try:
-        if "segments" in config_device_settings["edgeSpecificData"]:
-            for segment in config_device_settings["edgeSpecificData"]["segments"]:
-                if segment["vrrp"]["enabled"]:
-                    HA = "VRRP"
-    except KeyError:
-        logger.info("no VRRP")
-    except Exception as e:
-        logger.critical(f'error in update_ha_and_cluster o1eW56qBIrQ6ll94PrDC')
-        log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+    if features['vrrp']:
+        HA = "VRRP"
 
     for service in services:
         if service["type"] == "edgeHubClusterMember":
@@ -1459,22 +1905,14 @@ def update_ha_and_cluster(mysql_cursor, mysql_handle, customer_ID, edge, vco, VC
     return
 
 
-def update_config_specific(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
+def update_config_specific(mysql_cursor, mysql_handle, customer_ID, edge, vco, VCO_CUSTOMER_EDGE, features=None):
+    if features is None:
+        features = edge_features.extract_edge_features(edge)
 
-    for config in edge["configuration"]["enterprise"]["modules"]:
-        if config["name"] == "deviceSettings":
-            Device_Settings_Edge_Specific = config["isEdgeSpecific"]
-            config_device_settings = config
-        if config["name"] == "firewall":
-            Firewall_Edge_Specific = config["isEdgeSpecific"]
-            config_firewall = config
-        if config["name"] == "QOS":
-            QOS_Edge_Specific = config["isEdgeSpecific"]
-            config_QOS = config
-        if config["name"] == "WAN":
-            WAN_Edge_Specific = config["isEdgeSpecific"]
+    Device_Settings_Edge_Specific = features['device_settings_edge_specific']
+    Firewall_Edge_Specific = features['firewall_edge_specific']
+    QOS_Edge_Specific = features['qos_edge_specific']
+    WAN_Edge_Specific = features['wan_edge_specific']
 
     sql_inserts.mysql_PowerBI_EDGE_UPDATE_GENERIC_ATTRIBUTE(mysql_handle, mysql_cursor, customer_ID, edge, vco,
                                                             VCO_CUSTOMER_EDGE, "Device_Settings_Edge_Specific",
@@ -1610,7 +2048,7 @@ def update_edge_info_with_basic_information(mysql_cursor, mysql_handle, customer
 
 
 def update_edge_links(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client, link_metrics,
-                      configuration, edge_config_stack):
+                      hub_index: HubIndex, config_index: ConfigStackIndex):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
 
@@ -1648,21 +2086,16 @@ def update_edge_links(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTO
         Linktype = "Not set"
         LinkMode = "Not set"
         VLANID = "Not set"
-        for configs in edge_config_stack:
-            if configs["name"] == "Edge Specific Profile":
-                for modules in configs["modules"]:
-                    if modules["name"] == "WAN":
-                        if "links" in modules["data"].keys():
-                            for link in modules["data"]["links"]:
-                                if link["internalId"] == linkd["link"]["internalId"]:
-                                    MTU = link["MTU"]
-                                    ISP = link["isp"]
-                                    OverlayType = link["discovery"]
-                                    Linktype = link["type"]
-                                    LinkMode = link["mode"]
-                                    if LinkMode == 'Private':
-                                        ISP = 'MPLS'
-                                    VLANID = link["vlanId"]
+        link = config_index.wan_links.get(linkd["link"]["internalId"])
+        if link is not None:
+            MTU = link["MTU"]
+            ISP = link["isp"]
+            OverlayType = link["discovery"]
+            Linktype = link["type"]
+            LinkMode = link["mode"]
+            if LinkMode == 'Private':
+                ISP = 'MPLS'
+            VLANID = link["vlanId"]
         # print EdgeID, LinkUUID, LinkName, ISP, Interface, Latitude, Longitude, NetworkSide, Networktype, MTU, OverlayType, Linktype, LinkMode, VLANID
         sql_inserts.mysql_PowerBI_EDGE_INSERT_LINK(mysql_handle, mysql_cursor, customer["logicalId"], edge, vco,
                                                    VCO_CUSTOMER_EDGE, LinkUUID, LinkName, ISP, Interface, Latitude,
@@ -1706,135 +2139,24 @@ def converttohuman(tdm):
     return time.strftime("%Y-%m-%d  %H:%M:%S", time.localtime(s))
 
 
-def CalculateBrownouts(index_qoe_state, qoe_list, VCO_CUSTOMER_EDGE):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
-    # iterate over the alist and  checkif if the link changes from 4 to 2
-    # Increase the brownout  and timer by 1 if the  qlist change from 4 to 2
-    # If the the link stays 2 consecutively then the timer keeps  increasing
-    Brownout = 0
-    Timer = 0
-    length = len(qoe_list) - 1
-    logger.info("Calculating brownouts and duration of the links")
-    for qoe_index in index_qoe_state:
-        # Check if n+1 item exists
-        if qoe_index + 1 <= length:
-            if qoe_list[qoe_index + 1] == 2:
-                Brownout = Brownout + 1
-                Timer = Timer + 1
-                try:
-                    # Check if n+2 item exists
-                    if qoe_index + 2 <= length:
-                        if qoe_list[qoe_index + 2] == 2:
-                            i = qoe_index + 2
-                            ran = range(i, len(qoe_list))
-                            for t in ran:
-                                if qoe_list[t] == 2:
-                                    Timer = Timer + 1
-                                else:
-                                    break
-                except IndexError:
-                    logger.error("Index out of range")
-                except Exception as e:
-                    logger.critical(f'error in CalculateBrownouts f4ooVnH7Vgs7CmSSOBot {e}')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-    return Brownout, Timer
+# Samples the VCO returns for one day of link quality events, one sample every 7.2 minutes
+QOE_SAMPLES_PER_DAY = 200
 
 
-def CalculateBlackouts(index_qoe_state, qoe_list, VCO_CUSTOMER_EDGE):
+def edge_link_quality_series(qoe_metrics, VCO_CUSTOMER_EDGE):
+    """
+    Voice quality samples of every link in one day of link quality events
+    :return: Dict of link -> samples
+    """
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
-    # iterate over the alist and  checkif if the link changes from 4 to 0, 3 to 0 and 2 to  0
-    # Increase the blackout  and timer by 1 if the  qlist change from the current state to 0
-    # If the the link stays 0 consecutively then the timer keeps  increasing
-    Blackout = 0
-    Timer = 0
-    length = len(qoe_list) - 1
-    logger.info("Calculating blackouts and duration of the links")
-    for qoe_index in index_qoe_state:
-        # Check if n+1 item exists
-        if qoe_index + 1 <= length:
-            if qoe_list[qoe_index + 1] == 0:
-                Blackout = Blackout + 1
-                Timer = Timer + 1
-                try:
-                    # Check if n+2 item exists
-                    if qoe_index + 2 <= length:
-                        if qoe_list[qoe_index + 2] == 0:
-                            i = qoe_index + 2
-                            ran = range(i, len(qoe_list))
-                            for t in ran:
-                                if qoe_list[t] == 0:
-                                    Timer = Timer + 1
-                                else:
-                                    break
-                except Exception as e:
-                    logger.critical('error in CalculateBlackouts sGhqWo6mvfmu1mEboT7p')
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-                    logger.error("Index out of range")
-    return (Blackout, Timer)
-
 
-def lowest_qoe(VCO_CUSTOMER_EDGE: str, arr: List, size: int):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
-    arrs = []
-    # Split the array into sub sequence of sample 8 is considered as an hour data
-    while len(arr) > size:
-        pice = arr[:size]
-        arrs.append(pice)
-        arr = arr[size:]
-    arrs.append(arr)
-    lowest_qoe = []
-    noof4s = noof3s = 0
-    for lowest in arrs:
-        # Count the the number of times green and yellow quality occurs
-        noof4s = [i for i, x in enumerate(lowest) if x == 4]
-        noof3s = [i for i, x in enumerate(lowest) if x == 3]
-        # print (len(noof4s),len(noof3s))
-        score = (len(noof4s) * 10 + len(noof3s) * 5) / float(8)
-        # print (score)
-        lowest_qoe.append(score)
-    logger.info("Lowest QOE is calculated")
-    logger.info(lowest_qoe)
-    if lowest_qoe:
-        min_qoe = min(lowest_qoe)
-    else:
-        min_qoe = None
-    return min_qoe
-
-
-def calculate_edge_link_qoe(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client, qoe_metrics,
-                            STOP, START):
-    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
-    logger.setLevel(logging.INFO)
-
-    LinkBrownouts = LinkBrownoutDurations = LinkBlackoutDurations = LinkBlackoutDuration = LinkBlackouts = LinkBrownoutDuration = 0
+    link_series = {}
     for links in qoe_metrics:
-        id_ = links
-        EdgeID = edge["logicalId"]
-        if links == "overallLinkQuality":
-            LinkUUID = EdgeID + '-' + "OVERLAY"
-            state = "after"
-        else:
-            LinkUUID = id_
-            state = "before"
-        # LinkID = EdgeID + '-' + LinkUUID
-        Date = START.strftime('%Y-%m-%d 00:00:00')
-        Score = None
-        try:
-            Score = qoe_metrics[id_]["totalScore"]
-        except KeyError:
-            logger.error("Score Value not found")
-        except Exception as e:
-            logger.critical(f'error in calculate_edge_link_qoe nxcGNQE547fncnoInuXJ {e}')
-            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+        # overall link quality is scored after remediation, single links before
+        state = "after" if links == "overallLinkQuality" else "before"
         voice_qal = []
-        logger.info("Calculating QOE Link Quality and duration of the links")
-        # logger.info("Link Quality Value")
-        # Calculate the Before data from the API call
-        print(EdgeID, LinkUUID, state)
-        for x in range(0, 200):
+        for x in range(0, QOE_SAMPLES_PER_DAY):
             try:
                 before_data = qoe_metrics[links]["timeseries"][x][state]["0"]
                 voice_qal.append(before_data)
@@ -1843,86 +2165,213 @@ def calculate_edge_link_qoe(mysql_cursor, mysql_handle, customer, edge, vco, VCO
             except Exception as e:
                 logger.critical(f'error in calculate_edge_link_qoe 3MqgPzUk28MOg3HLW8Jh {e}')
                 log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-        logger.info(voice_qal)
-        size = 8
-        # Divide the 24 hours sample into 200/8 = 24 hour sample
-        # minimum sample value
-        lowest_linkscore = lowest_qoe(VCO_CUSTOMER_EDGE=VCO_CUSTOMER_EDGE, arr=voice_qal, size=size)
-        noof2s = [i for i, x in enumerate(voice_qal) if x == 2]
-        noof3s = [i for i, x in enumerate(voice_qal) if x == 3]
-        noof4s = [i for i, x in enumerate(voice_qal) if x == 4]
-        # Calculate the number of 4s,3s 2s,0s
-        if noof3s:
-            val = 3
-            val3 = CalculateBlackouts(noof3s, voice_qal, VCO_CUSTOMER_EDGE)  # print (val3)
-        else:
-            val3 = [0, 0]
-        if noof2s:
-            val2 = 0
-            val2 = CalculateBlackouts(noof2s, voice_qal, VCO_CUSTOMER_EDGE)  # print (val2)
-        else:
-            val2 = [0, 0]
-        if noof4s:
-            val4 = 0
-            val5 = 0
-            val4 = CalculateBlackouts(noof4s, voice_qal, VCO_CUSTOMER_EDGE)
-            val5 = CalculateBrownouts(noof4s, voice_qal, VCO_CUSTOMER_EDGE)  # print (val5)
-        else:
-            val4 = [0, 0]
-            val5 = [0, 0]
-        LinkBrownouts = val5[0]
-        LinkBrownoutDurations = val5[1]
-        LinkBrownoutDuration = round((LinkBrownoutDurations * 7.12) / 60, 3)
-        if LinkBrownoutDuration == 0.0:
-            LinkBrownoutDuration = 0
-        LinkBlackouts = val3[0] + val2[0] + val4[0]
-        LinkBlackoutDurations = val3[1] + val2[1] + val4[1]
-        LinkBlackoutDuration = round((LinkBlackoutDurations * 7.12) / 60, 3)
-        if LinkBlackoutDuration == 0.0:
-            LinkBlackoutDuration = 0
-        print(LinkBlackouts, LinkBlackoutDuration, LinkBrownouts, LinkBrownoutDurations, LinkBrownoutDuration)
-        # print (EdgeID, LinkUUID, Score,lowest_linkscore, LinkBlackouts, LinkBlackoutDuration,LinkBrownouts, LinkBrownoutDuration, LinkID)
-        sql_inserts.mysql_PowerBI_EDGE_INSERT_QOE(mysql_handle, mysql_cursor, edge, vco, VCO_CUSTOMER_EDGE, Date,
-                                                  EdgeID, LinkUUID, Score, lowest_linkscore, LinkBlackouts,
-                                                  LinkBlackoutDuration, LinkBrownouts, LinkBrownoutDuration)
-
-
-def update_edge_qoe(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client):
+        link_series[links] = voice_qal
+    return link_series
+
+
+def edge_link_qoe_stats(qoe_days, VCO_CUSTOMER_EDGE):
+    """
+    Score the links of many days of link quality events in one pass
+    :param qoe_days: List of qoe_metrics, one per day
+    :return: List with a Dict of link -> (lowest score, blackouts, blackout samples, brownouts, brownout samples)
+             for each day
+    """
+    day_series = [edge_link_quality_series(qoe_metrics, VCO_CUSTOMER_EDGE) for qoe_metrics in qoe_days]
+    stats = iter(qoe.link_qoe_stats([voice_qal for link_series in day_series for voice_qal in link_series.values()]))
+    return [{links: next(stats) for links in link_series} for link_series in day_series]
+
+
+def calculate_edge_link_qoe(edge, VCO_CUSTOMER_EDGE, qoe_results):
+    """
+    Daily QoE of every link of the edge for every day pulled from the VCO
+    :param qoe_results: List of (START, STOP, qoe_metrics) with link quality events
+    :return: List of DailyQOE rows, Dicts keyed by sql_inserts.DAILY_QOE_COLUMNS
+    """
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
 
+    logger.info("Calculating QOE Link Quality and duration of the links")
+    qoe_rows = []
+    EdgeID = edge["logicalId"]
+    # every link of every day is scored in one pass
+    day_stats = edge_link_qoe_stats([qoe_metrics for START, STOP, qoe_metrics in qoe_results], VCO_CUSTOMER_EDGE)
+    for (START, STOP, qoe_metrics), link_stats in zip(qoe_results, day_stats):
+        Date = START.strftime('%Y-%m-%d 00:00:00')
+        for links in qoe_metrics:
+            if links == "overallLinkQuality":
+                LinkUUID = EdgeID + '-' + "OVERLAY"
+            else:
+                LinkUUID = links
+            Score = None
+            try:
+                Score = qoe_metrics[links]["totalScore"]
+            except KeyError:
+                logger.error("Score Value not found")
+            except Exception as e:
+                logger.critical(f'error in calculate_edge_link_qoe nxcGNQE547fncnoInuXJ {e}')
+                log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+            lowest_linkscore, LinkBlackouts, LinkBlackoutDurations, LinkBrownouts, LinkBrownoutDurations = \
+                link_stats[links]
+            # one sample every 7.12 minutes, durations are stored in hours
+            LinkBrownoutDuration = round((LinkBrownoutDurations * 7.12) / 60, 3)
+            if LinkBrownoutDuration == 0.0:
+                LinkBrownoutDuration = 0
+            LinkBlackoutDuration = round((LinkBlackoutDurations * 7.12) / 60, 3)
+            if LinkBlackoutDuration == 0.0:
+                LinkBlackoutDuration = 0
+            qoe_rows.append({'Date': Date, 'EdgeID': EdgeID, 'LinkUUID': LinkUUID, 'Score': Score,
+                             'lowest_linkscore': lowest_linkscore, 'LinkBlackouts': LinkBlackouts,
+                             'LinkBlackoutDuration': LinkBlackoutDuration, 'LinkBrownouts': LinkBrownouts,
+                             'LinkBrownoutDuration': LinkBrownoutDuration})
+    return qoe_rows
+
+
+def get_qoe_windows_needing_update(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, snapshot=None):
+    """
+    Daily windows of the last 30 days that are missing QoE data in the DB
+    :return: List of (START, STOP) datetimes
+    """
+    windows = []
     current_time = datetime.now()
     for i in range(0, 30):
         STOP = current_time - timedelta(days=i)
-        # print (STOP.strftime('%Y-%m-%d 00:00:00'))
         START = STOP - timedelta(hours=24)
-        # print (START.strftime('%Y-%m-%d 00:00:00'))
         EdgeID = edge["logicalId"]
         Lastupdate = START.strftime('%Y-%m-%d 00:00:00')
-        # print (STOP.strftime('%Y-%m-%dT00:00:00.000000'), START.strftime('%Y-%m-%dT00:00:00.000000'))
         # CHECK FOR LINK QOE UPDATE
         if sql_queries.determine_if_link_qoe_needs_update(mysql_cursor, mysql_handle, Lastupdate, EdgeID,
-                                                          VCO_CUSTOMER_EDGE):
-            logger.info("QOE Link Quality Information")
-            sleep(0.5)
-            params = {"enterpriseId": customer["id"], "edgeId": edge["id"], "maxSamples": 200,
-                      "interval": {"start": START.strftime('%Y-%m-%dT00:00:00.000000'),
-                                   "end": STOP.strftime('%Y-%m-%dT00:00:00.000000')}}
-            kwargs = {"timeout": 300}
-            logger.info(params)
-            # logger.info("Calculating blackouts and duration of the links")
-            logger.info("START.strftime('%Y-%m-%d 00:00:00')")
-            qoe_metrics = client.call_api('/linkQualityEvent/getLinkQualityEvents', params, **kwargs)
-            if qoe_metrics:
-                calculate_edge_link_qoe(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
-                                        qoe_metrics, STOP, START)
-            else:
-                logger.info(
-                    "QOE Metric is not available for the date")  # else:  #   logger.info("QOE Update is not required")
+                                                          VCO_CUSTOMER_EDGE, snapshot=snapshot):
+            windows.append((START, STOP))
+    return windows
+
+
+def merge_qoe_windows(windows):
+    """
+    Merge daily windows into runs of consecutive days so each run can be pulled with one ranged call
+    :param windows: List of (START, STOP) datetimes as returned by get_qoe_windows_needing_update
+    :return: List of runs, each a list of (START, STOP) in ascending date order
+    """
+    runs = []
+    for START, STOP in sorted(windows):
+        if runs and runs[-1][-1][1].date() == START.date():
+            runs[-1].append((START, STOP))
+        else:
+            runs.append([(START, STOP)])
+    return runs
+
+
+def qoe_request(customer, edge, run):
+    """
+    getLinkQualityEvents call for a run of consecutive daily windows, QOE_SAMPLES_PER_DAY samples per day
+    :return: (method, params, timeout)
+    """
+    params = {"enterpriseId": customer["id"], "edgeId": edge["id"], "maxSamples": QOE_SAMPLES_PER_DAY * len(run),
+              "interval": {"start": run[0][0].strftime('%Y-%m-%dT00:00:00.000000'),
+                           "end": run[-1][1].strftime('%Y-%m-%dT00:00:00.000000')}}
+    return '/linkQualityEvent/getLinkQualityEvents', params, 300
+
+
+def split_qoe_metrics_by_day(qoe_metrics, run):
+    """
+    Split the result of a ranged getLinkQualityEvents call into one result per daily window by sample timestamp
+    The VCO only scores the whole range, so totalScore of a day is None (NULL Score in DailyQOE), only single day
+    pulls store the VCO score
+    :return: List of (START, STOP, qoe_metrics) with the same layout calculate_edge_link_qoe expects, None when
+             samples have no timestamp and the run has to be pulled day by day
+    """
+    if len(run) == 1 or not qoe_metrics:
+        return [(START, STOP, qoe_metrics) for START, STOP in run]
+    if not all(isinstance(sample.get("timestamp"), int) for link_qoe in qoe_metrics.values()
+               for sample in link_qoe.get("timeseries") or []):
+        return None
+
+    day_starts = [calendar.timegm(START.date().timetuple()) * 1000 for START, STOP in run]
+    days = [{} for _ in run]
+    for link, link_qoe in qoe_metrics.items():
+        buckets = [[] for _ in run]
+        for sample in link_qoe.get("timeseries") or []:
+            day = bisect.bisect_right(day_starts, sample["timestamp"]) - 1
+            if 0 <= day < len(run):
+                buckets[day].append(sample)
+        for day, bucket in enumerate(buckets):
+            days[day][link] = dict(link_qoe, timeseries=bucket, totalScore=None)
+    return [(START, STOP, day_metrics) for (START, STOP), day_metrics in zip(run, days)]
+
+
+def get_qoe_runs(windows, ranged=False):
+    """
+    Group daily windows into the runs pulled by one getLinkQualityEvents call each
+    """
+    if ranged:
+        return merge_qoe_windows(windows)
+    return [[window] for window in windows]
+
+
+def fetch_edge_qoe(mysql_cursor, mysql_handle, customer, edge, VCO_CUSTOMER_EDGE, client, ranged=False,
+                   snapshot=None):
+    """
+    Pull link quality events for every daily window that needs an update
+    :param ranged: Merge consecutive missing days into one call and split the result per day locally
+    :param snapshot: CustomerSnapshot answering the DailyQOE lookups, queries the DB when None
+    :return: (List of (START, STOP, qoe_metrics), True when every pull succeeded), a failed pull is logged and only
+             loses the days of its run
+    """
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.INFO)
+
+    qoe_results = []
+    pulled = True
+    windows = get_qoe_windows_needing_update(mysql_cursor, mysql_handle, edge, VCO_CUSTOMER_EDGE, snapshot)
+    runs = get_qoe_runs(windows, ranged)
+    while runs:
+        run = runs.pop(0)
+        logger.info("QOE Link Quality Information")
+        method, params, timeout = qoe_request(customer, edge, run)
+        logger.info(params)
+        try:
+            qoe_metrics = client.call_api(method, params, timeout=timeout)
+        except ApiException:
+            logger.error(f'Unable to getLinkQualityEvents {run[0][0].strftime("%Y-%m-%d")}')
+            pulled = False
+            continue
+        except Exception as e:
+            logger.critical(f'getLinkQualityEvents:ERROR {run[0][0].strftime("%Y-%m-%d")}')
+            log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
+            pulled = False
+            continue
+        day_results = split_qoe_metrics_by_day(qoe_metrics, run)
+        if day_results is None:
+            logger.info("QOE samples without timestamp, pulling the days one by one")
+            runs = [[window] for window in run] + runs
+            continue
+        qoe_results += day_results
+    return qoe_results, pulled
+
+
+def update_edge_qoe(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client, qoe_results=None,
+                    ranged=False):
+    """
+    Calculate daily link QoE and store it in DailyQOE
+    :param qoe_results: (START, STOP, qoe_metrics) already pulled from the VCO, fetched with client when None
+    :param ranged: Pull consecutive missing days with one call when fetching here
+    """
+    logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+    logger.setLevel(logging.INFO)
+
+    if qoe_results is None:
+        qoe_results, _ = fetch_edge_qoe(mysql_cursor, mysql_handle, customer, edge, VCO_CUSTOMER_EDGE, client,
+                                        ranged)
+    for START, STOP, qoe_metrics in qoe_results:
+        if not qoe_metrics:
+            logger.info("QOE Metric is not available for the date")
+    qoe_results = [(START, STOP, qoe_metrics) for START, STOP, qoe_metrics in qoe_results if qoe_metrics]
+    qoe_rows = calculate_edge_link_qoe(edge, VCO_CUSTOMER_EDGE, qoe_results)
+    # all links and days of the edge go to DailyQOE with one commit
+    sql_inserts.mysql_PowerBI_EDGE_INSERT_QOE_MANY(mysql_handle, mysql_cursor, VCO_CUSTOMER_EDGE, qoe_rows)
 
 
 def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, client,
-                                  link_metrics, link_series, configuration, edge_config_stack):
+                                  link_metrics, link_series, hub_index: HubIndex, config_index: ConfigStackIndex):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
 
@@ -1936,7 +2385,7 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
     Total_RX_Bandwidth = 0
     Total_TX_Bandwidth = 0
     date_now = datetime.utcnow()
-    Total_BW_List = []
+    throughput = {}
     top_bandwidth_in_mbps = 0
     fifth_top_throughput = 0
     tenth_top_throughput = 0
@@ -1952,73 +2401,48 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
     ### Start processing Top Average throughput utilized by Edge #######
 
     if len(link_series) != 0:
-
-        Sample_Interval = link_series[0]['series'][0]['tickInterval'] / 1000
-        for link in link_series:
-            bytesRX = link['series'][0]['data']
-            bytesRX_list = [0 if v is None else v for v in bytesRX]
-            bytesTX = link['series'][1]['data']
-            bytesTX_list = [0 if v is None else v for v in bytesTX]
-            Link_BW = [x + y for x, y in zip(bytesTX_list, bytesRX_list)]
-
-            if len(Total_BW_List) == 0:
-                Total_BW_List = Link_BW
-
-            else:
-                Total_BW_List = [x + y for x, y in zip(Total_BW_List, Link_BW)]
-
-        Total_BW_List.sort()
-
-        highest_bw_Bytes = Total_BW_List[-1]
-        fifth_highest_bw_Bytes = Total_BW_List[-5]
-        tenth_highest_bw_Bytes = Total_BW_List[-10]
-
-        top_bandwidth_in_mbps = round((highest_bw_Bytes * 8) / (Sample_Interval * 1000 * 1000), 3)
-        fifth_top_throughput = round((fifth_highest_bw_Bytes * 8) / (Sample_Interval * 1000 * 1000), 3)
-        tenth_top_throughput = round((tenth_highest_bw_Bytes * 8) / (Sample_Interval * 1000 * 1000), 3)
+        throughput = throughput_stats(link_series)
+        top_bandwidth_in_mbps = throughput['highest']
+        fifth_top_throughput = throughput['fifth_top']
+        tenth_top_throughput = throughput['tenth_top']
 
     #### Start Processing actual Feature Set used by customer..applied initially for all VCO including on-prem for visibility###
 
-    if edge_config_stack[0]['schemaVersion'] != "2.0.0":
-        for configs in edge_config_stack:
-            if configs["name"] == "Edge Specific Profile":
-                for modules in configs["modules"]:
-                    if modules["name"] == "controlPlane":
-                        try:
-                            if (modules["data"]["segments"][0]['vpn']['enabled'] == True) and (
-                                    modules["data"]["segments"][0]['vpn']['edgeToEdge']) == True:
-                                if modules["data"]["segments"][0]['vpn']['edgeToEdgeDetail']['useCloudGateway'] == True:
-                                    b2b_via_gw = True
-                                else:
-                                    b2b_via_hub = True
-                        except KeyError:
-                            logger.info('failed to get Cloud VPN status from Edge or not enabled')
+    modules = config_index.edge_module("controlPlane")
+    if config_index.segmented:
+        if modules is not None:
+            try:
+                if (modules["data"]["segments"][0]['vpn']['enabled'] == True) and (
+                        modules["data"]["segments"][0]['vpn']['edgeToEdge']) == True:
+                    if modules["data"]["segments"][0]['vpn']['edgeToEdgeDetail']['useCloudGateway'] == True:
+                        b2b_via_gw = True
+                    else:
+                        b2b_via_hub = True
+            except KeyError:
+                logger.info('failed to get Cloud VPN status from Edge or not enabled')
 
         pb_via_gw, pb_internet_via_direct, pb_internet_via_hub, css_via_gw, nvs_via_gw = process_segment_pb(
-            edge_config_stack, 0)
+            config_index, 0)
 
         if pb_via_gw == css_via_gw == nvs_via_gw == False:
             pb_via_gw, pb_internet_via_direct, pb_internet_via_hub, css_via_gw, nvs_via_gw = process_segment_pb(
-                edge_config_stack, 1)
+                config_index, 1)
 
     else:
-        for configs in edge_config_stack:
-            if configs['name'] == 'Edge Specific Profile':
-                for modules in configs["modules"]:
-                    if modules['name'] == 'controlPlane':
-                        if 'vpn' in modules["data"].keys():
-                            if modules["data"]['vpn']['edgeToEdge'] == True:
-                                if modules["data"]['vpn']['edgeToEdgeDetail']['useCloudGateway'] == True:
-                                    b2b_via_gw = True
-                                else:
-                                    b2b_via_hub = True
+        if modules is not None:
+            if 'vpn' in modules["data"].keys():
+                if modules["data"]['vpn']['edgeToEdge'] == True:
+                    if modules["data"]['vpn']['edgeToEdgeDetail']['useCloudGateway'] == True:
+                        b2b_via_gw = True
+                    else:
+                        b2b_via_hub = True
 
         pb_via_gw, pb_internet_via_direct, pb_internet_via_hub, css_via_gw, nvs_via_gw = process_nonsegment_pb(
-            edge_config_stack, 0)
+            config_index, 0)
 
         if pb_via_gw == css_via_gw == nvs_via_gw == False:
             pb_via_gw, pb_internet_via_direct, pb_internet_via_hub, css_via_gw, nvs_via_gw = process_nonsegment_pb(
-                edge_config_stack, 1)
+                config_index, 1)
 
     if b2b_via_gw:
         feature_set = 'Premium Subscription'
@@ -2032,9 +2456,7 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
         feature_set = "Enterprise Subscription"
 
     for link in link_metrics:
-        if "scoreTx" in link.keys():
-            sleep(0.5)  # print "there was a score"  # sleep(5)
-        else:
+        if "scoreTx" not in link.keys():
             # print "no secure was define"
             link["scoreTx"] = 1
             link["scoreRx"] = 1  # WE NEED TO INVESTIGATE THIS
@@ -2091,7 +2513,7 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
             "edge520" in edge["modelNumber"] or "edge510" in edge["modelNumber"] or "edge500" in edge["modelNumber"])):
 
         Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-        if determine_if_edge_is_hub(configuration, edge, VCO_CUSTOMER_EDGE):
+        if hub_index.is_hub(edge["logicalId"]):
             Name = "OVERCAPACITY_HUB " + edge["modelNumber"] + " over 200"
             Type = "BADCONFIG"
             sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge, vco,
@@ -2104,10 +2526,9 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
 
     if (lic_bandwidth > 350 and edge["edgeState"] == "CONNECTED" and "edge610" in edge["modelNumber"]):
         # print("we found an edge is overcapacity")
-        sleep(1)
         Type = "BADCONFIG"
         Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-        if determine_if_edge_is_hub(configuration, edge, VCO_CUSTOMER_EDGE):
+        if hub_index.is_hub(edge["logicalId"]):
             Name = "OVERCAPACITY_HUB " + edge["modelNumber"] + " over 350"
             Type = "BADCONFIG"
             sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge, vco,
@@ -2120,10 +2541,9 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
 
     if (lic_bandwidth > 1000 and edge["edgeState"] == "CONNECTED" and "edge540" in edge["modelNumber"]):
         # print("we found an edge is overcapacity")
-        sleep(1)
         Type = "BADCONFIG"
         Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-        if determine_if_edge_is_hub(configuration, edge, VCO_CUSTOMER_EDGE):
+        if hub_index.is_hub(edge["logicalId"]):
             Name = "OVERCAPACITY_HUB " + edge["modelNumber"] + " over 1000"
             Type = "BADCONFIG"
             sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge, vco,
@@ -2136,10 +2556,9 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
 
     if (lic_bandwidth > 1500 and edge["edgeState"] == "CONNECTED" and "edge620" in edge["modelNumber"]):
         # print("we found an edge is overcapacity")
-        sleep(1)
         Type = "BADCONFIG"
         Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-        if determine_if_edge_is_hub(configuration, edge, VCO_CUSTOMER_EDGE):
+        if hub_index.is_hub(edge["logicalId"]):
             Name = "OVERCAPACITY_HUB " + edge["modelNumber"] + " over 1500"
             Type = "BADCONFIG"
             sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge, vco,
@@ -2152,10 +2571,9 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
 
     if (lic_bandwidth > 2000 and edge["edgeState"] == "CONNECTED" and "edge840" in edge["modelNumber"]):
         # print("we gound an edge is overcapacity")
-        sleep(1)
         Type = "BADCONFIG"
         Date = date_now.strftime('%Y-%m-01T00:00:00.000Z')[:-3]
-        if determine_if_edge_is_hub(configuration, edge, VCO_CUSTOMER_EDGE):
+        if hub_index.is_hub(edge["logicalId"]):
             Name = "OVERCAPACITY_HUB " + edge["modelNumber"] + " over 2000"
             sql_inserts.mysql_PowerBI_EDGE_INSERT_EVENT(mysql_handle, mysql_cursor, customer["logicalId"], edge, vco,
                                                         VCO_CUSTOMER_EDGE, Date, Name, Type)
@@ -2187,115 +2605,108 @@ def update_license_and_link_usage(mysql_cursor, mysql_handle, customer, edge, vc
                                       name='configured_bandwidth', num=int(Bandwidth), log_name=VCO_CUSTOMER_EDGE)
     sql_upserts.upsert_edge_attribute(curs=mysql_cursor, sql_cnx=mysql_handle, edge_id=edge['logicalId'],
                                       name='calculated_license', text=License, log_name=VCO_CUSTOMER_EDGE)
+    for percentile in PERCENTILES:
+        if f'p{percentile}' in throughput:
+            # num holds the whole Mbps for filtering, text the exact value
+            sql_upserts.upsert_edge_attribute(curs=mysql_cursor, sql_cnx=mysql_handle, edge_id=edge['logicalId'],
+                                              name=f'p{percentile}_throughput_in_mbps',
+                                              num=int(throughput[f'p{percentile}']),
+                                              text=str(throughput[f'p{percentile}']), log_name=VCO_CUSTOMER_EDGE)
     sql_upserts.upsert_edge_attribute(curs=mysql_cursor, sql_cnx=mysql_handle, edge_id=edge['logicalId'],
                                       name='downlink_usage', num=int(DOWNLINK_USAGE), log_name=VCO_CUSTOMER_EDGE)
     sql_upserts.upsert_edge_attribute(curs=mysql_cursor, sql_cnx=mysql_handle, edge_id=edge['logicalId'],
                                       name='uplink_usage', num=int(UPLINK_USAGE), log_name=VCO_CUSTOMER_EDGE)
 
 
-def process_segment_pb(edge_config_stack, profile_level):
+def process_segment_pb(config_index: ConfigStackIndex, profile_level: int):
     pb_via_gw = False
     pb_internet_via_direct = False
     pb_internet_via_hub = False
     css_via_gw = False
     nvs_via_gw = False
 
-    for modules in edge_config_stack[profile_level]["modules"]:
-        if modules["name"] == "QOS":
-            if len(modules["data"]['segments']) != 0:
-                for rule in modules["data"]['segments'][0]['rules']:
-                    if (rule['action']['routeType'] == 'edge2Cloud' and rule['action']['edge2CloudRouteAction'][
-                        'routePolicy'] == 'gateway'):
-                        pb_via_gw = True
+    modules = config_index.module(profile_level, "QOS")
+    if modules is not None:
+        if len(modules["data"]['segments']) != 0:
+            for rule in modules["data"]['segments'][0]['rules']:
+                if (rule['action']['routeType'] == 'edge2Cloud' and rule['action']['edge2CloudRouteAction'][
+                    'routePolicy'] == 'gateway'):
+                    pb_via_gw = True
 
-                    elif (rule['action']['routeType'] == 'edge2Cloud' and rule['action']['edge2CloudRouteAction'][
-                        'routePolicy'] == 'direct'):
-                        pb_internet_via_direct = True
+                elif (rule['action']['routeType'] == 'edge2Cloud' and rule['action']['edge2CloudRouteAction'][
+                    'routePolicy'] == 'direct'):
+                    pb_internet_via_direct = True
 
-                    elif (rule['action']['routeType'] == 'edge2Cloud' and
-                          rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'edge'):
-                        pb_internet_via_hub = True
+                elif (rule['action']['routeType'] == 'edge2Cloud' and
+                      rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'edge'):
+                    pb_internet_via_hub = True
 
-                    elif (rule['action']['routeType'] == 'edge2Cloud' and
-                          rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'cloudSecurityService'):
-                        css_via_gw = True
+                elif (rule['action']['routeType'] == 'edge2Cloud' and
+                      rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'cloudSecurityService'):
+                    css_via_gw = True
 
-                    elif (rule['action']['routeType'] == 'edge2Cloud' and
-                          rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'dataCenter'):
-                        nvs_via_gw = True
+                elif (rule['action']['routeType'] == 'edge2Cloud' and
+                      rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'dataCenter'):
+                    nvs_via_gw = True
 
     return (pb_via_gw, pb_internet_via_direct, pb_internet_via_hub, css_via_gw, nvs_via_gw)
 
 
-def process_nonsegment_pb(edge_config_stack, profile_level):
+def process_nonsegment_pb(config_index: ConfigStackIndex, profile_level: int):
     pb_via_gw = False
     pb_internet_via_direct = False
     pb_internet_via_hub = False
     css_via_gw = False
     nvs_via_gw = False
 
-    for modules in edge_config_stack[profile_level]["modules"]:
-        if modules["name"] == "QOS":
-            if len(modules["data"]) != 0:
-                for rule in modules["data"]['rules']:
-                    if (rule['action']['routeType'] == 'edge2Cloud' and rule['action']['edge2CloudRouteAction'][
-                        'routePolicy'] == 'gateway'):
-                        pb_via_gw = True
+    modules = config_index.module(profile_level, "QOS")
+    if modules is not None:
+        if len(modules["data"]) != 0:
+            for rule in modules["data"]['rules']:
+                if (rule['action']['routeType'] == 'edge2Cloud' and rule['action']['edge2CloudRouteAction'][
+                    'routePolicy'] == 'gateway'):
+                    pb_via_gw = True
 
-                    elif (rule['action']['routeType'] == 'edge2Cloud' and rule['action']['edge2CloudRouteAction'][
-                        'routePolicy'] == 'direct'):
-                        pb_internet_via_direct = True
+                elif (rule['action']['routeType'] == 'edge2Cloud' and rule['action']['edge2CloudRouteAction'][
+                    'routePolicy'] == 'direct'):
+                    pb_internet_via_direct = True
 
-                    elif (rule['action']['routeType'] == 'edge2Cloud' and
-                          rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'edge'):
-                        pb_internet_via_hub = True
+                elif (rule['action']['routeType'] == 'edge2Cloud' and
+                      rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'edge'):
+                    pb_internet_via_hub = True
 
-                    elif (rule['action']['routeType'] == 'edge2Cloud' and
-                          rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'cloudSecurityService'):
-                        css_via_gw = True
+                elif (rule['action']['routeType'] == 'edge2Cloud' and
+                      rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'cloudSecurityService'):
+                    css_via_gw = True
 
-                    elif (rule['action']['routeType'] == 'edge2Cloud' and
-                          rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'dataCenter'):
-                        nvs_via_gw = True
+                elif (rule['action']['routeType'] == 'edge2Cloud' and
+                      rule['action']['edge2CloudRouteAction']['routeCfg']['type'] == 'dataCenter'):
+                    nvs_via_gw = True
 
     return (pb_via_gw, pb_internet_via_direct, pb_internet_via_hub, css_via_gw, nvs_via_gw)
 
 
-def snmpv3_status(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE, edge_config_stack):
+def snmpv3_status(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_EDGE,
+                  config_index: ConfigStackIndex):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
 
     snmpv3_bool = False
 
-    for configs in edge_config_stack:
-        if configs['name'] == 'Edge Specific Profile':
-            for modules in configs['modules']:
-                if modules['name'] == 'deviceSettings':
-                    if 'snmp' in modules["data"].keys():
-                        try:
-                            if modules['data']['snmp']['snmpv3'].get('enabled') == True:
-                                snmpv3_bool = True
-                                break
-                            else:
-                                snmpv3_bool = False
-                                break
-                        except KeyError:
-                            logger.error('failed to retrive SNMPv3 from Edge')
-                    else:
-                        for configs in edge_config_stack:
-                            if configs['name'] != 'Edge Specific Profile':
-                                for modules in configs['modules']:
-                                    if modules['name'] == 'deviceSettings':
-                                        if 'snmp' in modules['data'].keys():
-                                            if modules['data']['snmp']['snmpv3'].get('enabled') == True:
-                                                snmpv3_bool = True
-                                                break
-                                            else:
-                                                snmpv3_bool = False
-                                                break
-                                        else:
-                                            snmpv3_bool = False
-                                            break
+    modules = config_index.edge_module('deviceSettings')
+    if modules is not None:
+        if 'snmp' in modules["data"].keys():
+            try:
+                snmpv3_bool = modules['data']['snmp']['snmpv3'].get('enabled') == True
+            except KeyError:
+                logger.error('failed to retrive SNMPv3 from Edge')
+        else:
+            # Not set on the edge, the last profile with device settings wins
+            for modules in config_index.profile_modules('deviceSettings'):
+                if 'snmp' in modules['data'].keys():
+                    snmpv3_bool = modules['data']['snmp']['snmpv3'].get('enabled') == True
+                else:
+                    snmpv3_bool = False
 
     #    mysql_PowerBI_EDGE_UPDATE_GENERIC_ATTRIBUTE(mysql_handle, mysql_cursor, customer["logicalId"], edge, vco,
     #                                               VCO_CUSTOMER_EDGE,
@@ -2306,13 +2717,15 @@ def snmpv3_status(mysql_cursor, mysql_handle, customer, edge, vco, VCO_CUSTOMER_
 
 
 def update_segment_firewall(mysql_cursor: cursor, mysql_handle: None, edge: dict, VCO_CUSTOMER_EDGE: str,
-                            edge_config_stack: List[dict]):
+                            config_index: ConfigStackIndex):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
 
-    if edge_config_stack[0]['schemaVersion'] != "2.0.0":
-        edge_specific = process_fw(edge_config_stack, 0)[0]
-        profile_specific = process_fw(edge_config_stack, 1)[0]
+    if config_index.segmented:
+        edge_fw = process_fw(config_index, 0)
+        profile_fw = process_fw(config_index, 1)
+        edge_specific = edge_fw[0]
+        profile_specific = profile_fw[0]
 
         if edge_specific is not None:
             firewall_edge_specific = edge_specific
@@ -2323,8 +2736,8 @@ def update_segment_firewall(mysql_cursor: cursor, mysql_handle: None, edge: dict
         else:
             firewall_edge_specific = False
 
-        edge_stateful_firewall = process_fw(edge_config_stack, 0)[4]
-        profile_stateful_firewall = process_fw(edge_config_stack, 1)[4]
+        edge_stateful_firewall = edge_fw[4]
+        profile_stateful_firewall = profile_fw[4]
 
         if edge_stateful_firewall is not None:
             stateful_firewall = edge_stateful_firewall
@@ -2336,11 +2749,11 @@ def update_segment_firewall(mysql_cursor: cursor, mysql_handle: None, edge: dict
             stateful_firewall = False
             logger.info("No Stateful Firewall Status")
 
-        firewall_rules_in_bool = process_fw(edge_config_stack, 0)[1] or process_fw(edge_config_stack, 1)[1]
-        firewall_rules_out_bool = process_fw(edge_config_stack, 0)[2] or process_fw(edge_config_stack, 1)[2]
+        firewall_rules_in_bool = edge_fw[1] or profile_fw[1]
+        firewall_rules_out_bool = edge_fw[2] or profile_fw[2]
 
-        edge_rules_num = process_fw(edge_config_stack, 0)[3]
-        profile_rules_num = process_fw(edge_config_stack, 1)[3]
+        edge_rules_num = edge_fw[3]
+        profile_rules_num = profile_fw[3]
         firewall_rules_num = edge_rules_num + profile_rules_num
 
         sql_upserts.upsert_edge_attribute(curs=mysql_cursor, sql_cnx=mysql_handle, edge_id=edge['logicalId'],
@@ -2365,59 +2778,55 @@ def update_segment_firewall(mysql_cursor: cursor, mysql_handle: None, edge: dict
         logger.info("Non Segment 2.x.x profile handled under non_segment function earlier in code")
 
 
-def process_fw(edge_config_stack: List[dict], profile_level: int):
+def process_fw(config_index: ConfigStackIndex, profile_level: int):
     firewall_edge_specific = None
     firewall_rules_in_bool = False
     firewall_rules_out_bool = False
     firewall_rules_num = 0
     stateful_firewall = None
 
-    for modules in edge_config_stack[profile_level]["modules"]:
-        if modules["name"] == "firewall":
-            if 'firewall_enabled' in modules['data'].keys():
-                firewall_edge_specific = modules['data']['firewall_enabled']
+    modules = config_index.module(profile_level, "firewall")
+    if modules is not None:
+        if 'firewall_enabled' in modules['data'].keys():
+            firewall_edge_specific = modules['data']['firewall_enabled']
 
-            if 'stateful_firewall_enabled' in modules['data'].keys():
-                stateful_firewall = modules['data']['stateful_firewall_enabled']
+        if 'stateful_firewall_enabled' in modules['data'].keys():
+            stateful_firewall = modules['data']['stateful_firewall_enabled']
 
-            if 'segments' in modules['data'].keys():
-                if len(modules['data']['segments']) != 0:
-                    for segment in modules['data']['segments']:
-                        if len(segment['outbound']) != 0:
-                            firewall_rules_out_bool = True
-                            for rule in segment['outbound']:
-                                firewall_rules_num = firewall_rules_num + 1
+        if 'segments' in modules['data'].keys():
+            if len(modules['data']['segments']) != 0:
+                for segment in modules['data']['segments']:
+                    if len(segment['outbound']) != 0:
+                        firewall_rules_out_bool = True
+                        for rule in segment['outbound']:
+                            firewall_rules_num = firewall_rules_num + 1
 
-            if 'inbound' in modules['data'].keys():
-                if len(modules['data']['inbound']) != 0:
-                    firewall_rules_in_bool = True
-                    for rule in modules['data']['inbound']:
-                        firewall_rules_num = firewall_rules_num + 1
+        if 'inbound' in modules['data'].keys():
+            if len(modules['data']['inbound']) != 0:
+                firewall_rules_in_bool = True
+                for rule in modules['data']['inbound']:
+                    firewall_rules_num = firewall_rules_num + 1
 
     return [firewall_edge_specific, firewall_rules_in_bool, firewall_rules_out_bool, firewall_rules_num,
             stateful_firewall]
 
 
-def update_edge_vnf(mysql_cursor: cursor, mysql_handle: None, edge: dict, VCO_CUSTOMER_EDGE: str):
+def update_edge_vnf(mysql_cursor: cursor, mysql_handle: None, edge: dict, VCO_CUSTOMER_EDGE: str, features=None):
     logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
     logger.setLevel(logging.INFO)
+    if features is None:
+        features = edge_features.extract_edge_features(edge)
 
-    has_vnf = False
+    has_vnf = features['vnf_insertion_enabled']
     vnf_type = False
     vnf_vendor = ''
     vnf_on = False
 
-    if "vnfs" in edge.keys() and edge['vnfs'] != None:
-        if 'securityVnf' in edge['vnfs'].keys():
-            has_vnf = edge['vnfs']['securityVnf']['vms'][0]['data']['insertionEnabled']
-            logger.info("Found VNF defined in the Edge")
-
     if has_vnf:
-        logger.info("Getting VNF Type, Vendor, and Power_On Status")
-        vnf_type = edge['vnfs']['securityVnf']['vms'][0]['data']['type']
-        vnf_vendor = edge['vnfs']['securityVnf']['vms'][0]['data']['vendor']
-        vnf_on = not edge['vnfs']['securityVnf']['vms'][0]['data']['vmPowerOff']
-
+        logger.info("Found VNF defined in the Edge")
+        vnf_type = features['vnf_type']
+        vnf_vendor = features['vnf_vendor']
+        vnf_on = not features['vnf_power_off']
     else:
         logger.info("No VNF installed and used in the Edge")
 
@@ -2477,7 +2886,7 @@ def edge_update_software_version(edge, sql_cnx, log_name):
     try:
         # add this: filter_val=f'software_version-{software_version}'
         sql_upserts.upsert_edge_attribute(curs=curs, edge_id=edge.get('logicalId'), name='software_version',
-                                          sql_cnx=sql_cnx, text=software_version, log_name=log_name)
+                                          sql_cnx=sql_cnx, text=software_version, log_name=log_name, immediate=True)
     except mysql.connector.errors.IntegrityError as e:
         logger.error(f'upsert software version failed: {e}')
     return
@@ -2503,12 +2912,7 @@ def update_edge_css(mysql_cursor: cursor, mysql_handle: None, edge: dict, VCO_CU
                 css_ip = css_item['nvs_ip']
                 logger.info("using maxmind")
                 try:
-                    client = geoip2.webservice.Client(cfg.maxmind.account_id, cfg.maxmind.license_key)
-                except Exception as e:
-                    log_critical_error(ex=e, log_name=VCO_CUSTOMER_EDGE)
-                    pass
-                try:
-                    response = client.insights(css_ip)
+                    response = geolocation.get_geoip_provider(cfg).lookup(css_ip, require_organization=True)
                     css_organization = response.traits.organization
                     css_country = response.country.name
                     css_city = response.city.name
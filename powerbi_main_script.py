@@ -19,6 +19,9 @@ import yaml
 
 import powerbi_main_fun
 from Objects.Config import Config
+from Objects.RunJournal import RunJournal
+from Objects.ShardRing import ShardRing, parse_shard
+from VCOClient import get_transport_stats
 
 os.chdir(os.path.dirname(sys.argv[0]))
 
@@ -31,6 +34,10 @@ parser.add_argument('--EDGE', type=int, help='EDGE', required=False)
 parser.add_argument('--debug', help='Debug Mode - Wont pass errors', action='store_true', required=False, default=False)
 parser.add_argument('--cf', type=str, help='config file location', required=False)
 parser.add_argument('--slack', help='slack notifications', action='store_true', required=False, default=False)
+parser.add_argument('--shard', type=parse_shard, help='N/M - only process the VCOs of shard N out of M',
+                    required=False)
+parser.add_argument('--resume', help='skip the customers and edges the last unfinished run already completed',
+                    action='store_true', required=False, default=False)
 
 args = parser.parse_args()
 
@@ -68,6 +75,12 @@ mycursor = cnx.cursor()
 with open(cfg.files.vco_list) as f:
     vco_list = yaml.load(f, Loader=yaml.FullLoader)
 
+vcos = list(vco_list)
+if args.shard:
+    shard, shards = args.shard
+    vcos = ShardRing(shards=shards).select(vcos, shard)
+    local_logger.info(f'Shard {shard}/{shards}: {len(vcos)} of {len(vco_list)} VCOs')
+
 # NEEDS DEBUG FUNCTION TO RUN FOR SPECIFIC EDGE/CUSTOMER/VCO
 if args.VCO:
     console = logging.StreamHandler()
@@ -81,14 +94,42 @@ if args.VCO:
 
     quit()
 
-
-with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-    for vco in vco_list:
-        local_logger.info(vco_list[vco]['link'])
-
-        executor.submit(powerbi_main_fun.process_vco, vco=vco, cfg=cfg, slack_notifications=args.slack,
-                        debug=args.debug, vco_list=vco_list)
-        local_logger.info(f'SUBMITTED: {vco_list.get(vco, {}).get("link")}')
-
-    executor.shutdown()
+# Journal of the completed units, a --resume run continues the last unfinished run of this shard
+journal = None
+if cfg.journal.journal_file:
+    journal = RunJournal(path=cfg.journal.journal_file,
+                         scope='powerbi_main_script' + (f':{args.shard[0]}/{args.shard[1]}' if args.shard else ''),
+                         resume=args.resume, window_hours=cfg.journal.window_hours,
+                         retention_days=cfg.journal.retention_days)
+    if journal.resumed:
+        local_logger.info(f'Resuming run {journal.run_id}')
+    else:
+        local_logger.info(f'Starting run {journal.run_id}')
+elif args.resume:
+    local_logger.warning('--resume needs JOURNAL journal_file in the config, running everything')
+
+
+if cfg.scheduler.workers > 0 and not args.debug:
+    # VCO -> customer -> edge tasks on the work stealing scheduler
+    local_logger.info(f'Scheduling {len(vcos)} VCOs on {cfg.scheduler.workers} workers')
+    powerbi_main_fun.process_vcos_scheduled(cfg=cfg, vco_list=vco_list, vcos=vcos,
+                                            slack_notifications=args.slack, journal=journal)
+else:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        for vco in vcos:
+            local_logger.info(vco_list[vco]['link'])
+
+            executor.submit(powerbi_main_fun.process_vco, vco=vco, cfg=cfg, slack_notifications=args.slack,
+                            debug=args.debug, vco_list=vco_list, journal=journal)
+            local_logger.info(f'SUBMITTED: {vco_list.get(vco, {}).get("link")}')
+
+        executor.shutdown()
+
+for root_url, stats in get_transport_stats().items():
+    local_logger.info(f'{root_url} - requests: {stats["requests"]} - connections: {stats["connections"]} - '
+                      f'reused: {stats["reused"]}')
+if journal is not None:
+    local_logger.info(f'Run {journal.run_id} finished, skipped {journal.skipped} units done before the resume')
+    journal.finish()
+    journal.close()
 local_logger.info('ALL DONE')
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+
+Copyright 2018-2020 VMware, Inc.
+SPDX-License-Identifier: BSD-2-Clause
+
+Runs powerbi_main_script.py or gateway_script.py as one process per shard (--shard N/M), one process per core by
+default. With several hosts every host runs its own slice of the shards, IE: two hosts with 8 cores each run
+--host 1/2 and --host 2/2 for 16 shards. Arguments the supervisor doesn't know are passed on to every process
+
+"""
+
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+
+from Objects.ShardRing import parse_shard
+
+SCRIPTS = ('powerbi_main_script.py', 'gateway_script.py')
+
+os.chdir(os.path.dirname(os.path.abspath(sys.argv[0])))
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--logging_file', type=str, help='logging File, every shard logs to its own file next to it',
+                    required=True)
+parser.add_argument('--script', type=str, choices=SCRIPTS, help='script to run per shard', required=False,
+                    default=SCRIPTS[0])
+parser.add_argument('--processes', type=int, help='shards run on this host, defaults to the number of cores',
+                    required=False, default=os.cpu_count() or 1)
+parser.add_argument('--host', type=parse_shard, help='N/H - this is host N out of H hosts running the supervisor',
+                    required=False, default=(1, 1))
+
+args, script_args = parser.parse_known_args()
+
+# SETUP LOCAL LOGGING ##
+
+logger = logging.getLogger('MAIN')
+logger.setLevel(logging.INFO)
+
+formatter = logging.Formatter(
+    '%(asctime)s - %(VCO_CUSTOMER_EDGE)s - %(funcName)s - %(lineno)s - %(levelname)s - %(message)s')
+for handler in (logging.FileHandler(args.logging_file), logging.StreamHandler()):
+    handler.setLevel(logging.INFO)
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+VCO_CUSTOMER_EDGE = 'SUPERVISOR'
+local_logger = logging.LoggerAdapter(logging.getLogger('MAIN'), {'VCO_CUSTOMER_EDGE': VCO_CUSTOMER_EDGE})
+
+
+def shard_logging_file(logging_file: str, shard: int, shards: int) -> str:
+    root, ext = os.path.splitext(logging_file)
+    return f'{root}.shard{shard}of{shards}{ext}'
+
+
+if args.processes < 1:
+    parser.error('--processes must be at least 1')
+
+host, hosts = args.host
+shards = args.processes * hosts
+first_shard = (host - 1) * args.processes + 1
+
+processes = {}
+for shard in range(first_shard, first_shard + args.processes):
+    command = [sys.executable, args.script, '--shard', f'{shard}/{shards}',
+               '--logging_file', shard_logging_file(args.logging_file, shard, shards)] + script_args
+    processes[shard] = subprocess.Popen(command)
+    local_logger.info(f'Started {args.script} shard {shard}/{shards} - pid {processes[shard].pid}')
+
+
+def stop_shards(signum, frame):
+    local_logger.warning(f'Signal {signum}, stopping {len(processes)} shards')
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+
+
+signal.signal(signal.SIGTERM, stop_shards)
+signal.signal(signal.SIGINT, stop_shards)
+
+failed = 0
+for shard, process in processes.items():
+    returncode = process.wait()
+    if returncode:
+        failed += 1
+        local_logger.error(f'Shard {shard}/{shards} exited with {returncode}')
+    else:
+        local_logger.info(f'Shard {shard}/{shards} done')
+
+local_logger.info(f'ALL DONE - {len(processes) - failed} of {len(processes)} shards succeeded')
+sys.exit(1 if failed else 0)